@@ -0,0 +1,273 @@
+# Answer cache for the chatbot: normalized question -> answer, with a semantic fallback.
+# A question is answered from the cache when its normalized text matches an entry, or when its
+# embedding is at least ANSWER_CACHE_SIMILARITY cosine-similar to one. Every entry records the
+# UUIDs and hashes of the chunks its answer was built from; the upsert pipeline calls
+# invalidate_chunks() for every chunk it replaces or deletes, so an answer is dropped exactly
+# when its sources change. Entries expire after ANSWER_CACHE_TTL_HOURS and the least recently
+# used ones are evicted beyond ANSWER_CACHE_MAX_ENTRIES. SQLite (WAL) lets the chatbot and the
+# pipeline share the file across processes.
+
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+
+import numpy as np
+
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "data/answer_cache/answers.db")
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+TTL_HOURS = float(os.getenv("ANSWER_CACHE_TTL_HOURS", 24))
+MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 2000))
+# "price of the blue kurta" vs "price of the red kurta" can score ~0.9: keep this high
+SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95))
+_LOOKUP_SIZE = 500  # stays below SQLite's bound-parameter limit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY,
+    scope TEXT NOT NULL,
+    question_key TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    links TEXT NOT NULL,
+    vector BLOB,
+    cost REAL NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (scope, question_key)
+);
+CREATE INDEX IF NOT EXISTS answers_used ON answers (used_at);
+CREATE TABLE IF NOT EXISTS sources (
+    answer_id INTEGER NOT NULL REFERENCES answers (id) ON DELETE CASCADE,
+    uuid TEXT NOT NULL,
+    hash TEXT
+);
+CREATE INDEX IF NOT EXISTS sources_uuid ON sources (uuid);
+CREATE INDEX IF NOT EXISTS sources_answer ON sources (answer_id);
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+STAT_KEYS = ("exact_hits", "semantic_hits", "misses", "saved_seconds", "invalidated", "expired", "evicted")
+
+_NON_WORD = re.compile(r"[^\w₹]+")
+
+
+def normalize_question(question) -> str:
+    """Case, punctuation, spacing and Unicode form do not change the key; words and numbers do."""
+    return _NON_WORD.sub(" ", unicodedata.normalize("NFKC", question).lower()).strip()
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    links: list
+    question: str  # the cached question this one matched
+    similarity: float  # 1.0 for a normalized-text match
+    cost: float  # seconds the original retrieval + completion took
+    sources: list = field(default_factory=list)
+
+
+def _connect(path):
+    db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute("PRAGMA foreign_keys=ON")
+    db.executescript(SCHEMA)
+    return db
+
+
+class AnswerCache:
+    """Answers of one collection / tenant (`scope`); see the module comment."""
+
+    def __init__(self, path=ANSWER_CACHE_PATH, scope="", ttl_hours=TTL_HOURS, max_entries=MAX_ENTRIES,
+                 similarity=SIMILARITY):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.scope = scope
+        self.ttl = ttl_hours * 3600
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.db = _connect(path)
+        self._lock = threading.Lock()  # Streamlit serves sessions from several threads
+        self._version = None  # PRAGMA data_version when the vectors were loaded
+        self._ids, self._vectors = [], None
+
+    def lookup(self, question, embed=None):
+        """Return (CachedAnswer or None, question vector or None).
+
+        `embed` (question -> vector) is only called when no normalized-text entry matches; the
+        vector is returned so a miss can be stored without embedding the question twice.
+        """
+        start = time.monotonic()
+        with self._lock:
+            self._expire()
+            row = self.db.execute(
+                "SELECT id, question FROM answers WHERE scope = ? AND question_key = ?",
+                (self.scope, normalize_question(question)),
+            ).fetchone()
+        hit = self._hit(row[0], row[1], 1.0, "exact_hits", start) if row is not None else None
+        if hit is not None:
+            return hit, None
+        vector = _unit(embed(question)) if embed is not None else None
+        if vector is not None:
+            with self._lock:
+                best = self._nearest(vector)
+                cached = self.db.execute("SELECT question FROM answers WHERE id = ?",
+                                         (best[0],)).fetchone() if best is not None else None
+            hit = self._hit(best[0], cached[0], best[1], "semantic_hits", start) if cached is not None else None
+            if hit is not None:
+                return hit, vector
+        self._bump(misses=1)
+        return None, vector
+
+    def store(self, question, vector, answer, links, sources, cost):
+        """Cache an answer built from `sources`, (uuid, hash) pairs of the chunks in its context.
+
+        `vector` may be a list or an array (or None); it is stored as a unit float32 vector.
+        """
+        now = time.time()
+        vector = _unit(vector)
+        blob = vector.astype(np.float32).tobytes() if vector is not None else None
+        with self._lock, _Transaction(self.db):
+            self.db.execute("DELETE FROM answers WHERE scope = ? AND question_key = ?",
+                            (self.scope, normalize_question(question)))
+            cursor = self.db.execute(
+                "INSERT INTO answers (scope, question_key, question, answer, links, vector, cost, created_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.scope, normalize_question(question), question, answer, json.dumps(links), blob, cost, now, now),
+            )
+            self.db.executemany("INSERT INTO sources (answer_id, uuid, hash) VALUES (?, ?, ?)",
+                                [(cursor.lastrowid, str(uuid), digest) for uuid, digest in sources])
+            evicted = self.db.execute(
+                "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            self._add_stats(evicted=evicted)
+            self._version = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            values = dict(self.db.execute("SELECT key, value FROM stats").fetchall())
+            entries = self.db.execute("SELECT COUNT(*) FROM answers WHERE scope = ?", (self.scope,)).fetchone()[0]
+        stats = {key: values.get(key, 0) for key in STAT_KEYS}
+        hits = stats["exact_hits"] + stats["semantic_hits"]
+        stats.update(entries=entries, hits=hits,
+                     hit_rate=hits / (hits + stats["misses"]) if hits + stats["misses"] else 0.0)
+        return stats
+
+    def clear(self):
+        with self._lock, _Transaction(self.db):
+            self.db.execute("DELETE FROM answers")
+            self._version = None
+
+    def close(self):
+        self.db.close()
+
+    def _hit(self, answer_id, cached_question, similarity, kind, start):
+        with self._lock, _Transaction(self.db):
+            row = self.db.execute("SELECT answer, links, cost FROM answers WHERE id = ?", (answer_id,)).fetchone()
+            if row is None:
+                return None  # invalidated between the match and now
+            self.db.execute("UPDATE answers SET used_at = ?, hits = hits + 1 WHERE id = ?", (time.time(), answer_id))
+            sources = self.db.execute("SELECT uuid, hash FROM sources WHERE answer_id = ?", (answer_id,)).fetchall()
+            self._add_stats(**{kind: 1, "saved_seconds": max(0.0, row[2] - (time.monotonic() - start))})
+        return CachedAnswer(answer=row[0], links=json.loads(row[1]), question=cached_question,
+                            similarity=similarity, cost=row[2], sources=sources)
+
+    def _nearest(self, vector):
+        """(id, similarity) of the most similar entry at or above the threshold, or None."""
+        version = self.db.execute("PRAGMA data_version").fetchone()[0]
+        if self._version != version or self._vectors is None:
+            # Reload only when this or another connection (the pipeline) changed the file
+            rows = self.db.execute("SELECT id, vector FROM answers WHERE scope = ? AND vector IS NOT NULL",
+                                   (self.scope,)).fetchall()
+            rows = [(answer_id, np.frombuffer(blob, dtype=np.float32)) for answer_id, blob in rows]
+            rows = [(answer_id, v) for answer_id, v in rows if len(v) == len(vector)]  # embedding model changed
+            self._ids = [answer_id for answer_id, _ in rows]
+            self._vectors = np.stack([v for _, v in rows]) if rows else None
+            self._version = version
+        if self._vectors is None:
+            return None
+        scores = self._vectors @ vector
+        best = int(np.argmax(scores))
+        return (self._ids[best], float(scores[best])) if scores[best] >= self.similarity else None
+
+    def _expire(self):
+        expired = self.db.execute("DELETE FROM answers WHERE created_at < ?", (time.time() - self.ttl,)).rowcount
+        if expired:
+            self._add_stats(expired=expired)
+            self._version = None
+
+    def _bump(self, **deltas):
+        with self._lock:
+            self._add_stats(**deltas)
+
+    def _add_stats(self, **deltas):
+        self.db.executemany(
+            "INSERT INTO stats (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = value + excluded.value",
+            [(key, value) for key, value in deltas.items() if value],
+        )
+
+
+class _Transaction:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, *exc):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def _unit(vector):
+    if vector is None:
+        return None
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+def invalidate_chunks(changes, path=ANSWER_CACHE_PATH) -> int:
+    """Drop answers built from chunks the pipeline replaced or deleted; returns how many.
+
+    `changes` are (uuid, new hash) pairs, with None as the hash of a deleted chunk. An answer
+    whose source still has the same hash (a rewrite of identical content) is kept.
+    """
+    if not ANSWER_CACHE_ENABLED or not changes or not os.path.exists(path):
+        return 0
+    changes = [(str(uuid), digest) for uuid, digest in changes]
+    db = _connect(path)
+    try:
+        stale = set()
+        for i in range(0, len(changes), _LOOKUP_SIZE):
+            group = dict(changes[i:i + _LOOKUP_SIZE])
+            rows = db.execute(
+                f"SELECT answer_id, uuid, hash FROM sources WHERE uuid IN ({','.join('?' * len(group))})", list(group)
+            ).fetchall()
+            stale.update(answer_id for answer_id, uuid, digest in rows if digest is None or group[uuid] != digest)
+        if not stale:
+            return 0
+        with _Transaction(db):
+            db.executemany("DELETE FROM answers WHERE id = ?", [(answer_id,) for answer_id in stale])
+            db.execute("INSERT INTO stats (key, value) VALUES ('invalidated', ?) "
+                       "ON CONFLICT (key) DO UPDATE SET value = value + excluded.value", (len(stale),))
+        return len(stale)
+    finally:
+        db.close()
+
+
+def clear_answer_cache(path=ANSWER_CACHE_PATH):
+    """Forget every answer (the collection was wiped or recreated)."""
+    if os.path.exists(path):
+        cache = AnswerCache(path)
+        cache.clear()
+        cache.close()
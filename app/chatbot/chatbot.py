@@ -1,4 +1,5 @@
 import os
+import sys
 import streamlit as st
 import logging
 import whisper
@@ -7,15 +8,26 @@ import scipy.io.wavfile as wavfile
 import tempfile
 import pyttsx3
 import re
+import time
 
 from dotenv import load_dotenv
 from openai import OpenAI
 from weaviate import WeaviateClient
 from weaviate.connect import ConnectionParams
 
+try:
+    from app.chatbot.answer_cache import ANSWER_CACHE_ENABLED, AnswerCache
+except ImportError:  # `streamlit run app/chatbot/chatbot.py` puts this folder, not the project root, on sys.path
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+    from app.chatbot.answer_cache import ANSWER_CACHE_ENABLED, AnswerCache
+from app.upsert.embeddings import EMBEDDINGS, LocalEmbedder
+
 # Initialize logging and keys
 load_dotenv()
 openai_key = os.getenv("OPENAI_API_KEY")
+embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# UPSERT_EMBEDDINGS=local collections have no vectorizer: questions are embedded like the chunks were
+local_embedder = LocalEmbedder() if EMBEDDINGS == "local" else None
 logging.basicConfig(level=logging.INFO)
 
 # Initialize pyttsx3 TTS
@@ -68,26 +80,66 @@ def get_collection():
         )
     )
     client.connect()
-    return client.collections.get("PageChunk")
+    # The collection may be an alias of the live version (see app/upsert/reindex.py); Weaviate resolves it
+    collection = client.collections.get(os.getenv("WEAVIATE_COLLECTION", "PageChunk"))
+    # A store in a multi-tenancy collection (sites.toml) answers from its own tenant only
+    tenant = os.getenv("WEAVIATE_TENANT")
+    return collection.with_tenant(tenant) if tenant else collection
+
+@st.cache_resource
+def get_answer_cache():
+    # Survives Streamlit reruns and is shared by every session; one scope per collection / tenant
+    scope = f"{os.getenv('WEAVIATE_COLLECTION', 'PageChunk')}/{os.getenv('WEAVIATE_TENANT', '')}"
+    return AnswerCache(scope=scope) if ANSWER_CACHE_ENABLED else None
 
 collection = get_collection()
+answer_cache = get_answer_cache()
 openai_client = OpenAI(api_key=openai_key)
 
+def embed_question(question):
+    if local_embedder is not None:
+        return local_embedder.embed([question])[0]
+    try:
+        res = openai_client.embeddings.create(model=embedding_model, input=[question])
+        return res.data[0].embedding
+    except Exception as e:
+        logging.warning(f"Question embedding failed, exact-match cache only: {e}")
+        return None
+
 # ---- Answer Generation ----
 def answer_from_knowledge(question, top_k=7):
-    response = collection.query.near_text(
-        query=question,
-        limit=top_k,
-        return_properties=["content", "url", "last_updated"]
-    )
+    """Return (answer, links, cached); cached answers skip the vector search and the completion."""
+    start = time.monotonic()
+    vector = None
+    if answer_cache is not None:
+        hit, vector = answer_cache.lookup(question, embed_question)
+        if hit is not None:
+            return hit.answer, hit.links, True
+
+    if vector is None and EMBEDDINGS != "server":
+        vector = embed_question(question)
+    if vector is not None and EMBEDDINGS != "server":
+        # The chunks' vectors came from this embedder (see app/upsert/embeddings.py): search with it
+        response = collection.query.near_vector(
+            near_vector=[float(x) for x in vector],
+            limit=top_k,
+            return_properties=["content", "url", "last_updated", "hash"]
+        )
+    else:
+        response = collection.query.near_text(
+            query=question,
+            limit=top_k,
+            return_properties=["content", "url", "last_updated", "hash"]
+        )
     if not response.objects:
-        return "❌ No product information found.", []
+        return "❌ No product information found.", [], False
 
-    context_snippets, links = [], []
+    context_snippets, links, sources = [], [], []
     for obj in response.objects[:2]:
         url = obj.properties.get("url", "")
         content = obj.properties.get("content", "").strip()
         links.append(url)
+        sources.append((obj.uuid, obj.properties.get("hash")))
         context_snippets.append(f"[Source]({url}):\n{content}")
 
     context = "\n\n---\n".join(context_snippets)
@@ -104,10 +156,12 @@ def answer_from_knowledge(question, top_k=7):
             temperature=0.3,
         )
         final = res.choices[0].message.content.strip()
-        return final, links
     except Exception as e:
         st.error("OpenAI error: " + str(e))
-        return "⚠️ GPT error", []
+        return "⚠️ GPT error", [], False
+    if answer_cache is not None:
+        answer_cache.store(question, vector, final, links, sources, time.monotonic() - start)
+    return final, links, False
 
 # ---- Session State Init ----
 if "chat_log" not in st.session_state:
@@ -122,12 +176,13 @@ def on_key_enter():
     query = st.session_state.typed_question.strip()
     if query:
         with st.spinner("Thinking..."):
-            answer, urls = answer_from_knowledge(query)
+            answer, urls, cached = answer_from_knowledge(query)
         st.session_state.chat_log.append({
             "question": query,
             "answer": answer,
             "links": urls,
-            "voice": False
+            "voice": False,
+            "cached": cached
         })
         st.session_state.last_response = answer
         speak_answer(answer)
@@ -142,11 +197,26 @@ for msg in st.session_state.chat_log:
         st.markdown(msg["question"])
     with st.chat_message("ai", avatar="🤖"):
         st.markdown(msg["answer"])
+        if msg.get("cached"):
+            st.caption("⚡ Answered from cache")
         if msg["links"]:
             st.markdown("🔗 Product Links:")
             for l in msg["links"]:
                 st.markdown(f"- [{l}]({l})")
 
+# ---- Answer Cache Metrics ----
+if answer_cache is not None:
+    cache_stats = answer_cache.stats()
+    with st.sidebar:
+        st.subheader("⚡ Answer cache")
+        st.metric("Hit rate", f"{cache_stats['hit_rate']:.0%}",
+                  help=f"{cache_stats['exact_hits']:.0f} exact + {cache_stats['semantic_hits']:.0f} similar-question hits, "
+                       f"{cache_stats['misses']:.0f} misses")
+        st.metric("Latency saved", f"{cache_stats['saved_seconds']:.1f}s")
+        st.metric("Cached answers", cache_stats["entries"])
+        st.caption(f"Invalidated by upserts: {cache_stats['invalidated']:.0f}, expired: {cache_stats['expired']:.0f}, "
+                   f"evicted: {cache_stats['evicted']:.0f}")
+
 # ---- Input + Mic + Controls --- (Bottom)
 st.markdown("---")
 input_col1, input_col2, input_col3 = st.columns([5, 1, 1])
@@ -165,12 +235,13 @@ with input_col2:
         if transcript:
             st.success(f"🗣️ You said: {transcript}")
             with st.spinner("Answering..."):
-                reply, product_links = answer_from_knowledge(transcript)
+                reply, product_links, cached = answer_from_knowledge(transcript)
             st.session_state.chat_log.append({
                 "question": transcript,
                 "answer": reply,
                 "links": product_links,
-                "voice": True
+                "voice": True,
+                "cached": cached
             })
             st.session_state.last_response = reply
             speak_answer(reply)
@@ -1,3 +1,4 @@
+import os
 from weaviate import WeaviateClient
 from weaviate.connect import ConnectionParams
 
@@ -15,7 +16,7 @@ client = WeaviateClient(
 )
 client.connect()
 
-collection = client.collections.get("PageChunk")
+collection = client.collections.get(os.getenv("WEAVIATE_COLLECTION", "PageChunk"))
 
 response = collection.query.near_text(
     query=QUESTION,
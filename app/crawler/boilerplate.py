@@ -0,0 +1,106 @@
+# Site-template boilerplate detection.
+# Header, mega-menu, footer and cookie-banner lines repeat on nearly every page of a store. The model
+# counts on how many pages each text line occurs; lines above BOILERPLATE_RATIO of all pages are
+# template text and are stripped before chunking. The counts are persisted, so incremental runs
+# start with a trained model.
+
+import os
+import re
+import json
+import hashlib
+
+from app.utils.chunker import count_tokens
+
+BOILERPLATE_DIR = os.getenv("CRAWLER_BOILERPLATE_DIR", "data/boilerplate")
+BOILERPLATE_ENABLED = os.getenv("CRAWLER_BOILERPLATE", "1") == "1"
+BOILERPLATE_RATIO = float(os.getenv("CRAWLER_BOILERPLATE_RATIO", 0.6))  # share of pages a template line is on
+WARMUP_PAGES = int(os.getenv("CRAWLER_BOILERPLATE_WARMUP", 30))  # pages to see before stripping anything
+# Boilerplate runs inside the page body are only stripped when at least this long, so short
+# repeated lines between product-specific ones (size lists, "Add to Cart") stay with the product
+MIN_RUN = int(os.getenv("CRAWLER_BOILERPLATE_MIN_RUN", 8))
+
+_SPACE = re.compile(r"\s+")
+
+
+def line_key(line):
+    return hashlib.blake2b(_SPACE.sub(" ", line.strip().lower()).encode("utf-8"), digest_size=8).hexdigest()
+
+
+class BoilerplateModel:
+    """Document frequency of text lines across a crawl, persisted per crawl name."""
+
+    def __init__(self, name, directory=BOILERPLATE_DIR):
+        self.path = os.path.join(directory, f"{name}.json")
+        self.report_path = os.path.join(directory, f"{name}_report.json")
+        self.pages = 0
+        self.lines = {}  # line key -> number of pages containing it
+        self.report = {}  # url -> bytes / chunks removed this run
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self.pages = data.get("pages", 0)
+                self.lines = data.get("lines", {})
+            except (OSError, ValueError) as e:
+                print(f"[BOILERPLATE] Ignoring unreadable {self.path}: {e}")
+
+    @property
+    def ready(self) -> bool:
+        return self.pages >= WARMUP_PAGES
+
+    def observe(self, text):
+        """Count each distinct line of one page once."""
+        self.pages += 1
+        for key in {line_key(line) for line in text.split("\n") if line.strip()}:
+            self.lines[key] = self.lines.get(key, 0) + 1
+
+    def is_boilerplate(self, line) -> bool:
+        return self.ready and self.lines.get(line_key(line), 0) >= BOILERPLATE_RATIO * self.pages
+
+    def strip(self, text) -> str:
+        """Drop the leading and trailing template lines, and template runs of MIN_RUN+ lines in between."""
+        lines = [line for line in text.split("\n") if line.strip()]
+        flags = [self.is_boilerplate(line) for line in lines]
+        keep = [True] * len(lines)
+        i = 0
+        while i < len(lines):
+            if not flags[i]:
+                i += 1
+                continue
+            j = i
+            while j < len(lines) and flags[j]:
+                j += 1
+            if i == 0 or j == len(lines) or j - i >= MIN_RUN:
+                keep[i:j] = [False] * (j - i)
+            i = j
+        return "\n".join(line for line, k in zip(lines, keep) if k)
+
+    def record(self, url, before, after, chunk_size):
+        """Remember what stripping saved on `url`; returns (bytes removed, chunks of `chunk_size` tokens removed)."""
+        removed = len(before.encode("utf-8")) - len(after.encode("utf-8"))
+        chunks = -(-count_tokens(before) // chunk_size) - -(-count_tokens(after) // chunk_size)
+        self.report[url] = {"bytes_removed": removed, "chunks_removed": chunks}
+        return removed, chunks
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Lines seen on a single page can never be template text; keep the model small
+        lines = {key: n for key, n in self.lines.items() if n > 1}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"pages": self.pages, "lines": lines}, f)
+        os.replace(tmp, self.path)
+        if self.report:
+            with open(self.report_path, "w", encoding="utf-8") as f:
+                json.dump(self.report, f, indent=2)
+
+
+def boilerplate_summary(model) -> str:
+    if not model.report:
+        return "[BOILERPLATE] No pages stripped."
+    pages = len(model.report)
+    removed = sum(r["bytes_removed"] for r in model.report.values())
+    chunks = sum(r["chunks_removed"] for r in model.report.values())
+    return (f"[BOILERPLATE] Stripped template text from {pages} pages: {removed / 1024:.0f} KB "
+            f"({removed / pages / 1024:.1f} KB/page), {chunks} chunks ({chunks / pages:.1f}/page). "
+            f"Per-page report: {model.report_path}")
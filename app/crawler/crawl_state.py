@@ -0,0 +1,85 @@
+# Per-URL crawl state persisted between runs: HTTP validators (ETag / Last-Modified),
+# the hash of the last extracted page content and when the page was last crawled.
+
+import os
+import json
+import time
+from datetime import datetime, timezone
+
+CRAWL_STATE_PATH = os.getenv("CRAWL_STATE_PATH", "data/crawl_state.json")
+
+
+class CrawlState:
+    """On-disk validator cache and crawl history keyed by URL."""
+
+    def __init__(self, path=CRAWL_STATE_PATH):
+        self.path = path
+        self.pages = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.pages = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[STATE] Ignoring unreadable {path}: {e}")
+
+    def conditional_headers(self, url) -> dict:
+        entry = self.pages.get(url, {})
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def trusts_not_modified(self, url) -> bool:
+        """A 304 only proves the content unchanged when that content came from the HTML itself."""
+        return self.pages.get(url, {}).get("static", False)
+
+    def is_unchanged(self, url, content_hash) -> bool:
+        return self.pages.get(url, {}).get("content_hash") == content_hash
+
+    def record(self, url, content_hash, static, headers=None):
+        entry = self.pages.setdefault(url, {})
+        entry["content_hash"] = content_hash
+        entry["static"] = static
+        if headers is not None:
+            entry["etag"] = headers.get("etag")
+            entry["last_modified"] = headers.get("last-modified")
+        self.mark_crawled(url)
+
+    def mark_crawled(self, url):
+        """Record a successful crawl (including a 304 or an unchanged hash)."""
+        entry = self.pages.setdefault(url, {})
+        entry["last_crawled"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+    def forget(self, url):
+        """Drop everything known about `url`, so the next run fetches and indexes it from scratch."""
+        self.pages.pop(url, None)
+
+    def needs_crawl(self, url, lastmod) -> bool:
+        """True unless the sitemap says the page has not changed since our last successful crawl."""
+        last_crawled = parse_datetime(self.pages.get(url, {}).get("last_crawled"))
+        modified = parse_datetime(lastmod)
+        if last_crawled is None or modified is None:
+            return True
+        return modified > last_crawled
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.pages, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def parse_datetime(value):
+    """Parse a W3C / ISO-8601 timestamp (as used by sitemap <lastmod>) into an aware UTC datetime."""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
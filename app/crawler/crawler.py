@@ -4,108 +4,225 @@ import sys
 import time
 import json
 import asyncio
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
 from playwright.async_api import async_playwright
-from bs4 import BeautifulSoup
 from tqdm.asyncio import tqdm
-from app.utils.hash_utils import compute_hash
+from app.utils.chunker import build_chunks
+from app.crawler.rate_limiter import AdaptiveLimiter
+from app.crawler.robots import RobotsCache
+from app.crawler.frontier import Frontier, DONE
+from app.crawler.url_utils import canonicalize_url, SeenSet
+from app.crawler.boilerplate import BOILERPLATE_ENABLED, BoilerplateModel, boilerplate_summary
+from app.crawler.structured import STRUCTURED_ENABLED, extract_product
+from app.crawler.near_dup import NEAR_DUP_ENABLED, NearDupIndex
+from app.crawler.extract import extract_async, acquire_pool, release_pool
+from app.utils.sites import DEFAULT_SITE, get_site
 
-START_URL = "https://preprod-arunodayakurtis.zupain.com/product-list"
-DOMAIN = "preprod-arunodayakurtis.zupain.com"
+# Registry site to crawl (sites.toml); CRAWLER_SITE picks one, default the first / env-configured site
+SITE = get_site(os.getenv("CRAWLER_SITE") or None)
+START_URL = SITE.start_url
+DOMAIN = SITE.domain
 MAX_PAGES = 10
 CONCURRENCY = 16
 
-SKIP_PATTERNS = [
-    "/login", "/sign-up", "/bag", "/document/[path]", "/[path]/pd/[...pd]", "/explore"
+SKIP_PATTERNS = list(SITE.skip_patterns)
+STATE_NAME = "site" if SITE.name == DEFAULT_SITE else f"site_{SITE.name}"  # frontier / model files
+
+# Requests that never contribute page text
+BLOCKED_RESOURCE_TYPES = {"image", "stylesheet", "font", "media", "texttrack", "manifest", "websocket", "eventsource"}
+# Tracker hosts (and their subdomains) and whole path segments of beacon endpoints; both only
+# apply to subresources, so a page such as /tracksuits or /collections/tracking-pants still loads
+BLOCKED_HOSTS = [
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googleadservices.com",
+    "facebook.net", "hotjar.com", "hotjar.io", "clarity.ms", "segment.io", "mixpanel.com",
+    "sentry.io", "newrelic.com", "nr-data.net",
 ]
+BLOCKED_PATH_SEGMENTS = {"collect", "beacon", "track"}
+BLOCK_THIRD_PARTY = os.getenv("CRAWLER_BLOCK_THIRD_PARTY", "1") == "1"
+# First-party is the site's own host (with or without www.); other hosts that must still load
+# (e.g. a CDN serving the storefront JS) come from the site's first_party_hosts or this variable
+ALLOWED_HOSTS = [*SITE.first_party_hosts,
+                 *(h.strip() for h in os.getenv("CRAWLER_ALLOWED_HOSTS", "").split(",") if h.strip())]
+
+NAV_TIMEOUT = int(os.getenv("CRAWLER_NAV_TIMEOUT_MS", 30000))
+READY_TIMEOUT = float(os.getenv("CRAWLER_READY_TIMEOUT", 10))
+STABLE_SECONDS = float(os.getenv("CRAWLER_STABLE_SECONDS", 0.5))  # DOM text unchanged this long = ready
+PAGE_RECYCLE = int(os.getenv("CRAWLER_PAGE_RECYCLE", 100))  # pages per context before starting a fresh one
 
-def is_valid(link, visited, to_visit):
+def is_valid(link):
+    """Pattern checks only; membership is handled by the shared SeenSet."""
     return (
-        link not in visited and
-        link not in to_visit and
         "[" not in link and
         "]" not in link and
         not any(skip in link for skip in SKIP_PATTERNS)
         and not link.rstrip("/").endswith(DOMAIN)
     )
 
-async def extract_links_and_text(page, url):
-    async def block_resource(route):
-        if route.request.resource_type in ["image", "stylesheet", "font"]:
-            await route.abort()
-        else:
-            await route.continue_()
-    await page.route("**/*", block_resource)
-    await page.goto(url, wait_until="networkidle", timeout=60000)
+def _on_host(host, domain):
+    return host == domain or host.endswith("." + domain)
+
+def is_blocked_request(request):
+    if request.resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    if request.resource_type == "document":
+        return False  # navigations are the pages being crawled
+    parsed = urlparse(request.url)
+    host = parsed.hostname or ""
+    if any(_on_host(host, blocked) for blocked in BLOCKED_HOSTS):
+        return True
+    if BLOCKED_PATH_SEGMENTS.intersection(parsed.path.lower().split("/")):
+        return True
+    if BLOCK_THIRD_PARTY:
+        first_party = SITE.owns(request.url)
+        allowed = any(_on_host(host, h) for h in ALLOWED_HOSTS)
+        return not (first_party or allowed)
+    return False
+
+async def block_resource(route):
+    if is_blocked_request(route.request):
+        await route.abort()
+    else:
+        await route.continue_()
+
+async def open_page(browser):
+    """Long-lived context + page for one worker; the blocklist is installed once per context."""
+    context = await browser.new_context()
+    await context.route("**/*", block_resource)
+    page = await context.new_page()
+    return context, page
+
+async def wait_until_ready(page, selector=SITE.ready_selector):
+    """Ready when `selector` appears, or when the body text stops changing for STABLE_SECONDS."""
+    if selector:
+        try:
+            await page.wait_for_selector(selector, timeout=READY_TIMEOUT * 1000)
+        except Exception as e:
+            print(f"[WAIT TIMEOUT] {page.url}: {type(e).__name__}")
+        return
+    deadline = time.monotonic() + READY_TIMEOUT
+    last_length, stable_since = -1, time.monotonic()
+    while time.monotonic() < deadline:
+        length = await page.evaluate("document.body ? document.body.innerText.length : 0")
+        if length != last_length:
+            last_length, stable_since = length, time.monotonic()
+        elif length and time.monotonic() - stable_since >= STABLE_SECONDS:
+            return
+        await asyncio.sleep(0.1)
+
+async def extract_links_and_text(page, url, slot=None):
+    response = await page.goto(url, wait_until="domcontentloaded", timeout=NAV_TIMEOUT)
+    if slot is not None and response is not None:
+        slot.status = response.status
+    await wait_until_ready(page)
     html = await page.content()
-    soup = BeautifulSoup(html, "html.parser")
-    text = soup.get_text(separator=' ', strip=True)
-    links = set()
-    for a in soup.find_all("a", href=True):
-        href = urljoin(url, a["href"])
-        parsed = urlparse(href)
-        if parsed.netloc == DOMAIN and parsed.scheme in ("http", "https"):
-            links.add(href.split("#")[0])
-    return text, links
-
-async def worker(queue, visited, all_chunks, all_found_urls, pbar, chunk_size, browser):
+    # Parsed in the extraction process pool so the other workers keep navigating meanwhile
+    # One line per text node, so the boilerplate model can recognise template lines
+    content = await extract_async(html, url, separator="\n", domain=DOMAIN)
+    product = extract_product(content, url) if STRUCTURED_ENABLED else None
+    return content.text, set(content.links), content.canonical, product
+
+async def worker(queue, seen, visited, indexed, frontier, all_found_urls, pbar, chunk_size, browser, limiter, dupes, near_dup=None, boilerplate=None):
+    """`seen` holds every canonical URL ever queued, `visited` the fetched ones and `indexed` the
+    URLs whose content was chunked (a page's rel=canonical target counts as indexed)."""
+    context, page = await open_page(browser)
+    served = 0
     while True:
         url = await queue.get()
         try:
             if url is None:
                 print(f"[Worker] Received stop signal.")
+                await context.close()
                 break
-            if url in visited:
+            if not frontier.lease(url):
+                continue
+            if url in indexed:
+                # Already indexed through another page's rel=canonical
+                frontier.complete(url, [])
                 continue
-            context = await browser.new_context()
-            page = await context.new_page()
+            if served >= PAGE_RECYCLE or page.is_closed():
+                await context.close()
+                context, page = await open_page(browser)
+                served = 0
+            served += 1
             try:
                 print(f"[Worker] Crawling: {url}")
                 start_time = time.time()
-                text, links = await extract_links_and_text(page, url)
+                async with limiter.slot(url) as slot:
+                    text, links, canonical, product = await extract_links_and_text(page, url, slot)
                 elapsed = time.time() - start_time
                 print(f"[Worker] Done: {url} ({elapsed:.1f}s, {len(links)} links found)")
             except Exception as e:
                 print(f"[Worker] ERROR: {url} ({type(e).__name__}): {e}")
+                if frontier.fail(url, f"{type(e).__name__}: {e}"):
+                    await queue.put(url)
+                served = PAGE_RECYCLE  # start the next URL on a fresh context
             else:
-                for i in range(0, len(text), chunk_size):
-                    chunk = text[i:i+chunk_size]
-                    if chunk.strip():
-                        chunk_id = f"{url}_chunk_{i//chunk_size}"
-                        all_chunks.append({
-                            "chunk_id": chunk_id,
-                            "url": url,
-                            "content": chunk,
-                            "last_updated": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
-                            "hash": compute_hash(chunk)
-                        })
+                page_url = canonicalize_url(canonical) if canonical else url
+                if page_url != url and page_url in indexed:
+                    dupes["rel_canonical"] += 1
+                    text = ""
+                seen.add(page_url)
+                indexed.add(page_url)
+                if text and boilerplate is not None:
+                    boilerplate.observe(text)
+                    stripped = boilerplate.strip(text)
+                    boilerplate.record(page_url, text, stripped, chunk_size)
+                    text = stripped
+                page_chunks = build_chunks(page_url, text, chunk_size)
+                if page_chunks and near_dup is not None and near_dup.check(page_url, text) is not None:
+                    # Colour / size variant of a page we already indexed
+                    dupes["near_duplicate"] += 1
+                    dupes["near_duplicate_chunks"] += len(page_chunks)
+                    page_chunks = []
+                if product is not None:
+                    product.url = page_url
+                    page_chunks.insert(0, product.to_chunk())
+                frontier.complete(url, page_chunks)
                 for link in links:
+                    new_link = link not in all_found_urls
                     all_found_urls.add(link)
-                    if is_valid(link, visited, queue._queue):
-                        await queue.put(link)
+                    link = canonicalize_url(link)
+                    if not is_valid(link):
+                        continue
+                    if seen.add(link):
+                        if frontier.add([link]):
+                            await queue.put(link)
+                    elif new_link:
+                        # A different spelling of a page we already have: the old check would have fetched it
+                        dupes["canonical_url"] += 1
                 visited.add(url)
                 pbar.update(1)
-            await page.close()
-            await context.close()
         finally:
             queue.task_done()
 
 async def crawl_site(start_url):
-    visited = set()
-    all_chunks = []
     all_found_urls = set()
-    chunk_size = 500
+    chunk_size = 128  # max tokens per chunk
+
+    # Pages and chunks are committed to the frontier as they finish, so a killed run resumes here
+    frontier = Frontier(STATE_NAME)
+    frontier.start([canonicalize_url(start_url)])
+    seen = SeenSet(frontier.urls())
+    visited = SeenSet(frontier.urls(DONE))
+    indexed = SeenSet(frontier.urls(DONE))
+    dupes = {"canonical_url": 0, "rel_canonical": 0, "near_duplicate": 0, "near_duplicate_chunks": 0}
+    near_dup = NearDupIndex(STATE_NAME) if NEAR_DUP_ENABLED else None
+    boilerplate = BoilerplateModel(STATE_NAME) if BOILERPLATE_ENABLED else None
 
     queue = asyncio.Queue()
-    await queue.put(start_url)
+    for url in frontier.pending():
+        await queue.put(url)
 
-    pbar = tqdm(total=MAX_PAGES, desc="Crawling", unit="page")
+    pbar = tqdm(total=MAX_PAGES, initial=len(visited), desc="Crawling", unit="page")
+    # CONCURRENCY workers is the ceiling; the limiter decides how many fetch at once
+    limiter = AdaptiveLimiter(CONCURRENCY, robots=RobotsCache())
 
+    acquire_pool()  # start the parser processes before the first page arrives
     try:
         async with async_playwright() as p:
             browser = await p.chromium.launch(headless=True)
             workers = [
-                asyncio.create_task(worker(queue, visited, all_chunks, all_found_urls, pbar, chunk_size, browser))
+                asyncio.create_task(worker(queue, seen, visited, indexed, frontier, all_found_urls, pbar, chunk_size, browser, limiter, dupes, near_dup, boilerplate))
                 for _ in range(CONCURRENCY)
             ]
 
@@ -125,6 +242,7 @@ async def crawl_site(start_url):
                         await asyncio.sleep(1)
                     else:
                         await asyncio.sleep(0.1)
+                frontier.finish()
             except KeyboardInterrupt:
                 print("\n[Main] KeyboardInterrupt received! Saving progress and shutting down...")
             finally:
@@ -138,18 +256,35 @@ async def crawl_site(start_url):
             pbar.close()
     finally:
         print(f"[Main] Finished. Crawled {len(visited)} pages.")
-        print(f"[Main] About to save {len(all_chunks)} chunks to data/site_chunks.json")
+        print(f"[Main] Duplicate fetches avoided: {dupes['canonical_url']} by URL canonicalization, "
+              f"{dupes['rel_canonical']} pages indexed once via rel=canonical.")
+        print(f"[Main] Near-duplicate pages aliased: {dupes['near_duplicate']}, "
+              f"saving {dupes['near_duplicate_chunks']} chunks and their embedding calls.")
+        if near_dup is not None:
+            near_dup.save()
+        if boilerplate is not None:
+            print(boilerplate_summary(boilerplate))
+            boilerplate.save()
+        print(limiter.summary())
+        chunk_count = frontier.chunk_count()
+        print(f"[Main] About to save {chunk_count} chunks to data/site_chunks.json")
         try:
             os.makedirs("data", exist_ok=True)
             with open("data/site_chunks.json", "w") as f:
-                json.dump(all_chunks, f, indent=2)
+                # Stream chunks out of the frontier instead of holding the whole site in memory
+                f.write("[\n")
+                for n, chunk in enumerate(frontier.iter_chunks()):
+                    f.write(("" if n == 0 else ",\n") + json.dumps(chunk, indent=2))
+                f.write("\n]")
             with open("data/unique_urls.json", "w") as f:
-                json.dump(sorted(list(visited)), f, indent=2)
+                json.dump(sorted(frontier.urls(DONE)), f, indent=2)
             with open("data/all_found_urls.json", "w") as f:
                 json.dump(sorted(list(all_found_urls)), f, indent=2)
-            print(f"[Main] Saved {len(all_chunks)} chunks, {len(visited)} unique visited URLs, {len(all_found_urls)} found URLs.")
+            print(f"[Main] Saved {chunk_count} chunks, {len(visited)} unique visited URLs, {len(all_found_urls)} found URLs.")
         except Exception as e:
             print(f"[Main] ERROR saving files: {e}")
+        frontier.close()
+        release_pool()
 
 def main():
     asyncio.run(crawl_site(START_URL))
@@ -7,50 +7,57 @@ import os
 import sys
 import time
 import asyncio
+import argparse
+from itertools import groupby
+from operator import itemgetter
 from tqdm import tqdm
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
 
+from app.crawler.driver_pool import DriverPool, get_driver
+from app.crawler.extract import acquire_pool, release_pool
+from app.crawler.frontier import Frontier
+from app.crawler.boilerplate import BOILERPLATE_ENABLED, BoilerplateModel, boilerplate_summary
+from app.crawler.near_dup import NEAR_DUP_ENABLED, NearDupIndex, near_dup_summary
+from app.crawler.crawl_state import CrawlState
+from app.crawler.http_fetch import create_http_client, fetch_static, static_summary
 from app.crawler.sitemap import extract_sitemap_links
-from app.crawler.robots import is_allowed
+from app.crawler.rate_limiter import AdaptiveLimiter
+from app.crawler.robots import RobotsCache
 from app.utils.hash_utils import compute_hash
+from app.utils.chunker import MAX_TOKENS, build_chunks
+from app.utils.sites import default_site, get_site
 
-# ENV variables
-START_URL = os.getenv("CRAWLER_START_URL", "https://preprod-arunodayakurtis.zupain.com")
-CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 1000))
+# ENV variables (start URL, readiness check and concurrency are per site: app/utils/sites.py)
+CHUNK_SIZE = MAX_TOKENS  # tokens per chunk (CHUNK_MAX_TOKENS)
 WAIT_SECONDS = float(os.getenv("CRAWLER_WAIT_SECONDS", 2))
-CONCURRENCY = int(os.getenv("CRAWLER_CONCURRENCY", 8))
-
-def get_driver():
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless=new")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-zygote")
-    options.add_argument("--disable-software-rasterizer")
-    options.add_argument("--disable-crash-reporter")
-    return webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-
-def scrape_url_with_selenium(url, chunk_size=CHUNK_SIZE):
+HTTP_FIRST = os.getenv("CRAWLER_HTTP_FIRST", "1") != "0"
+FULL_CRAWL = os.getenv("CRAWLER_FULL", "0") == "1"
+
+def ready_locator(site=None):
+    """What the browser waits for: the site's CSS selector, or any of its ready_text strings."""
+    site = site or default_site()
+    if site.ready_selector:
+        return (By.CSS_SELECTOR, site.ready_selector)
+    return (By.XPATH, "//*[" + " or ".join(f"contains(text(), '{text}')" for text in site.ready_text) + "]")
+
+def scrape_url_with_selenium(url, chunk_size=CHUNK_SIZE, pool=None, site=None):
+    """Render `url` and chunk its body text. Borrows a driver from `pool` when given."""
+    return build_chunks(url, render_page_text(url, pool, ready_locator(site)), chunk_size)
+
+def render_page_text(url, pool=None, locator=None):
     body_text = ""
-    chunks = []
+    driver = None
+    crashed = False
+    start_time = time.time()
 
     try:
-        driver = get_driver()
+        driver = pool.acquire() if pool else get_driver()
         driver.get(url)
 
         try:
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((
-                    By.XPATH,
-                    "//*[contains(text(), '₹') or contains(text(), 'Add to Cart')]"
-                ))
-            )
+            WebDriverWait(driver, 10).until(EC.presence_of_element_located(locator or ready_locator()))
         except Exception as e:
             print(f"[WAIT TIMEOUT] {url}: {e}")
 
@@ -59,88 +66,243 @@ def scrape_url_with_selenium(url, chunk_size=CHUNK_SIZE):
         except Exception as e:
             print(f"[BODY ERROR] {url}: {e}")
 
+        if not body_text.strip():
+            print(f"[EMPTY PAGE WARNING] No content extracted from: {url}")
+            try:
+                os.makedirs("logs/failures", exist_ok=True)
+                with open(f"logs/failures/{url.split('/')[-1]}.html", "w", encoding="utf-8") as f:
+                    f.write(driver.page_source)
+            except Exception as e:
+                print(f"[SNAPSHOT ERROR] Could not log failed page HTML for {url}: {e}")
+
     except Exception as e:
         print(f"[SCRAPE ERROR] {url}: {e}")
+        crashed = True
 
     finally:
-        try:
-            driver.quit()
-        except Exception:
-            pass
+        if driver is not None:
+            if pool:
+                pool.release(driver, crashed=crashed, elapsed=time.time() - start_time)
+            else:
+                try:
+                    driver.quit()
+                except Exception:
+                    pass
 
-    if not body_text.strip():
-        print(f"[EMPTY PAGE WARNING] No content extracted from: {url}")
-        try:
-            os.makedirs("logs/failures", exist_ok=True)
-            with open(f"logs/failures/{url.split('/')[-1]}.html", "w", encoding="utf-8") as f:
-                f.write(driver.page_source)
-        except Exception as e:
-            print(f"[SNAPSHOT ERROR] Could not log failed page HTML for {url}: {e}")
-
-    for i in range(0, len(body_text), chunk_size):
-        chunk = body_text[i:i + chunk_size]
-        if chunk.strip():
-            content_hash = compute_hash(chunk)
-            chunks.append({
-                "url": url,
-                "content": chunk,
-                "chunk_id": f"{url}_chunk_{i // chunk_size}",
-                "last_updated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-                "hash": content_hash
-            })
-
-    return chunks
-
-async def get_crawlable_urls(site_url):
-    all_urls = await extract_sitemap_links(site_url)
-    print(f"[SITEMAP] Total URLs collected: {len(all_urls)}")
+    return body_text
+
+async def get_crawlable_urls(site_url, robots=None):
+    """Sitemap entries of `site_url` that robots.txt allows us to fetch."""
+    robots = robots if robots is not None else RobotsCache()
+    entries = await extract_sitemap_links(site_url, robots)
+    print(f"[SITEMAP] Total URLs collected: {len(entries)}")
     # You can skip writing URLs to disk if not needed
-    crawlable = [u for u in all_urls if is_allowed(u)]
+    allowed = await asyncio.gather(*(robots.is_allowed(e.loc) for e in entries))
+    crawlable = [e for e, ok in zip(entries, allowed) if ok]
     print(f"Total crawlable URLs (after robots.txt): {len(crawlable)}")
     return crawlable
 
-async def crawl_all_sitemap_urls(site_url, chunk_size=CHUNK_SIZE, concurrency=CONCURRENCY):
-    urls = await get_crawlable_urls(site_url)
-    all_chunks = []
+async def crawl_all_sitemap_urls(site=None, chunk_size=CHUNK_SIZE, state=None, stats=None,
+                                 full=FULL_CRAWL, on_chunks=None, budget=None):
+    """Crawl the sitemap of `site` (a registry Site; the env-configured one by default).
+
+    Incremental by default: only URLs whose <lastmod> is newer than their last successful
+    crawl are fetched, and unchanged content is skipped. `full=True` recrawls everything.
+    With `on_chunks` (an async callback taking the url and its chunks) each changed page's
+    chunks are handed over as soon as the page is done, also when there are none left (an alias
+    or a page emptied by boilerplate stripping), and nothing is returned; otherwise all chunks
+    are returned at the end. stats["site_urls"] lists every crawlable sitemap URL, for cleanup.
+    With a SharedBudget `budget` every fetch also holds one of its global slots, so sites crawled
+    in parallel share one concurrency limit fairly (see AdaptiveLimiter.slot).
+    """
+    site = site or default_site()
+    state = state if state is not None else CrawlState(site.state_path)
+    robots = RobotsCache()
+    entries = [e for e in await get_crawlable_urls(site.start_url, robots) if not site.skipped(e.loc)]
+    urls = [e.loc for e in entries if full or state.needs_crawl(e.loc, e.lastmod)]
+    # A run that was killed (or outlived its interval) resumes its own URL list instead of restarting
+    frontier = Frontier(site.name)
+    if full:
+        frontier.finish()  # a full crawl starts over with every URL, not an earlier run's leftovers
+    if frontier.start(urls):
+        urls = frontier.pending()
+        if on_chunks is not None:
+            # Pages finished before the restart may not have reached the sink; re-sending is idempotent
+            for url, page_chunks in groupby(frontier.iter_chunks(), key=itemgetter("url")):
+                await on_chunks(url, list(page_chunks))
+    print(f"[CRAWLER] {site.name}: {'full' if full else 'incremental'} crawl, {len(urls)} of {len(entries)} URLs to fetch.")
     visited = []
-    pbar = tqdm(total=len(urls), desc="Crawling", unit="page", dynamic_ncols=True)
-    sem = asyncio.Semaphore(concurrency)
+    pbar = tqdm(total=len(urls), desc=f"Crawling {site.name}", unit="page", dynamic_ncols=True)
+    limiter = AdaptiveLimiter(site.concurrency, robots=robots, budget=budget, name=site.name)
+    locator = ready_locator(site)
+    acquire_pool()  # start the parser processes before the first page arrives
+    pool = DriverPool(site.concurrency)
+    client = create_http_client(site.concurrency) if HTTP_FIRST else None
+    stats = stats if stats is not None else {}
+    near_dup = NearDupIndex(site.name) if NEAR_DUP_ENABLED else None
+    boilerplate = BoilerplateModel(site.name) if BOILERPLATE_ENABLED else None
+    if budget is not None:
+        budget.register(site.name)
+    for key in ("static_pages", "static_time", "browser_pages", "cache_hits", "cache_misses",
+                "near_dup_pages", "near_dup_chunks", "near_dup_bytes", "boilerplate_bytes", "boilerplate_chunks",
+                "structured_pages", "products"):
+        stats.setdefault(key, 0)
+    stats["lastmod_skipped"] = len(entries) - len(urls)
+    stats["site_urls"] = [e.loc for e in entries]
+
+    # Until the template model has seen WARMUP_PAGES pages (or every page of this run arrived),
+    # changed pages wait after fetching so none is indexed with its header and footer still in it
+    warm = asyncio.Event()
+    not_arrived = [len(urls)]
+
+    def arrive():
+        not_arrived[0] -= 1
+        if not_arrived[0] <= 0 or boilerplate is None or boilerplate.ready:
+            warm.set()
+
+    async def strip_boilerplate(url, text):
+        boilerplate.observe(text)
+        arrive()
+        await warm.wait()
+        stripped = boilerplate.strip(text)
+        removed, removed_chunks = boilerplate.record(url, text, stripped, chunk_size)
+        stats["boilerplate_bytes"] += removed
+        stats["boilerplate_chunks"] += removed_chunks
+        return stripped
+
+    async def fetch_page_text(url, slot):
+        """Return (text, served_statically, response_headers, product); text is None for a trusted 304."""
+        headers = product = None
+        if client is not None:
+            start_time = time.time()
+            conditional = None if full else state.conditional_headers(url)
+            status, text, headers, product = await fetch_static(client, url, conditional, site.ready_selector,
+                                                                site.ready_text)
+            if status is None or status == 429 or status >= 500:
+                slot.fail(status)
+            if status == 304 and state.trusts_not_modified(url):
+                return None, True, headers, None
+            if text is not None:
+                stats["static_pages"] += 1
+                stats["static_time"] += time.time() - start_time
+                if product is not None and product.complete():
+                    stats["structured_pages"] += 1
+                return text, True, headers, product
+        stats["browser_pages"] += 1
+        text = await asyncio.to_thread(render_page_text, url, pool, locator)
+        if not text.strip():
+            print(f"[RETRY] Retrying crawl for: {url}")
+            text = await asyncio.to_thread(render_page_text, url, pool, locator)
+            if not text.strip():
+                slot.fail()
+        return text, False, headers, product
 
     async def crawl_one(url):
-        async with sem:
-            try:
-                chunks = await asyncio.to_thread(scrape_url_with_selenium, url, chunk_size)
-                if not chunks:
-                    print(f"[RETRY] Retrying crawl for: {url}")
-                    chunks = await asyncio.to_thread(scrape_url_with_selenium, url, chunk_size)
-            except Exception as e:
-                print(f"[CRAWL ERROR] {url}: {e}")
-                chunks = []
-
-            all_chunks.extend(chunks)
-            visited.append(url)
-            pbar.set_postfix({
-                "Done": len(visited),
-                "Remain": pbar.total - len(visited),
-                "ETA": pbar.format_interval(
-                    pbar.format_dict['elapsed'] *
-                    (pbar.total - len(visited)) /
-                    max(1, len(visited))
-                )
-            })
-            pbar.update(1)
-
-    tasks = [crawl_one(url) for url in urls]
-    await asyncio.gather(*tasks)
+        arrived = False
+        if not frontier.lease(url):
+            arrive()
+            return
+        try:
+            chunks = []
+            changed = False
+            async with limiter.slot(url) as slot:
+                text, static, headers, product = await fetch_page_text(url, slot)
+            if text is None:
+                stats["cache_hits"] += 1
+                state.mark_crawled(url)
+            elif text.strip() or product is not None:
+                # Structured fields count as content: a price change alone must not look unchanged
+                content_hash = compute_hash(text + (product.summary() if product is not None else ""))
+                if not full and state.is_unchanged(url, content_hash):
+                    stats["cache_hits"] += 1
+                else:
+                    stats["cache_misses"] += 1
+                    changed = True
+                    if boilerplate is not None:
+                        arrived = True
+                        text = await strip_boilerplate(url, text)
+                    chunks = build_chunks(url, text, chunk_size)
+                    canonical = near_dup.check(url, text) if near_dup is not None else None
+                    if canonical is not None:
+                        # A variant of an already indexed page: record the alias, index none of its text
+                        stats["near_dup_pages"] += 1
+                        stats["near_dup_chunks"] += len(chunks)
+                        stats["near_dup_bytes"] += len(text.encode("utf-8"))
+                        chunks = []
+                    if product is not None:
+                        # Variants keep their own record even when their text is an alias
+                        stats["products"] += 1
+                        chunks.insert(0, product.to_chunk())
+                state.record(url, content_hash, static, headers)
+            frontier.complete(url, chunks)
+            if on_chunks is not None and changed:
+                await on_chunks(url, chunks)
+        except Exception as e:
+            print(f"[CRAWL ERROR] {url}: {e}")
+            if frontier.fail(url, e):
+                return
+        finally:
+            if not arrived:
+                arrive()
+
+        visited.append(url)
+        pbar.set_postfix({
+            "Done": len(visited),
+            "Remain": pbar.total - len(visited),
+            "ETA": pbar.format_interval(
+                pbar.format_dict['elapsed'] *
+                (pbar.total - len(visited)) /
+                max(1, len(visited))
+            )
+        })
+        pbar.update(1)
+
+    try:
+        # Failed URLs go back to pending until they run out of attempts
+        while urls:
+            await asyncio.gather(*(crawl_one(url) for url in urls))
+            urls = frontier.pending()
+    finally:
+        pool.close()
+        if client is not None:
+            await client.aclose()
+        if budget is not None:
+            await budget.unregister(site.name)
+        release_pool()
 
     pbar.close()
+    print(pool.summary())
+    print(static_summary(stats, pool.stats))
+    print(limiter.summary())
+    print(f"[CACHE] Unchanged pages skipped: {stats['cache_hits']}, changed or new: {stats['cache_misses']}, "
+          f"not modified per sitemap: {stats['lastmod_skipped']}")
+    print(f"[STRUCTURED] Product records: {stats['products']}, pages indexed from structured data "
+          f"without a browser: {stats['structured_pages']}")
+    if near_dup is not None:
+        print(near_dup_summary(stats))
+        near_dup.save()
+    if boilerplate is not None:
+        print(boilerplate_summary(boilerplate))
+        boilerplate.save()
     # Optionally skip saving visited URLs to disk here
+    all_chunks = list(frontier.iter_chunks()) if on_chunks is None else []
+    frontier.finish()
+    frontier.close()
     return all_chunks
 
-def main():
+def main(state=None, stats=None, full=FULL_CRAWL, site=None):
+    """Crawl `site` (the env-configured one by default) and return the chunks of new or changed pages.
+
+    The crawl state is never saved here: its hashes may only be kept once the returned chunks are
+    upserted, so the caller saves `state` after that (see app/pipeline/streaming.py).
+    """
+    site = site or default_site()
+    state = state if state is not None else CrawlState(site.state_path)
+    stats = stats if stats is not None else {}
     try:
-        all_chunks = asyncio.run(crawl_all_sitemap_urls(START_URL))
+        all_chunks = asyncio.run(crawl_all_sitemap_urls(site, state=state, stats=stats, full=full))
         print(f"\n[CRAWLER] Crawled and generated {len(all_chunks)} chunks.")
+        stats["completed"] = True
         return all_chunks  # Return chunks directly instead of saving JSON
     except KeyboardInterrupt:
         print("\n[CRAWLER] Interrupted manually. Exiting.")
@@ -150,4 +312,8 @@ def main():
         return []
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Crawl the sitemap of a registry site (or CRAWLER_START_URL).")
+    parser.add_argument("--full", action="store_true", help="Recrawl every URL, ignoring lastmod and the validator cache")
+    parser.add_argument("--site", help="Name of the site in sites.toml (default: the first one)")
+    args = parser.parse_args()
+    main(full=args.full or FULL_CRAWL, site=get_site(args.site))
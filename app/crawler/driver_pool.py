@@ -0,0 +1,108 @@
+# Pool of warm headless Chrome drivers shared by the Selenium crawler threads.
+# Drivers are reused across URLs and recycled after a number of pages or when they crash.
+
+import os
+import queue
+import threading
+from functools import lru_cache
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+DRIVER_MAX_PAGES = int(os.getenv("CRAWLER_DRIVER_MAX_PAGES", 50))
+
+
+@lru_cache(maxsize=1)
+def get_driver_path() -> str:
+    """Resolve the chromedriver binary once per process."""
+    return ChromeDriverManager().install()
+
+
+def get_driver():
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-zygote")
+    options.add_argument("--disable-software-rasterizer")
+    options.add_argument("--disable-crash-reporter")
+    return webdriver.Chrome(service=Service(get_driver_path()), options=options)
+
+
+class DriverPool:
+    """Thread-safe pool of at most `size` live Chrome drivers."""
+
+    def __init__(self, size, max_pages=DRIVER_MAX_PAGES):
+        self.size = size
+        self.max_pages = max_pages
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._pages = {}  # id(driver) -> pages served
+        self.stats = {"hits": 0, "created": 0, "recycles": 0, "crashes": 0, "pages": 0, "page_time": 0.0}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def acquire(self):
+        """Borrow a warm driver, starting a new one only if none is idle."""
+        self._slots.acquire()
+        try:
+            driver = self._idle.get_nowait()
+            self._count("hits")
+            return driver
+        except queue.Empty:
+            pass
+        try:
+            driver = get_driver()
+        except Exception:
+            self._slots.release()
+            raise
+        self._count("created")
+        self._pages[id(driver)] = 0
+        return driver
+
+    def release(self, driver, crashed=False, elapsed=None):
+        """Return a driver; crashed or worn-out drivers are quit instead of reused."""
+        if elapsed is not None:
+            self._count("pages")
+            self._count("page_time", elapsed)
+        served = self._pages.get(id(driver), 0) + 1
+        self._pages[id(driver)] = served
+        if crashed or served >= self.max_pages:
+            self._count("crashes" if crashed else "recycles")
+            self._quit(driver)
+        else:
+            self._idle.put(driver)
+        self._slots.release()
+
+    def _quit(self, driver):
+        self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        while True:
+            try:
+                self._quit(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def summary(self) -> str:
+        s = self.stats
+        avg = s["page_time"] / s["pages"] if s["pages"] else 0.0
+        return (
+            f"[POOL] size={self.size} started={s['created']} hits={s['hits']} "
+            f"recycles={s['recycles']} crashes={s['crashes']} avg_page={avg:.2f}s"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
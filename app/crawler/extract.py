@@ -0,0 +1,270 @@
+# Pluggable HTML extraction engine: page text, same-site links, rel=canonical and JSON-LD.
+# Parsing is CPU-bound, so the async crawlers hand it to a process pool and keep fetching
+# while every core parses. "bs4" is the reference engine, "lxml" the fast default.
+
+import os
+import json
+import asyncio
+import multiprocessing
+from dataclasses import dataclass, field
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+from lxml import etree
+from lxml import html as lxml_html
+
+try:
+    from lxml.cssselect import CSSSelector
+except ImportError:  # cssselect is optional; selectors then go through BeautifulSoup
+    CSSSelector = None
+
+EXTRACT_ENGINE = os.getenv("CRAWLER_EXTRACT_ENGINE", "lxml")
+EXTRACT_WORKERS = int(os.getenv("CRAWLER_EXTRACT_WORKERS", os.cpu_count() or 1))  # 0 = parse in-process
+
+# BeautifulSoup's get_text() never returns the strings inside these
+NON_TEXT_TAGS = {"script", "style", "template"}
+JSON_LD_TYPE = "application/ld+json"
+META_PREFIXES = ("og:", "product:")
+PRODUCT_ITEMTYPE = "schema.org/Product"
+
+
+@dataclass
+class PageContent:
+    text: str
+    links: list = field(default_factory=list)  # absolute, fragment-free, in document order
+    canonical: str = None
+    json_ld: list = field(default_factory=list)
+    selector_found: bool = None  # None when no selector was asked for
+    meta: dict = field(default_factory=dict)  # OpenGraph / product:* meta tags
+    microdata: list = field(default_factory=list)  # {itemprop: [values]} per schema.org/Product scope
+
+
+def _collect_links(hrefs, url, domain):
+    links = {}
+    for href in hrefs:
+        href = urljoin(url, href)
+        parsed = urlparse(href)
+        if parsed.scheme in ("http", "https") and (domain is None or parsed.netloc == domain):
+            links[href.split("#")[0]] = None
+    return list(links)
+
+
+def _is_meta_key(key):
+    return key.startswith(META_PREFIXES)
+
+
+def _is_product_scope(itemtype):
+    return PRODUCT_ITEMTYPE in (itemtype or "")
+
+
+def _parse_json_ld(blocks):
+    items = []
+    for raw in blocks:
+        try:
+            data = json.loads(raw)
+        except (TypeError, ValueError):
+            continue
+        items.extend(data if isinstance(data, list) else [data])
+    return items
+
+
+class SoupExtractor:
+    """Reference engine: BeautifulSoup with html.parser, exactly what the crawlers used before."""
+
+    name = "bs4"
+
+    def extract(self, html, url, *, separator=" ", body_only=False, drop_tags=(), domain=None, selector=None):
+        soup = BeautifulSoup(html, "html.parser")
+        links = _collect_links((a["href"] for a in soup.find_all("a", href=True)), url, domain)
+        canonical = None
+        tag = soup.find("link", rel="canonical", href=True)
+        if tag:
+            canonical = urljoin(url, tag["href"])
+        json_ld = _parse_json_ld(
+            s.string for s in soup.find_all("script")
+            if (s.get("type") or "").strip().lower() == JSON_LD_TYPE
+        )
+        found = None if not selector else soup.select_one(selector) is not None
+        meta = {}
+        for tag in soup.find_all("meta", content=True):
+            key = (tag.get("property") or tag.get("name") or "").strip().lower()
+            if _is_meta_key(key):
+                meta.setdefault(key, tag["content"])
+        microdata = []
+        for scope in soup.find_all(itemscope=True):
+            if _is_product_scope(scope.get("itemtype")):
+                props = {}
+                for el in scope.find_all(itemprop=True):
+                    value = el.get("content") or el.get("href") or el.get("src") or el.get_text(" ", strip=True)
+                    for name in el["itemprop"].split():
+                        props.setdefault(name, []).append(value)
+                microdata.append(props)
+        for tag in soup(list(drop_tags)):
+            tag.decompose()
+        root = (soup.body or soup) if body_only else soup
+        return PageContent(root.get_text(separator=separator, strip=True), links, canonical, json_ld, found,
+                           meta, microdata)
+
+
+class LxmlExtractor:
+    """libxml2-backed engine; produces the same text and links as SoupExtractor, several times faster."""
+
+    name = "lxml"
+
+    def extract(self, html, url, *, separator=" ", body_only=False, drop_tags=(), domain=None, selector=None):
+        root = self._parse(html)
+        if root is None:
+            return PageContent("", selector_found=None if not selector else False)
+        links = _collect_links((a.get("href") for a in root.iter("a") if a.get("href") is not None), url, domain)
+        canonical = None
+        for link in root.iter("link"):
+            if "canonical" in (link.get("rel") or "").split() and link.get("href") is not None:
+                canonical = urljoin(url, link.get("href"))
+                break
+        json_ld = _parse_json_ld(
+            s.text for s in root.iter("script")
+            if (s.get("type") or "").strip().lower() == JSON_LD_TYPE
+        )
+        found = None if not selector else self._select(root, html, selector)
+        meta = {}
+        for tag in root.iter("meta"):
+            key = (tag.get("property") or tag.get("name") or "").strip().lower()
+            if tag.get("content") is not None and _is_meta_key(key):
+                meta.setdefault(key, tag.get("content"))
+        microdata = []
+        for scope in root.iter(etree.Element):
+            if scope.get("itemscope") is not None and _is_product_scope(scope.get("itemtype")):
+                props = {}
+                for el in scope.iter(etree.Element):
+                    if el is scope or el.get("itemprop") is None:
+                        continue
+                    value = el.get("content") or el.get("href") or el.get("src") or _joined_text(el, " ")
+                    for name in el.get("itemprop").split():
+                        props.setdefault(name, []).append(value)
+                microdata.append(props)
+        if body_only:
+            body = root.find("body")
+            root = body if body is not None else root
+        skip = NON_TEXT_TAGS | set(drop_tags)
+        return PageContent(_joined_text(root, separator, skip), links, canonical, json_ld, found, meta, microdata)
+
+    @staticmethod
+    def _parse(html):
+        if not html or not html.strip():
+            return None
+        try:
+            return lxml_html.document_fromstring(html)
+        except ValueError:
+            # Unicode input that still carries an XML encoding declaration
+            return lxml_html.document_fromstring(html.encode("utf-8"))
+        except etree.ParserError:
+            return None
+
+    @staticmethod
+    def _select(root, html, selector):
+        if CSSSelector is not None:
+            return bool(CSSSelector(selector)(root))
+        return BeautifulSoup(html, "lxml").select_one(selector) is not None
+
+
+def _joined_text(root, separator, skip=NON_TEXT_TAGS):
+    """lxml equivalent of BeautifulSoup's get_text(separator, strip=True)."""
+    parts = [s.strip() for s in _text_nodes(root, skip)]
+    return separator.join(p for p in parts if p)
+
+
+def _text_nodes(root, skip):
+    """Text and tail strings in document order, skipping comments and `skip` subtrees (but not their tails)."""
+    if root.text:
+        yield root.text
+    stack = [(iter(root), None)]
+    while stack:
+        children, tail = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            if tail:
+                yield tail
+            continue
+        if isinstance(child.tag, str) and child.tag not in skip:
+            if child.text:
+                yield child.text
+            stack.append((iter(child), child.tail))
+        elif child.tail:
+            yield child.tail
+
+
+ENGINES = {"bs4": SoupExtractor, "lxml": LxmlExtractor}
+
+
+@lru_cache(maxsize=None)
+def get_extractor(name=EXTRACT_ENGINE):
+    if name not in ENGINES:
+        raise ValueError(f"Unknown extraction engine {name!r}; expected one of {sorted(ENGINES)}")
+    return ENGINES[name]()
+
+
+_pool = None
+_pool_users = 0  # crawls currently holding the pool (sites crawled in parallel share it)
+
+
+def start_pool():
+    """Start the extraction workers now rather than on the first page.
+
+    By the time a crawl starts, the process already runs threads (the Weaviate gRPC channel,
+    to_thread workers, APScheduler's executor), so a plain fork could copy a held lock into a
+    worker. Workers come from a forkserver instead: a clean process that imports __main__ and
+    this module once, then forks every worker from itself. Without forkserver they are spawned.
+    """
+    global _pool
+    if _pool is None and EXTRACT_WORKERS > 0:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        if context.get_start_method() == "forkserver":
+            context.set_forkserver_preload(["__main__", __name__])
+        _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=context)
+        # Processes are created on first submit; a no-op task starts all of them
+        _pool.submit(get_extractor, EXTRACT_ENGINE).result()
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def acquire_pool():
+    """start_pool() for one crawl; the pool stays up until the last crawl holding it releases it."""
+    global _pool_users
+    _pool_users += 1
+    return start_pool()
+
+
+def release_pool():
+    global _pool_users
+    _pool_users = max(0, _pool_users - 1)
+    if not _pool_users:
+        shutdown_pool()
+
+
+def _extract_in_worker(engine, html, url, options):
+    return get_extractor(engine).extract(html, url, **options)
+
+
+async def extract_async(html, url, engine=EXTRACT_ENGINE, **options) -> PageContent:
+    """Extract `html` in the process pool so the event loop keeps serving other workers."""
+    pool = start_pool()
+    if pool is None:
+        return get_extractor(engine).extract(html, url, **options)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, _extract_in_worker, engine, html, url, options)
+    except BrokenProcessPool:
+        print(f"[EXTRACT] Worker pool died on {url}; restarting it and parsing this page in-process.")
+        shutdown_pool()
+        return get_extractor(engine).extract(html, url, **options)
@@ -0,0 +1,176 @@
+# Durable crawl frontier stored in SQLite (WAL mode).
+# Every URL moves pending -> in_flight (with a lease) -> done / failed, and the chunks of a
+# finished page are committed together with its state, so a killed crawl resumes where it stopped.
+
+import os
+import json
+import time
+import sqlite3
+
+FRONTIER_DIR = os.getenv("CRAWLER_FRONTIER_DIR", "data/frontier")
+LEASE_SECONDS = float(os.getenv("CRAWLER_LEASE_SECONDS", 300))
+MAX_ATTEMPTS = int(os.getenv("CRAWLER_MAX_ATTEMPTS", 3))
+
+PENDING, IN_FLIGHT, DONE, FAILED = "pending", "in_flight", "done", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    error TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS urls_state ON urls (state);
+CREATE TABLE IF NOT EXISTS chunks (
+    url TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    chunk TEXT NOT NULL,
+    PRIMARY KEY (url, seq)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class Frontier:
+    """Persistent URL frontier for one crawl (one SQLite file per name)."""
+
+    def __init__(self, name, directory=FRONTIER_DIR, lease_seconds=LEASE_SECONDS):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{name}.db")
+        self.lease_seconds = lease_seconds
+        self.db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def _transaction(self):
+        return _Transaction(self.db)
+
+    def start(self, seeds=()):
+        """Resume an unfinished crawl, or reset and seed a new one. Returns True when resuming."""
+        if not self.is_finished() and self.counts():
+            self.expire_leases(force=True)
+            counts = self.counts()
+            print(f"[FRONTIER] Resuming {self.path}: {counts.get(DONE, 0)} done, "
+                  f"{counts.get(PENDING, 0)} pending, {counts.get(FAILED, 0)} failed.")
+            return True
+        self.reset()
+        self.add(seeds)
+        return False
+
+    def reset(self):
+        with self._transaction():
+            self.db.execute("DELETE FROM urls")
+            self.db.execute("DELETE FROM chunks")
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('finished', '0')")
+
+    def finish(self):
+        """Mark the crawl complete so the next start() begins a fresh one."""
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('finished', '1')")
+
+    def is_finished(self) -> bool:
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'finished'").fetchone()
+        return row is not None and row[0] == "1"
+
+    def add(self, urls) -> list:
+        """Insert URLs not seen before; returns the ones that were new."""
+        added = []
+        now = time.time()
+        with self._transaction():
+            for url in urls:
+                cur = self.db.execute(
+                    "INSERT OR IGNORE INTO urls (url, state, updated_at) VALUES (?, ?, ?)", (url, PENDING, now)
+                )
+                if cur.rowcount:
+                    added.append(url)
+        return added
+
+    def expire_leases(self, force=False):
+        """Return in-flight URLs whose lease ran out (or all of them, after a restart) to pending."""
+        now = time.time()
+        if force:
+            self.db.execute("UPDATE urls SET state = ?, lease_until = NULL WHERE state = ?", (PENDING, IN_FLIGHT))
+        else:
+            self.db.execute(
+                "UPDATE urls SET state = ?, lease_until = NULL WHERE state = ? AND lease_until < ?",
+                (PENDING, IN_FLIGHT, now),
+            )
+
+    def pending(self, limit=None) -> list:
+        sql = "SELECT url FROM urls WHERE state = ? ORDER BY rowid"
+        params = (PENDING,)
+        if limit:
+            sql += " LIMIT ?"
+            params += (limit,)
+        return [row[0] for row in self.db.execute(sql, params)]
+
+    def lease(self, url) -> bool:
+        """Mark a pending URL in flight; False if another worker already holds or finished it."""
+        cur = self.db.execute(
+            "UPDATE urls SET state = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? "
+            "WHERE url = ? AND state = ?",
+            (IN_FLIGHT, time.time() + self.lease_seconds, time.time(), url, PENDING),
+        )
+        return cur.rowcount == 1
+
+    def complete(self, url, chunks):
+        """Commit a finished page and its chunks atomically."""
+        with self._transaction():
+            self.db.execute("DELETE FROM chunks WHERE url = ?", (url,))
+            self.db.executemany(
+                "INSERT INTO chunks (url, seq, chunk) VALUES (?, ?, ?)",
+                [(url, i, json.dumps(chunk)) for i, chunk in enumerate(chunks)],
+            )
+            self.db.execute(
+                "UPDATE urls SET state = ?, lease_until = NULL, error = NULL, updated_at = ? WHERE url = ?",
+                (DONE, time.time(), url),
+            )
+
+    def fail(self, url, error) -> bool:
+        """Record a failed attempt; returns True if the URL goes back to pending for a retry."""
+        row = self.db.execute("SELECT attempts FROM urls WHERE url = ?", (url,)).fetchone()
+        retry = row is not None and row[0] < MAX_ATTEMPTS
+        self.db.execute(
+            "UPDATE urls SET state = ?, lease_until = NULL, error = ?, updated_at = ? WHERE url = ?",
+            (PENDING if retry else FAILED, str(error)[:500], time.time(), url),
+        )
+        return retry
+
+    def counts(self) -> dict:
+        return dict(self.db.execute("SELECT state, COUNT(*) FROM urls GROUP BY state").fetchall())
+
+    def has_unfinished(self) -> bool:
+        row = self.db.execute("SELECT 1 FROM urls WHERE state IN (?, ?) LIMIT 1", (PENDING, IN_FLIGHT)).fetchone()
+        return row is not None
+
+    def urls(self, state=None) -> list:
+        """URLs in `state`, or every known URL when no state is given."""
+        if state is None:
+            return [row[0] for row in self.db.execute("SELECT url FROM urls")]
+        return [row[0] for row in self.db.execute("SELECT url FROM urls WHERE state = ?", (state,))]
+
+    def iter_chunks(self):
+        for (chunk,) in self.db.execute("SELECT chunk FROM chunks ORDER BY url, seq"):
+            yield json.loads(chunk)
+
+    def chunk_count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+
+class _Transaction:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, *exc):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
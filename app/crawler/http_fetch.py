@@ -0,0 +1,94 @@
+# Static fetch tier: plain HTTP GET before falling back to a browser render.
+# Pages whose server-sent HTML already contains the readiness markers never touch Chrome.
+
+import os
+import httpx
+
+from app.crawler.extract import extract_async
+from app.crawler.structured import STRUCTURED_ENABLED, extract_product
+from app.utils.sites import DEFAULT_READY_TEXT
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; MyCrawler/1.0; +http://example.com)"
+}
+READY_MARKERS = DEFAULT_READY_TEXT
+READY_SELECTOR = os.getenv("CRAWLER_READY_SELECTOR", "")
+HTTP_TIMEOUT = float(os.getenv("CRAWLER_HTTP_TIMEOUT", 15))
+STATIC_DROP_TAGS = ("script", "style", "noscript", "template")
+
+
+def create_http_client(concurrency):
+    """Pooled keep-alive client shared by every static fetch of a run."""
+    limits = httpx.Limits(
+        max_connections=concurrency * 2,
+        max_keepalive_connections=concurrency,
+        keepalive_expiry=30,
+    )
+    return httpx.AsyncClient(
+        headers=HEADERS,
+        timeout=HTTP_TIMEOUT,
+        limits=limits,
+        http2=HTTP2,
+        follow_redirects=True,
+    )
+
+
+def page_is_ready(content, selector=READY_SELECTOR, markers=READY_MARKERS):
+    """Same check the browser waits for: a configured selector, or the price / cart markers."""
+    if selector:
+        return bool(content.selector_found)
+    return any(marker in content.text for marker in markers)
+
+
+async def extract_static_text(html, url, selector=READY_SELECTOR):
+    """Body text of server-sent HTML (scripts, styles and noscript fallbacks removed)."""
+    return await extract_async(html, url, separator="\n", body_only=True, drop_tags=STATIC_DROP_TAGS,
+                               selector=selector or None)
+
+
+async def fetch_static(client, url, headers=None, selector=READY_SELECTOR, markers=READY_MARKERS):
+    """GET `url` (conditionally when validators are given).
+
+    Returns (status_code, text, response_headers, product). text is None unless the raw HTML
+    passes the readiness check or carries a complete structured product record; product is the
+    ProductRecord found in the HTML (or None), and status_code is None when the request failed.
+    """
+    try:
+        res = await client.get(url, headers=headers or None)
+    except httpx.HTTPError as e:
+        print(f"[HTTP ERROR] {url}: {type(e).__name__}: {e}")
+        return None, None, {}, None
+    if res.status_code != 200 or "html" not in res.headers.get("content-type", "html"):
+        return res.status_code, None, res.headers, None
+    content = await extract_static_text(res.text, url, selector)
+    product = extract_product(content, url) if STRUCTURED_ENABLED else None
+    if product is not None and product.complete():
+        # Name, price and availability are already in the markup: nothing left to render for
+        return res.status_code, content.text, res.headers, product
+    if not content.text.strip() or not page_is_ready(content, selector, markers):
+        return res.status_code, None, res.headers, product
+    return res.status_code, content.text, res.headers, product
+
+
+def static_summary(stats, pool_stats):
+    """One-line report of how much of the run skipped the browser."""
+    total = stats["static_pages"] + stats["browser_pages"]
+    if not total:
+        return "[HTTP] No pages fetched."
+    share = stats["static_pages"] / total
+    avg_static = stats["static_time"] / stats["static_pages"] if stats["static_pages"] else 0.0
+    if pool_stats["pages"]:
+        avg_browser = pool_stats["page_time"] / pool_stats["pages"]
+        saved = f"~{stats['static_pages'] * max(0.0, avg_browser - avg_static):.1f}s saved"
+    else:
+        saved = "no browser renders to compare against"
+    return (
+        f"[HTTP] Served statically: {stats['static_pages']}/{total} ({share:.0%}, "
+        f"{stats.get('structured_pages', 0)} via structured product data), avg static {avg_static:.2f}s, {saved}"
+    )
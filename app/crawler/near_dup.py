@@ -0,0 +1,144 @@
+# Near-duplicate page detection with 64-bit SimHash and banded LSH lookup.
+# Variant pages (colour / size) of one product carry almost the same text; the first one seen is
+# indexed and every later page within MAX_DISTANCE bits is recorded as its alias instead of being
+# chunked, upserted and embedded again.
+
+import os
+import re
+import json
+import hashlib
+import numpy as np
+
+NEAR_DUP_DIR = os.getenv("CRAWLER_NEAR_DUP_DIR", "data/near_dup")
+NEAR_DUP_ENABLED = os.getenv("CRAWLER_NEAR_DUP", "1") == "1"
+# Hamming distance (out of 64 bits) that still counts as the same page; 3 ~ 95% similar
+MAX_DISTANCE = int(os.getenv("CRAWLER_NEAR_DUP_MAX_DISTANCE", 3))
+SHINGLE_SIZE = 3
+MIN_TOKENS = 20  # too little text to fingerprint reliably
+
+_TOKEN = re.compile(r"\w+")
+
+
+def simhash(text, shingle_size=SHINGLE_SIZE):
+    """64-bit SimHash of the word shingles of `text`, or None for very short pages."""
+    tokens = _TOKEN.findall(text.lower())
+    if len(tokens) < MIN_TOKENS:
+        return None
+    shingles = {" ".join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles],
+        dtype=np.uint64,
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(shingles)
+    return int.from_bytes(np.packbits(votes > 0, bitorder="little").tobytes(), "little")
+
+
+def distance(a, b):
+    return (a ^ b).bit_count()
+
+
+def similarity(a, b):
+    return 1 - distance(a, b) / 64
+
+
+class NearDupIndex:
+    """Fingerprints of indexed pages plus the alias -> canonical map, persisted per crawl name.
+
+    Fingerprints are split into MAX_DISTANCE + 1 bands: two fingerprints within MAX_DISTANCE bits
+    agree on at least one whole band, so a lookup only compares against pages sharing a band.
+    """
+
+    def __init__(self, name, directory=NEAR_DUP_DIR, max_distance=MAX_DISTANCE):
+        self.path = os.path.join(directory, f"{name}.json")
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.fingerprints = {}  # canonical url -> simhash
+        self.aliases = {}  # alias url -> canonical url
+        self._buckets = [{} for _ in range(self.bands)]
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                for url, fp in data.get("fingerprints", {}).items():
+                    self._insert(url, int(fp, 16))
+                self.aliases = data.get("aliases", {})
+            except (OSError, ValueError) as e:
+                print(f"[NEAR-DUP] Ignoring unreadable {self.path}: {e}")
+
+    def _band_keys(self, fp):
+        width = 64 // self.bands
+        mask = (1 << width) - 1
+        return [(fp >> (i * width)) & mask for i in range(self.bands)]
+
+    def _insert(self, url, fp):
+        self.fingerprints[url] = fp
+        for bucket, key in zip(self._buckets, self._band_keys(fp)):
+            bucket.setdefault(key, set()).add(url)
+
+    def _remove(self, url):
+        fp = self.fingerprints.pop(url, None)
+        if fp is None:
+            return
+        for bucket, key in zip(self._buckets, self._band_keys(fp)):
+            members = bucket.get(key)
+            if members is not None:
+                members.discard(url)
+                if not members:
+                    del bucket[key]
+
+    def nearest(self, fp, exclude=None):
+        """(canonical url, distance) of the closest indexed page within max_distance, or (None, None)."""
+        best, best_distance = None, None
+        candidates = set()
+        for bucket, key in zip(self._buckets, self._band_keys(fp)):
+            candidates |= bucket.get(key, set())
+        candidates.discard(exclude)
+        for url in candidates:
+            d = distance(fp, self.fingerprints[url])
+            if d <= self.max_distance and (best_distance is None or d < best_distance):
+                best, best_distance = url, d
+        return best, best_distance
+
+    def check(self, url, text):
+        """Return the canonical URL `url` duplicates, or None after indexing it as a canonical page."""
+        fp = simhash(text)
+        self._remove(url)  # its content may have changed since it was fingerprinted
+        if fp is None:
+            self.aliases.pop(url, None)
+            return None
+        canonical, _ = self.nearest(fp, exclude=url)
+        if canonical is not None:
+            self.aliases[url] = canonical
+            return canonical
+        self.aliases.pop(url, None)
+        self._insert(url, fp)
+        return None
+
+    def remove(self, url) -> list:
+        """Forget `url`; returns its aliases, which must be indexed on their own again."""
+        self._remove(url)
+        self.aliases.pop(url, None)
+        orphans = [alias for alias, canonical in self.aliases.items() if canonical == url]
+        for alias in orphans:
+            del self.aliases[alias]
+        return orphans
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "fingerprints": {url: f"{fp:016x}" for url, fp in self.fingerprints.items()},
+                "aliases": self.aliases,
+            }, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def near_dup_summary(stats) -> str:
+    pages = stats.get("near_dup_pages", 0)
+    if not pages:
+        return "[NEAR-DUP] No near-duplicate pages found."
+    return (f"[NEAR-DUP] {pages} pages recorded as aliases of a canonical page; "
+            f"{stats.get('near_dup_chunks', 0)} chunks not upserted or embedded "
+            f"({stats.get('near_dup_bytes', 0) / 1024:.0f} KB of text).")
@@ -0,0 +1,219 @@
+# Adaptive per-host concurrency limiter (AIMD).
+# Concurrency grows by one slot per healthy window and is halved on 429/5xx, timeouts or a p95 latency spike.
+
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager, nullcontext
+from urllib.parse import urlparse
+
+INITIAL_CONCURRENCY = int(os.getenv("CRAWLER_INITIAL_CONCURRENCY", 2))
+MIN_CONCURRENCY = int(os.getenv("CRAWLER_MIN_CONCURRENCY", 1))
+DECREASE_FACTOR = float(os.getenv("CRAWLER_AIMD_DECREASE", 0.5))
+LATENCY_SPIKE = float(os.getenv("CRAWLER_AIMD_LATENCY_SPIKE", 2.0))  # p95 / baseline that counts as overload
+WINDOW = 20  # latencies kept for p95
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Slot:
+    """Outcome of one request; mark failures the limiter cannot see as exceptions."""
+
+    def __init__(self):
+        self.status = None
+        self.failed = False
+
+    def fail(self, status=None):
+        self.failed = True
+        self.status = status
+
+    @property
+    def overloaded(self):
+        return self.failed or self.status == 429 or (self.status is not None and self.status >= 500)
+
+
+class HostLimiter:
+    def __init__(self, host, max_limit, initial=INITIAL_CONCURRENCY, min_limit=MIN_CONCURRENCY):
+        self.host = host
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.in_flight = 0
+        self.latencies = deque(maxlen=WINDOW)
+        self.baseline = None  # lowest healthy p95 seen so far
+        self.completed_in_window = 0
+        self.errors = 0
+        self.cooldown_until = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency, slot):
+        async with self._cond:
+            self.in_flight -= 1
+            self._update(latency, slot)
+            self._cond.notify_all()
+
+    def _update(self, latency, slot):
+        now = time.monotonic()
+        if slot.overloaded:
+            self.errors += 1
+            # Multiplicative decrease, at most once per cooldown so one burst of errors halves once
+            if now >= self.cooldown_until:
+                self.limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+                self.cooldown_until = now + max(1.0, percentile(self.latencies, 95))
+                self.completed_in_window = 0
+            return
+
+        self.latencies.append(latency)
+        self.completed_in_window += 1
+        if self.completed_in_window < max(1, int(self.limit)):
+            return
+        # One full window of healthy completions at the current limit
+        self.completed_in_window = 0
+        p95 = percentile(self.latencies, 95)
+        if self.baseline is None or p95 < self.baseline:
+            self.baseline = p95
+        if self.baseline and p95 > self.baseline * LATENCY_SPIKE and now >= self.cooldown_until:
+            self.limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+            self.cooldown_until = now + p95
+        elif now >= self.cooldown_until:
+            self.limit = min(self.max_limit, self.limit + 1)
+
+
+class AdaptiveLimiter:
+    """Per-host AIMD limiters, plus a time series of their concurrency and latency."""
+
+    def __init__(self, max_limit, initial=INITIAL_CONCURRENCY, robots=None, budget=None, name=None):
+        self.max_limit = max_limit
+        self.initial = initial
+        self.robots = robots
+        self.budget = budget  # SharedBudget of all sites crawled in parallel, or None
+        self.name = name  # this crawl's key in the budget
+        self.hosts = {}
+        self.samples = []  # (seconds since start, host, limit, in_flight, p95)
+        self._start = time.monotonic()
+
+    def host(self, url) -> HostLimiter:
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = HostLimiter(host, self.max_limit, self.initial)
+        return self.hosts[host]
+
+    @asynccontextmanager
+    async def slot(self, url):
+        """Hold one concurrency slot for `url`'s host while the request runs.
+
+        The global budget slot is taken last, after the host slot and the Crawl-delay, so a site
+        held back by its own limit never sits on global slots, and it is not counted as latency.
+        """
+        limiter = self.host(url)
+        await limiter.acquire()
+        slot = Slot()
+        start = time.monotonic()
+        try:
+            if self.robots is not None:
+                await self.robots.wait(url)  # honour Crawl-delay
+            async with self.budget.slot(self.name) if self.budget is not None else nullcontext():
+                start = time.monotonic()
+                yield slot
+        except Exception:
+            slot.fail()
+            raise
+        finally:
+            await limiter.release(time.monotonic() - start, slot)
+            self.samples.append((
+                time.monotonic() - self._start, limiter.host, limiter.limit,
+                limiter.in_flight, percentile(limiter.latencies, 95),
+            ))
+
+    def summary(self, rows=12) -> str:
+        lines = []
+        for host, limiter in self.hosts.items():
+            series = [s for s in self.samples if s[1] == host]
+            lines.append(f"[LIMITER] {host}: final limit {limiter.limit:.1f}/{limiter.max_limit}, "
+                         f"errors {limiter.errors}, baseline p95 {limiter.baseline or 0:.2f}s")
+            step = max(1, len(series) // rows)
+            for t, _, limit, in_flight, p95 in series[::step]:
+                lines.append(f"[LIMITER]   t={t:7.1f}s  limit={limit:5.1f}  in_flight={in_flight:3d}  p95={p95:6.2f}s")
+        return "\n".join(lines) if lines else "[LIMITER] No requests made."
+
+
+class SharedBudget:
+    """Global cap on in-flight fetches for sites crawled in parallel.
+
+    Every active site may always use its fair share (total // active sites). Slots a site leaves
+    idle can be borrowed by the others, but a site above its share only gets a slot when no site
+    is waiting, so one slow or huge site cannot starve the rest.
+    """
+
+    def __init__(self, total):
+        self.total = max(1, total)
+        self.in_flight = {}
+        self.waiting = {}
+        self.peak = {}
+        self.wait_time = {}
+        self._cond = asyncio.Condition()
+
+    def register(self, site):
+        self.in_flight.setdefault(site, 0)
+        self.waiting.setdefault(site, 0)
+        self.peak.setdefault(site, 0)
+        self.wait_time.setdefault(site, 0.0)
+
+    async def unregister(self, site):
+        async with self._cond:
+            self.in_flight.pop(site, None)
+            self.waiting.pop(site, None)
+            self._cond.notify_all()  # the remaining sites' shares just grew
+
+    @property
+    def share(self) -> int:
+        return max(1, self.total // max(1, len(self.in_flight)))
+
+    def _may_start(self, site):
+        if sum(self.in_flight.values()) >= self.total:
+            return False
+        if self.in_flight[site] < self.share:
+            return True
+        return not any(n for other, n in self.waiting.items() if other != site)
+
+    @asynccontextmanager
+    async def slot(self, site):
+        """Hold one of the global slots for a fetch of `site` (registered on first use)."""
+        start = time.monotonic()
+        async with self._cond:
+            self.register(site)
+            self.waiting[site] += 1
+            try:
+                await self._cond.wait_for(lambda: self._may_start(site))
+            finally:
+                self.waiting[site] -= 1
+            self.in_flight[site] += 1
+            self.peak[site] = max(self.peak[site], self.in_flight[site])
+        self.wait_time[site] += time.monotonic() - start
+        try:
+            yield
+        finally:
+            async with self._cond:
+                if site in self.in_flight:
+                    self.in_flight[site] -= 1
+                self._cond.notify_all()
+
+    def summary(self) -> str:
+        if not self.peak:
+            return "[BUDGET] No fetches made."
+        return "\n".join(
+            [f"[BUDGET] {self.total} global fetch slots"] +
+            [f"[BUDGET]   {site}: peak {self.peak[site]} in flight, {self.wait_time[site]:.1f}s queued for slots (summed over fetches)"
+             for site in sorted(self.peak)]
+        )
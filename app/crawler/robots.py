@@ -1,16 +1,124 @@
+import os
+import time
+import asyncio
 import urllib.robotparser
 from urllib.parse import urlparse
 
+import httpx
+
+ROBOTS_TTL = float(os.getenv("ROBOTS_TTL_SECONDS", 3600))
+ROBOTS_AGENT = "*"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; MyCrawler/1.0; +http://example.com)"
+}
+
+_sync_cache = {}  # base -> (fetched_at, RobotFileParser)
+
+
+def _base(url: str) -> str:
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def _parser_from_response(robots_url, status_code, body):
+    """Build a parser with the same status handling as RobotFileParser.read()."""
+    rp = urllib.robotparser.RobotFileParser(robots_url)
+    if status_code in (401, 403):
+        rp.disallow_all = True
+    elif status_code >= 400:
+        rp.allow_all = True
+    else:
+        rp.parse(body.splitlines())
+    rp.modified()
+    return rp
+
+
 def is_allowed(site_url: str) -> bool:
-    """Check if crawling is allowed via robots.txt"""
-    parsed = urlparse(site_url)
-    base = f"{parsed.scheme}://{parsed.netloc}"
+    """Check if crawling is allowed via robots.txt (blocking; robots.txt cached per host)"""
+    base = _base(site_url)
     robots_url = base + "/robots.txt"
-    rp = urllib.robotparser.RobotFileParser()
-    rp.set_url(robots_url)
-    try:
-        rp.read()
-        return rp.can_fetch("*", site_url)
-    except Exception as e:
-        print(f"[ROBOTS] Error reading {robots_url}: {e}")
-        return True  # fallback: allow
+    cached = _sync_cache.get(base)
+    if cached is None or time.time() - cached[0] > ROBOTS_TTL:
+        rp = urllib.robotparser.RobotFileParser()
+        rp.set_url(robots_url)
+        try:
+            rp.read()
+        except Exception as e:
+            print(f"[ROBOTS] Error reading {robots_url}: {e}")
+            return True  # fallback: allow
+        cached = _sync_cache[base] = (time.time(), rp)
+    return cached[1].can_fetch(ROBOTS_AGENT, site_url)
+
+
+class RobotsCache:
+    """Async per-host robots.txt cache: each robots.txt is fetched once per TTL."""
+
+    def __init__(self, client=None, ttl=ROBOTS_TTL):
+        self.client = client
+        self.ttl = ttl
+        self._parsers = {}  # base -> (fetched_at, RobotFileParser or None)
+        self._fetches = {}  # base -> in-flight fetch task
+        self._next_slot = {}  # base -> earliest loop time for the next request
+
+    def seed(self, url, body, status_code=200):
+        """Reuse a robots.txt body that was already downloaded (e.g. for sitemap discovery)."""
+        base = _base(url)
+        self._parsers[base] = (time.time(), _parser_from_response(base + "/robots.txt", status_code, body))
+
+    async def _fetch(self, base):
+        robots_url = base + "/robots.txt"
+        try:
+            if self.client is not None:
+                res = await self.client.get(robots_url, follow_redirects=True)
+            else:
+                async with httpx.AsyncClient(headers=HEADERS, timeout=20) as client:
+                    res = await client.get(robots_url, follow_redirects=True)
+            rp = _parser_from_response(robots_url, res.status_code, res.text)
+        except Exception as e:
+            print(f"[ROBOTS] Error reading {robots_url}: {e}")
+            rp = None  # fallback: allow
+        self._parsers[base] = (time.time(), rp)
+        return rp
+
+    async def get(self, url):
+        """Parser for the host of `url`, or None when robots.txt could not be read."""
+        base = _base(url)
+        cached = self._parsers.get(base)
+        if cached is not None and time.time() - cached[0] <= self.ttl:
+            return cached[1]
+        task = self._fetches.get(base)
+        if task is None:
+            task = self._fetches[base] = asyncio.ensure_future(self._fetch(base))
+            task.add_done_callback(lambda _: self._fetches.pop(base, None))
+        return await task
+
+    async def is_allowed(self, url) -> bool:
+        rp = await self.get(url)
+        return True if rp is None else rp.can_fetch(ROBOTS_AGENT, url)
+
+    async def crawl_delay(self, url) -> float:
+        rp = await self.get(url)
+        if rp is None:
+            return 0.0
+        delay = rp.crawl_delay(ROBOTS_AGENT)
+        if delay:
+            return float(delay)
+        rate = rp.request_rate(ROBOTS_AGENT)
+        return rate.seconds / rate.requests if rate and rate.requests else 0.0
+
+    async def sitemaps(self, url) -> list:
+        rp = await self.get(url)
+        return list(rp.site_maps() or []) if rp is not None else []
+
+    async def wait(self, url):
+        """Sleep until the host's Crawl-delay allows another request."""
+        delay = await self.crawl_delay(url)
+        if not delay:
+            return
+        base = _base(url)
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, self._next_slot.get(base, now))
+        self._next_slot[base] = start + delay
+        if start > now:
+            await asyncio.sleep(start - now)
@@ -1,30 +1,122 @@
+import os
+import zlib
 import asyncio
 import httpx
-from bs4 import BeautifulSoup
+from lxml import etree
+from dataclasses import dataclass
+from typing import Optional
 from urllib.parse import urljoin, urlparse
 
+from app.crawler.robots import RobotsCache
+
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (compatible; MyCrawler/1.0; +http://example.com)"
 }
+SITEMAP_CONCURRENCY = int(os.getenv("SITEMAP_CONCURRENCY", 4))
+GZIP_MAGIC = b"\x1f\x8b"
+
+@dataclass(frozen=True)
+class SitemapEntry:
+    """One <url> record of a sitemap."""
+    loc: str
+    lastmod: Optional[str] = None
+    changefreq: Optional[str] = None
+    priority: Optional[float] = None
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+def _parse_priority(value):
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+def _is_sitemap_url(link):
+    return link.endswith(".xml") or link.endswith(".xml.gz")
+
+def _children(elem):
+    fields = {}
+    for child in elem:
+        text = (child.text or "").strip()
+        if text:
+            fields[_local(child.tag)] = text
+    return fields
+
+def _release(elem):
+    """Drop a fully handled element (and its already-handled siblings) to keep memory flat."""
+    elem.clear()
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+def _read_events(parser):
+    """Yield ("url", SitemapEntry) and ("sitemap", loc) items for every completed element."""
+    for _, elem in parser.read_events():
+        name = _local(elem.tag)
+        if name == "url":
+            fields = _children(elem)
+            _release(elem)
+            if "loc" in fields:
+                yield "url", SitemapEntry(
+                    loc=fields["loc"],
+                    lastmod=fields.get("lastmod"),
+                    changefreq=fields.get("changefreq"),
+                    priority=_parse_priority(fields.get("priority")),
+                )
+        elif name == "sitemap":
+            loc = _children(elem).get("loc")
+            _release(elem)
+            if loc:
+                yield "sitemap", loc
+        elif name == "loc":
+            # Fallback for <loc> tags outside <url> / <sitemap>
+            parent = elem.getparent()
+            if parent is not None and _local(parent.tag) in ("url", "sitemap"):
+                continue
+            link = (elem.text or "").strip()
+            _release(elem)
+            if link:
+                yield ("sitemap", link) if _is_sitemap_url(link) else ("url", SitemapEntry(loc=link))
+
+async def stream_sitemap(client, url):
+    """Stream one sitemap (plain or gzipped) through an incremental parser, yielding items as they complete."""
+    parser = etree.XMLPullParser(events=("end",), resolve_entities=False, no_network=True, huge_tree=True)
+    async with client.stream("GET", url, follow_redirects=True) as res:
+        if res.status_code != 200:
+            return
+        inflate = None
+        async for data in res.aiter_bytes():
+            if inflate is None:
+                # .xml.gz files are usually served as application/gzip without Content-Encoding
+                inflate = zlib.decompressobj(16 + zlib.MAX_WBITS) if data[:2] == GZIP_MAGIC else False
+            if inflate:
+                data = inflate.decompress(data)
+            parser.feed(data)
+            for item in _read_events(parser):
+                yield item
+        if inflate:
+            parser.feed(inflate.flush())
+    parser.close()
+    for item in _read_events(parser):
+        yield item
 
-async def extract_sitemap_links(site_url: str) -> set:
-    parsed_links = set()
-    visited = set()
-    sitemap_urls = []
+async def iter_sitemap_entries(site_url: str, robots: Optional[RobotsCache] = None,
+                               concurrency: int = SITEMAP_CONCURRENCY, client: Optional[httpx.AsyncClient] = None):
+    """Yield each distinct SitemapEntry of the site as soon as it is parsed.
+
+    Child sitemaps are fetched concurrently (at most `concurrency` at a time) and every
+    URL is deduplicated in a single pass, so memory stays bounded by the seen-set.
+    """
     parsed_url = urlparse(site_url)
     domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
-
-    async with httpx.AsyncClient(headers=HEADERS, timeout=20) as client:
+    owns_client = client is None
+    client = client if client is not None else httpx.AsyncClient(headers=HEADERS, timeout=20)
+    try:
         # Try robots.txt for sitemap locations
-        try:
-            r = await client.get(urljoin(domain, "/robots.txt"))
-            if r.status_code == 200:
-                for line in r.text.splitlines():
-                    if line.lower().startswith("sitemap:"):
-                        sitemap_url = line.split(":", 1)[1].strip()
-                        sitemap_urls.append(sitemap_url)
-        except Exception as e:
-            print(f"[SITEMAP] robots.txt fetch failed: {e}")
+        robots = robots if robots is not None else RobotsCache(client)
+        sitemap_urls = await robots.sitemaps(domain)
 
         # Fallback to common sitemap locations
         if not sitemap_urls:
@@ -36,44 +128,61 @@ async def extract_sitemap_links(site_url: str) -> set:
                 urljoin(domain, "/sitemap/sitemap.xml")
             ]
 
-        async def parse_sitemap(url):
-            if url in visited:
-                return
-            visited.add(url)
-            try:
-                res = await client.get(url, follow_redirects=True)
-                if res.status_code != 200:
-                    return
-                soup = BeautifulSoup(res.content, "xml")
-
-                # Nested sitemaps
-                sitemaps = soup.find_all("sitemap")
-                if sitemaps:
-                    tasks = []
-                    for sitemap in sitemaps:
-                        loc = sitemap.find("loc")
-                        if loc:
-                            tasks.append(parse_sitemap(loc.text.strip()))
-                    await asyncio.gather(*tasks)
-
-                # URLs
-                urls = soup.find_all("url")
-                for url_entry in urls:
-                    loc = url_entry.find("loc")
-                    if loc:
-                        parsed_links.add(loc.text.strip())
-
-                # Fallback: all <loc> tags
-                for loc in soup.find_all("loc"):
-                    link = loc.text.strip()
-                    if link.endswith(".xml"):
-                        await parse_sitemap(link)
-                    else:
-                        parsed_links.add(link)
-            except Exception as e:
-                print(f"[SITEMAP] Error parsing {url}: {e}")
-
-        await asyncio.gather(*(parse_sitemap(s) for s in sitemap_urls))
+        visited = set()
+        work = asyncio.Queue()
+        out = asyncio.Queue(maxsize=10000)
+        done = object()
+
+        def enqueue(url):
+            if url not in visited:
+                visited.add(url)
+                work.put_nowait(url)
+
+        async def worker():
+            while True:
+                url = await work.get()
+                try:
+                    async for kind, value in stream_sitemap(client, url):
+                        if kind == "sitemap":
+                            enqueue(value)
+                        else:
+                            await out.put(value)
+                except Exception as e:
+                    print(f"[SITEMAP] Error parsing {url}: {e}")
+                finally:
+                    work.task_done()
+
+        async def finish():
+            await work.join()
+            await out.put(done)
+
+        for url in sitemap_urls:
+            enqueue(url)
+        tasks = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+        tasks.append(asyncio.create_task(finish()))
+        try:
+            seen = set()
+            while True:
+                entry = await out.get()
+                if entry is done:
+                    break
+                if entry.loc not in seen:
+                    seen.add(entry.loc)
+                    yield entry
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        if owns_client:
+            await client.aclose()
+
+async def extract_sitemap_links(site_url: str, robots: Optional[RobotsCache] = None) -> list:
+    """Collect every page listed in the site's sitemaps as SitemapEntry records (one per URL).
 
+    Sitemap locations come from robots.txt through `robots`, so a crawler that passes its
+    own RobotsCache reuses the same download for its allow / Crawl-delay checks.
+    """
+    parsed_links = [entry async for entry in iter_sitemap_entries(site_url, robots)]
     print(f"[SITEMAP] Total URLs collected: {len(parsed_links)}")
     return parsed_links
@@ -0,0 +1,166 @@
+# Structured product data from the initial HTML: schema.org/Product JSON-LD first, then
+# microdata, then OpenGraph / product:* meta tags for whatever is still missing.
+# A page whose record is complete does not need a browser render to be indexed.
+
+import os
+import re
+import time
+from dataclasses import dataclass, field
+
+from app.utils.hash_utils import compute_hash
+
+STRUCTURED_ENABLED = os.getenv("CRAWLER_STRUCTURED", "1") == "1"
+# Fields a record needs before the page may skip browser rendering
+REQUIRED_FIELDS = ("name", "price", "currency", "availability")
+# Weaviate property name -> record attribute; see app/upsert/setup_schema.py
+PRODUCT_PROPERTIES = {
+    "product_name": "name",
+    "price": "price",
+    "currency": "currency",
+    "sizes": "sizes",
+    "availability": "availability",
+    "sku": "sku",
+}
+
+_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+@dataclass
+class ProductRecord:
+    url: str
+    name: str = None
+    price: float = None
+    currency: str = None
+    sizes: list = field(default_factory=list)
+    availability: str = None
+    sku: str = None
+    sources: list = field(default_factory=list)  # which markup supplied the fields
+
+    def complete(self) -> bool:
+        return all(getattr(self, name) not in (None, "", []) for name in REQUIRED_FIELDS)
+
+    def merge(self, other, source):
+        """Fill the fields still missing from `other` (a dict of record attributes)."""
+        used = False
+        for name, value in other.items():
+            if value not in (None, "", []) and getattr(self, name) in (None, "", []):
+                setattr(self, name, value)
+                used = True
+        if used:
+            self.sources.append(source)
+
+    def properties(self) -> dict:
+        return {prop: getattr(self, attr) for prop, attr in PRODUCT_PROPERTIES.items()
+                if getattr(self, attr) not in (None, "", [])}
+
+    def summary(self) -> str:
+        parts = [f"Product: {self.name}"]
+        if self.price is not None:
+            parts.append(f"Price: {self.price:.2f} {self.currency or ''}".rstrip())
+        if self.sizes:
+            parts.append(f"Sizes: {', '.join(self.sizes)}")
+        if self.availability:
+            parts.append(f"Availability: {self.availability}")
+        if self.sku:
+            parts.append(f"SKU: {self.sku}")
+        return " | ".join(parts)
+
+    def to_chunk(self) -> dict:
+        """The record as its own PageChunk object, with the fields as typed, filterable properties."""
+        content = self.summary()
+        chunk = {
+            "chunk_id": f"{self.url}_product",
+            "url": self.url,
+            "content": content,
+            "last_updated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "hash": compute_hash(content),
+        }
+        chunk.update(self.properties())
+        return chunk
+
+
+def parse_price(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(str(value or ""))
+    return float(match.group(0).replace(",", "")) if match else None
+
+
+def _availability(value):
+    # "https://schema.org/InStock" -> "InStock"; OpenGraph uses "instock" / "in stock"
+    value = str(value or "").strip().rstrip("/")
+    return value.rsplit("/", 1)[-1] or None
+
+
+def _first(value):
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
+
+
+def _types(item):
+    types = item.get("@type", [])
+    return types if isinstance(types, list) else [types]
+
+
+def _json_ld_products(items):
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        if "@graph" in item:
+            yield from _json_ld_products(item["@graph"] if isinstance(item["@graph"], list) else [item["@graph"]])
+        if {"Product", "ProductGroup"} & set(_types(item)):
+            yield item
+
+
+def from_json_ld(items) -> dict:
+    for product in _json_ld_products(items):
+        offers = product.get("offers") or {}
+        offers = offers if isinstance(offers, list) else [offers]
+        offer = next((o for o in offers if isinstance(o, dict)), {})
+        variants = [v for v in product.get("hasVariant") or [] if isinstance(v, dict)]
+        sizes = product.get("size") or [v.get("size") for v in variants if v.get("size")]
+        name = _first(product.get("name"))
+        return {
+            "name": name.strip() if isinstance(name, str) else name,
+            "price": parse_price(offer.get("price", offer.get("lowPrice"))),
+            "currency": offer.get("priceCurrency"),
+            "sizes": [str(s) for s in (sizes if isinstance(sizes, list) else [sizes])],
+            "availability": _availability(offer.get("availability")),
+            "sku": _first(product.get("sku")),
+        }
+    return {}
+
+
+def from_microdata(scopes) -> dict:
+    for props in scopes:
+        return {
+            "name": _first(props.get("name")),
+            "price": parse_price(_first(props.get("price")) or _first(props.get("lowPrice"))),
+            "currency": _first(props.get("priceCurrency")),
+            "sizes": list(dict.fromkeys(props.get("size", []))),
+            "availability": _availability(_first(props.get("availability"))),
+            "sku": _first(props.get("sku")),
+        }
+    return {}
+
+
+def from_meta(meta) -> dict:
+    if not any(key.startswith("product:") for key in meta) and meta.get("og:type") != "product":
+        return {}
+    return {
+        "name": meta.get("og:title"),
+        "price": parse_price(meta.get("product:price:amount") or meta.get("og:price:amount")),
+        "currency": meta.get("product:price:currency") or meta.get("og:price:currency"),
+        "availability": _availability(meta.get("product:availability") or meta.get("og:availability")),
+        "sku": meta.get("product:retailer_item_id"),
+    }
+
+
+def extract_product(content, url):
+    """ProductRecord from a PageContent (see app/crawler/extract.py), or None if the page has no product markup."""
+    record = ProductRecord(url)
+    record.merge(from_json_ld(content.json_ld), "json-ld")
+    record.merge(from_microdata(content.microdata), "microdata")
+    record.merge(from_meta(content.meta), "opengraph")
+    return record if record.sources and record.name else None
@@ -25,7 +25,7 @@ def main():
         )
     )
     client.connect()
-    collection = client.collections.get("PageChunk")
+    collection = client.collections.get(os.getenv("WEAVIATE_COLLECTION", "PageChunk"))
 
     uuid = get_uuid_from_chunk_id(TARGET_CHUNK_ID)
     obj = collection.query.fetch_object_by_id(uuid)
@@ -0,0 +1,93 @@
+import os
+import re
+import string
+import hashlib
+import posixpath
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, quote
+
+# Query parameters that only track the visitor and never change the page
+TRACKING_PARAMS = {
+    "gclid", "gclsrc", "dclid", "fbclid", "msclkid", "yclid", "twclid", "igshid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "_hsenc", "_hsmi", "mkt_tok", "srsltid",
+}
+TRACKING_PREFIXES = ("utm_",)
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+# Storefront paths are case-sensitive in general, so lower-casing them is opt-in
+LOWERCASE_PATHS = os.getenv("CRAWLER_LOWERCASE_PATHS", "0") == "1"
+
+_PCT = re.compile(r"%[0-9a-fA-F]{2}")
+_STRAY_PCT = re.compile(r"%(?![0-9a-fA-F]{2})")
+_UNRESERVED = frozenset(string.ascii_letters + string.digits + "-._~")
+
+
+def _is_tracking(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def _normalize_escape(match):
+    char = chr(int(match.group(0)[1:], 16))
+    return char if char in _UNRESERVED else match.group(0).upper()
+
+
+def _normalize_path(path):
+    # Decode unreserved characters only: %2F and / (or %3F and ?) name different resources
+    path = _PCT.sub(_normalize_escape, _STRAY_PCT.sub("%25", path))
+    path = quote(path, safe="/:@!$&'()*+,;=-._~%")
+    if not path:
+        return "/"
+    normalized = posixpath.normpath(path)
+    if normalized == ".":
+        normalized = "/"
+    if LOWERCASE_PATHS:
+        normalized = _PCT.sub(lambda m: m.group(0).upper(), normalized.lower())
+    # normpath drops the trailing slash, which is what we want (except for the root)
+    return normalized if normalized.startswith("/") else "/" + normalized
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalize a URL so trivially different spellings of one page compare equal.
+
+    Lower-cases scheme and host, drops default ports, fragments, tracking parameters and
+    trailing slashes, resolves dot segments and sorts the remaining query parameters.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    netloc = host
+    if port is not None and str(port) != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{port}"
+    if parts.username:
+        netloc = f"{parts.username}{':' + parts.password if parts.password else ''}@{netloc}"
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _is_tracking(k)]
+    query.sort()
+    return urlunsplit((scheme, netloc, _normalize_path(parts.path), urlencode(query, doseq=True), ""))
+
+
+def url_key(url: str) -> bytes:
+    """Compact fixed-size key of an already canonical URL."""
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+
+
+class SeenSet:
+    """Set of canonical URLs stored as 16-byte hashes: O(1) membership, small footprint."""
+
+    def __init__(self, urls=()):
+        self._keys = set()
+        for url in urls:
+            self.add(url)
+
+    def add(self, url) -> bool:
+        """Add `url`; returns True if it was not seen before."""
+        key = url_key(url)
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        return True
+
+    def __contains__(self, url):
+        return url_key(url) in self._keys
+
+    def __len__(self):
+        return len(self._keys)
@@ -0,0 +1,146 @@
+# Streaming crawl -> chunk -> upsert pipeline.
+# Crawl workers push each page's chunks into a bounded queue while upsert workers drain it in
+# batches, so memory stays flat and the vector DB works during the crawl instead of after it.
+
+import os
+import time
+import asyncio
+
+from app.crawler.crawl_state import CrawlState
+from app.crawler.crawler_mp import FULL_CRAWL, crawl_all_sitemap_urls
+from app.upsert import upsert
+from app.crawler.near_dup import NEAR_DUP_ENABLED, NearDupIndex
+from app.upsert.gc import GC_ENABLED, collect_garbage
+from app.upsert.manifest import Manifest, check_against_remote
+from app.utils.sites import default_site
+
+QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 2000))  # chunks buffered between crawl and upsert
+BATCH_SIZE = int(os.getenv("PIPELINE_BATCH_SIZE", 100))
+UPSERT_WORKERS = int(os.getenv("PIPELINE_UPSERT_WORKERS", 2))  # hash prefetches overlap; batch writes take turns
+BATCH_LINGER = float(os.getenv("PIPELINE_BATCH_LINGER", 0.5))  # seconds to wait for a batch to fill
+
+
+async def _next_batch(queue, done):
+    """Block for one chunk, then gather up to BATCH_SIZE more for at most BATCH_LINGER seconds.
+
+    Returns (batch, stop) where stop means the stop signal was consumed.
+    """
+    first = await queue.get()
+    if first is done:
+        return [], True
+    batch = [first]
+    deadline = time.monotonic() + BATCH_LINGER
+    while len(batch) < BATCH_SIZE:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            break
+        try:
+            item = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            break
+        if item is done:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+
+async def run_streaming_pipeline(site=None, full=FULL_CRAWL, state=None, stats=None, budget=None,
+                                 vectorizer=None, close=True):
+    """Crawl `site` (a registry Site; the env-configured one by default) and upsert its chunks
+    concurrently into the site's collection / tenant. Returns the upsert counts.
+
+    `budget` is the SharedBudget of sites crawled in parallel. Those sites share client_wv and
+    one `vectorizer` (its cache file takes one writer), so their caller passes close=False and
+    closes both once all of them are done; otherwise the pipeline opens and closes its own.
+    """
+    site = site or default_site()
+    state = state if state is not None else CrawlState(site.state_path)
+    stats = stats if stats is not None else {}
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    done = object()
+    collection = await asyncio.to_thread(upsert.connect_collection, site.collection, site.tenant)
+    manifest_collection = await asyncio.to_thread(upsert.connect_manifest)
+    manifest = Manifest(site.name)
+    stale = await asyncio.to_thread(check_against_remote, manifest, manifest_collection)
+    index = await asyncio.to_thread(upsert.open_hash_index, collection, stale)
+    previous_root = manifest.stored_root()
+    if close:
+        vectorizer = upsert.get_vectorizer()
+    worker_counts = [upsert.new_counts() for _ in range(UPSERT_WORKERS)]
+    upsert_busy = [0.0]
+    queued = [0]
+
+    async def on_chunks(url, chunks):
+        # Called with all chunks of one page: an unchanged page hash means nothing to write
+        diff = manifest.diff(url, chunks)
+        if diff.unchanged:
+            stats["manifest_pages_skipped"] = stats.get("manifest_pages_skipped", 0) + 1
+            stats["manifest_chunks_skipped"] = stats.get("manifest_chunks_skipped", 0) + len(chunks)
+            return
+        touched = [chunk for chunk in chunks if chunk["chunk_id"] in diff.touched]
+        manifest.stage(diff.url, chunks, diff.touched)
+        for chunk in touched:
+            await queue.put(chunk)  # blocks while the DB is behind: backpressure on the crawl
+        queued[0] += len(touched)
+        stats["manifest_chunks_skipped"] = stats.get("manifest_chunks_skipped", 0) + len(chunks) - len(touched)
+
+    async def upsert_worker(counts):
+        stop = False
+        while not stop:
+            batch, stop = await _next_batch(queue, done)
+            if batch:
+                start = time.monotonic()
+                failed = await asyncio.to_thread(upsert.upsert_batch, collection, batch, counts, index, vectorizer)
+                upsert_busy[0] += time.monotonic() - start
+                manifest.ack(batch, failed)
+
+    start = time.monotonic()
+    workers = [asyncio.create_task(upsert_worker(counts)) for counts in worker_counts]
+    try:
+        await crawl_all_sitemap_urls(site, state=state, stats=stats, full=full, on_chunks=on_chunks, budget=budget)
+        crawl_time = time.monotonic() - start
+        for _ in workers:
+            await queue.put(done)
+        await asyncio.gather(*workers)
+        # The crawl state already holds these pages' new hashes; forget them so the next run
+        # fetches and sends them again instead of skipping them as unchanged
+        unsettled = manifest.unsettled
+        for url in unsettled:
+            state.forget(url)
+        stats["unsettled_pages"] = len(unsettled)
+        if unsettled:
+            print(f"⚠️ {len(unsettled)} pages were not fully upserted; they are crawled again next run.")
+        if GC_ENABLED:
+            near_dup = NearDupIndex(site.name) if NEAR_DUP_ENABLED else None
+            stats["gc"] = await asyncio.to_thread(
+                collect_garbage, collection, manifest_collection, manifest, index, stats.get("site_urls"),
+                state, near_dup, name=site.name, site=site,
+            )
+        root = manifest.save_root()
+        if await asyncio.to_thread(manifest.mirror, manifest_collection, root):
+            print("⚠️ Some manifest entries could not be mirrored to Weaviate.")
+    finally:
+        for w in workers:
+            w.cancel()
+        manifest.close()
+        index.close()
+        if close:
+            if vectorizer is not None:
+                vectorizer.close()
+            await asyncio.to_thread(upsert.client_wv.close)
+
+    totals = upsert.new_counts()
+    for counts in worker_counts:
+        for key, value in counts.items():
+            totals[key] += value
+    print(f"\n[PIPELINE] Site `{site.name}` → `{site.collection}`{f' (tenant {site.tenant})' if site.tenant else ''}")
+    upsert.print_summary(totals, queued[0])
+    print(f"[MANIFEST] Site root {root[:12]} ({'unchanged' if root == previous_root else 'changed'}); "
+          f"skipped {stats.get('manifest_pages_skipped', 0)} unchanged pages, "
+          f"{stats.get('manifest_chunks_skipped', 0)} chunks without a hash lookup.")
+    wall = time.monotonic() - start
+    print(f"[PIPELINE] crawl {crawl_time:.1f}s, upsert busy {upsert_busy[0]:.1f}s "
+          f"across {UPSERT_WORKERS} workers, end-to-end {wall:.1f}s")
+    stats.update(upsert_counts=totals, root_hash=root, crawl_time=crawl_time, upsert_time=upsert_busy[0], wall_time=wall)
+    stats["completed"] = True
+    return totals
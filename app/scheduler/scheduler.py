@@ -1,9 +1,16 @@
 import os
+import asyncio
 import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from apscheduler.schedulers.blocking import BlockingScheduler
 
-from app.crawler.crawler_mp import main as crawl_main
-from app.upsert.upsert import upsert_chunks_optimal
+from app.crawler.crawl_state import CrawlState
+from app.crawler.crawler_mp import FULL_CRAWL
+from app.crawler.rate_limiter import SharedBudget
+from app.pipeline.streaming import run_streaming_pipeline
+from app.upsert import upsert
+from app.utils.sites import load_sites
 
 logging.basicConfig(format='[%(asctime)s] %(levelname)s: %(message)s', level=logging.INFO)
 
@@ -16,17 +23,62 @@ logging.getLogger().addHandler(file_handler)
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 print(f"[SCHEDULER] PROJECT_ROOT = {PROJECT_ROOT}")
 
+# Fetches in flight across all sites; each active site is guaranteed an equal share of it
+GLOBAL_CONCURRENCY = int(os.getenv("CRAWLER_GLOBAL_CONCURRENCY", 32))
+PARALLEL_SITES = int(os.getenv("SCHEDULER_PARALLEL_SITES", 4))  # sites crawled at the same time
 
-def run_pipeline():
-    logging.info("Starting crawl and upsert pipeline...")
+
+async def run_sites(sites, full, states, all_stats):
+    """Run the pipeline of every site in one event loop; a failing site does not stop the others."""
+    budget = SharedBudget(GLOBAL_CONCURRENCY)
+    running = asyncio.Semaphore(max(1, PARALLEL_SITES))
+    # Browser renders and upsert batches run in threads: room for every budget slot plus each site's upserts
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(GLOBAL_CONCURRENCY + 4 * PARALLEL_SITES))
+    vectorizer = upsert.get_vectorizer()
+
+    async def run_site(site):
+        async with running:
+            return await run_streaming_pipeline(site, full=full, state=states[site.name], stats=all_stats[site.name],
+                                                budget=budget, vectorizer=vectorizer, close=False)
+
+    try:
+        return await asyncio.gather(*(run_site(site) for site in sites), return_exceptions=True)
+    finally:
+        logging.info(budget.summary())
+        if vectorizer is not None:
+            vectorizer.close()
+        await asyncio.to_thread(upsert.client_wv.close)
+
+
+def run_pipeline(full=FULL_CRAWL):
+    logging.info(f"Starting {'full' if full else 'incremental'} crawl and upsert pipeline...")
     try:
-        chunks = crawl_main()
-        logging.info(f"Crawled {len(chunks)} chunks, starting upsert...")
-        upsert_chunks_optimal(chunks)
-        logging.info("Pipeline run complete.")
+        sites = load_sites()
+        states = {site.name: CrawlState(site.state_path) for site in sites}
+        all_stats = {site.name: {} for site in sites}
+        # Crawl and upsert run concurrently per site, sites in parallel; see app/pipeline/streaming.py
+        results = asyncio.run(run_sites(sites, full, states, all_stats))
     except Exception as e:
         logging.error(f"Pipeline failed: {e}")
-
+        return
+    for site, counts in zip(sites, results):
+        if isinstance(counts, BaseException):
+            logging.error(f"[{site.name}] Pipeline failed: {counts!r}")
+            continue
+        stats = all_stats[site.name]
+        logging.info(
+            f"[{site.name}] Cache hits: {stats.get('cache_hits', 0)}, misses: {stats.get('cache_misses', 0)}, "
+            f"unchanged per sitemap: {stats.get('lastmod_skipped', 0)}, near-duplicate pages: "
+            f"{stats.get('near_dup_pages', 0)} ({stats.get('near_dup_chunks', 0)} chunks skipped), boilerplate removed: "
+            f"{stats.get('boilerplate_bytes', 0) // 1024} KB / {stats.get('boilerplate_chunks', 0)} chunks; upserted {counts}, "
+            f"orphans deleted: {stats.get('gc', {}).get('deleted', 0)}, "
+            f"pages to retry: {stats.get('unsettled_pages', 0)} "
+            f"(crawl {stats['crawl_time']:.0f}s, upsert {stats['upsert_time']:.0f}s, total {stats['wall_time']:.0f}s)"
+        )
+        # Only remember page hashes once their chunks are safely upserted
+        if stats.get("completed"):
+            states[site.name].save()
+    logging.info(f"Pipeline run complete for {len(sites)} site(s).")
 
 # if __name__ == "__main__":
 #     scheduler = BlockingScheduler()
@@ -35,10 +87,14 @@ def run_pipeline():
 #     run_pipeline()
 #     scheduler.start()
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the crawl + upsert pipeline of every registry site every 30 minutes.")
+    parser.add_argument("--full", action="store_true", help="Force a complete recrawl on the first run")
+    args = parser.parse_args()
+
     scheduler = BlockingScheduler()
     scheduler.add_job(run_pipeline, "interval", minutes=30, max_instances=1, coalesce=True)
     logging.info("Scheduler started. Press Ctrl+C to exit.")
-    run_pipeline()
+    run_pipeline(full=args.full or FULL_CRAWL)
     try:
         scheduler.start()
     except (KeyboardInterrupt, SystemExit):
@@ -1,8 +1,21 @@
-from app.crawler.crawler_mp import main as crawl_main
-from app.upsert.upsert import upsert_chunks_optimal
+import asyncio
+import argparse
+
+from app.crawler.crawl_state import CrawlState
+from app.crawler.crawler_mp import FULL_CRAWL
+from app.pipeline.streaming import run_streaming_pipeline
+from app.utils.sites import get_site
 
 if __name__ == "__main__":
-    chunks = crawl_main()
-    print(f"Crawled {len(chunks)} chunks, starting upsert...")
-    upsert_chunks_optimal(chunks)
+    parser = argparse.ArgumentParser(description="Crawl once and upsert the changed chunks.")
+    parser.add_argument("--full", action="store_true", help="Recrawl every URL, ignoring lastmod and the validator cache")
+    parser.add_argument("--site", help="Registry site to run (default: the first one); the scheduler runs all of them")
+    args = parser.parse_args()
+
+    site = get_site(args.site)
+    state, stats = CrawlState(site.state_path), {}
+    asyncio.run(run_streaming_pipeline(site, full=args.full or FULL_CRAWL, state=state, stats=stats))
+    print(f"Cache hits: {stats.get('cache_hits', 0)}, misses: {stats.get('cache_misses', 0)}")
+    if stats.get("completed"):
+        state.save()
     print("Full pipeline completed successfully.")
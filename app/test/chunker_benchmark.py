@@ -0,0 +1,75 @@
+# Benchmark: how many chunks a small edit forces the upsert to write, for the old fixed-size
+# character slicing vs the content-defined chunker (app/utils/chunker.py).
+#
+# A chunk is re-upserted when its (chunk_id, hash) pair is not in the previous version's set;
+# chunk IDs that disappear are counted as orphans.
+#
+# python -m app.test.chunker_benchmark [pages] [sentences_per_page]
+
+import sys
+import time
+import random
+
+from app.utils.chunker import build_chunks
+from app.utils.hash_utils import compute_hash
+
+WORDS = ("silk cotton kurta blue red printed straight anarkali festive sleeve neckline fabric wash "
+         "comfortable fit length occasion embroidery collar pocket lining breathable soft pure").split()
+
+def fixed_chunks(url, text, chunk_size=1000):
+    """The previous chunking: raw character slices with positional IDs."""
+    return [
+        {"chunk_id": f"{url}_chunk_{i // chunk_size}", "hash": compute_hash(text[i:i + chunk_size])}
+        for i in range(0, len(text), chunk_size) if text[i:i + chunk_size].strip()
+    ]
+
+def sentence(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + "."
+
+def page(rng, sentences):
+    lines = []
+    for _ in range(sentences):
+        lines.append(sentence(rng) if rng.random() > 0.2 else f"Price ₹ {rng.randint(500, 5000)}")
+    return "\n".join(lines)
+
+def edits(rng, text):
+    lines = text.split("\n")
+    at = rng.randint(1, max(1, len(lines) // 5))  # near the top, where positional IDs hurt most
+    yield "insert sentence", "\n".join(lines[:at] + [sentence(rng)] + lines[at:])
+    changed = list(lines)
+    changed[at] = changed[at].replace("a", "o", 1) + " Updated"
+    yield "edit sentence", "\n".join(changed)
+    yield "delete sentence", "\n".join(lines[:at] + lines[at + 1:])
+
+def churn(before, after):
+    old = {(c["chunk_id"], c["hash"]) for c in before}
+    new = {(c["chunk_id"], c["hash"]) for c in after}
+    orphans = {c["chunk_id"] for c in before} - {c["chunk_id"] for c in after}
+    return len(new - old), len(orphans), len(after)
+
+if __name__ == "__main__":
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    sentences = int(sys.argv[2]) if len(sys.argv) > 2 else 120
+    rng = random.Random(42)
+    corpus = [(f"https://bench.example.com/p/{n}", page(rng, sentences)) for n in range(pages)]
+
+    print(f"{pages} pages of {sentences} sentences/prices\n")
+    for name, chunker in (("fixed 1000 chars", fixed_chunks), ("content-defined", build_chunks)):
+        start = time.perf_counter()
+        for url, text in corpus:
+            chunker(url, text)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {len(corpus) / elapsed:.0f} pages/s")
+        totals = {}
+        edit_rng = random.Random(7)
+        for url, text in corpus:
+            before = chunker(url, text)
+            for edit, edited in edits(edit_rng, text):
+                written, orphans, total = churn(before, chunker(url, edited))
+                t = totals.setdefault(edit, [0, 0, 0])
+                t[0] += written
+                t[1] += orphans
+                t[2] += total
+        for edit, (written, orphans, total) in totals.items():
+            print(f"  {edit:<16} re-upserted {written:6d}/{total:<6d} ({written / total:6.1%})  orphaned ids {orphans:6d}")
+        print()
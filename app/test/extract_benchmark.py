@@ -0,0 +1,118 @@
+# Benchmark: BeautifulSoup (html.parser) vs the lxml extraction engine on saved pages,
+# plus end-to-end throughput of parsing on the event loop vs in the extraction process pool.
+#
+# Saved pages are *.html files in pages_dir (e.g. logs/failures or pages saved from a crawl);
+# when the directory has none, synthetic storefront pages are generated instead.
+#
+# python -m app.test.extract_benchmark [pages_dir] [max_pages]
+
+import os
+import sys
+import time
+import glob
+import asyncio
+
+from app.crawler import extract
+from app.crawler.extract import get_extractor, extract_async, shutdown_pool
+
+DOMAIN = "bench.example.com"
+BASE = f"https://{DOMAIN}"
+
+def synthetic_page(n):
+    nav = "".join(f'<li><a href="/category-{i}">Category {i}</a></li>' for i in range(80))
+    products = "".join(
+        f'<div class="card"><a href="/KURTA-{n}-{i}/pd/{n:04d}{i:04d}#top"><h3>Kurta {n}-{i}</h3></a>'
+        f'<span class="price">₹ {1000 + i},00</span><button>Add to Cart</button></div>'
+        for i in range(60)
+    )
+    return (
+        f'<!DOCTYPE html><html><head><title>Page {n}</title><link rel="canonical" href="/product-list?page={n}">'
+        f'<script>window.__STATE__ = {{"page": {n}}};</script><style>.card{{margin:0}}</style>'
+        f'<script type="application/ld+json">{{"@type": "ItemList", "numberOfItems": 60}}</script></head>'
+        f'<body><header><nav><ul>{nav}</ul></nav></header><main>{products}</main>'
+        f'<footer><p>&copy; Storefront</p><!-- build {n} --><noscript>Enable JavaScript</noscript></footer></body></html>'
+    )
+
+def load_pages(pages_dir, max_pages):
+    paths = sorted(glob.glob(os.path.join(pages_dir, "*.html")))[:max_pages]
+    if paths:
+        pages = []
+        for path in paths:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                pages.append((f"{BASE}/{os.path.basename(path)[:-5]}", f.read()))
+        return pages, f"{len(pages)} saved pages from {pages_dir}"
+    return [(f"{BASE}/product-list?page={n}", synthetic_page(n)) for n in range(max_pages)], \
+        f"{max_pages} synthetic pages"
+
+def time_engine(name, pages, **options):
+    engine = get_extractor(name)
+    start = time.perf_counter()
+    results = [engine.extract(html, url, **options) for url, html in pages]
+    elapsed = time.perf_counter() - start
+    print(f"{name:<6} {len(pages) / elapsed:8.1f} pages/s  {elapsed / len(pages) * 1000:7.2f} ms/page")
+    return results
+
+def compare(reference, candidate):
+    mismatches = 0
+    for a, b in zip(reference, candidate):
+        if (a.text, a.links, a.canonical) != (b.text, b.links, b.canonical):
+            mismatches += 1
+    return mismatches
+
+async def loop_lag(coro):
+    """Run `coro` while a ticker measures how long the event loop is blocked at worst."""
+    worst = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal worst
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            worst = max(worst, time.perf_counter() - start - 0.01)
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await coro
+    elapsed = time.perf_counter() - start
+    done.set()
+    await tick
+    return elapsed, worst
+
+async def on_loop(pages):
+    engine = get_extractor("bs4")
+    for url, html in pages:
+        engine.extract(html, url, domain=DOMAIN)
+        await asyncio.sleep(0)
+
+async def in_pool(pages):
+    await asyncio.gather(*(extract_async(html, url, domain=DOMAIN) for url, html in pages))
+
+if __name__ == "__main__":
+    pages_dir = sys.argv[1] if len(sys.argv) > 1 else "data/html_samples"
+    max_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    pages, source = load_pages(pages_dir, max_pages)
+    print(f"Extracting {source}\n")
+
+    print("Crawler mode (whole document, links):")
+    ref = time_engine("bs4", pages, domain=DOMAIN)
+    fast = time_engine("lxml", pages, domain=DOMAIN)
+    print(f"mismatched pages: {compare(ref, fast)}/{len(pages)}\n")
+
+    print("Static-fetch mode (body text, scripts/noscript dropped):")
+    static = dict(separator="\n", body_only=True, drop_tags=("script", "style", "noscript", "template"))
+    ref = time_engine("bs4", pages, **static)
+    fast = time_engine("lxml", pages, **static)
+    print(f"mismatched pages: {compare(ref, fast)}/{len(pages)}\n")
+
+    async def run():
+        await in_pool(pages[:extract.EXTRACT_WORKERS or 1])  # start the workers outside the timing
+        for name, coro in (("bs4 on event loop", on_loop(pages)),
+                           (f"{extract.EXTRACT_ENGINE} in pool x{extract.EXTRACT_WORKERS}", in_pool(pages))):
+            elapsed, worst = await loop_lag(coro)
+            print(f"{name:<22} {len(pages) / elapsed:8.1f} pages/s  worst loop stall {worst * 1000:7.1f} ms")
+
+    try:
+        asyncio.run(run())
+    finally:
+        shutdown_pool()
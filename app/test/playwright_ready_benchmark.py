@@ -0,0 +1,84 @@
+# Benchmark: pages/second of the Playwright crawler before and after context reuse + readiness detection.
+#
+# "before": new context and page per URL, route installed per page, wait for networkidle.
+# "after":  one long-lived context/page per worker, extended blocklist, selector / stable-DOM readiness.
+#
+# python -m app.test.playwright_ready_benchmark [max_urls] [workers] [url ...]
+
+import sys
+import time
+import asyncio
+from playwright.async_api import async_playwright
+
+from app.crawler.crawler import START_URL, open_page, extract_links_and_text
+from app.crawler.sitemap import extract_sitemap_links
+
+async def legacy_fetch(browser, url):
+    context = await browser.new_context()
+    page = await context.new_page()
+
+    async def block_resource(route):
+        if route.request.resource_type in ["image", "stylesheet", "font"]:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    try:
+        await page.route("**/*", block_resource)
+        await page.goto(url, wait_until="networkidle", timeout=60000)
+        return await page.content()
+    finally:
+        await page.close()
+        await context.close()
+
+async def run_legacy(browser, urls, workers):
+    queue = asyncio.Queue()
+    for url in urls:
+        queue.put_nowait(url)
+
+    async def worker():
+        while not queue.empty():
+            url = queue.get_nowait()
+            try:
+                await legacy_fetch(browser, url)
+            except Exception as e:
+                print(f"[before] {url}: {type(e).__name__}")
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+async def run_reuse(browser, urls, workers):
+    queue = asyncio.Queue()
+    for url in urls:
+        queue.put_nowait(url)
+
+    async def worker():
+        context, page = await open_page(browser)
+        try:
+            while not queue.empty():
+                url = queue.get_nowait()
+                try:
+                    await extract_links_and_text(page, url)
+                except Exception as e:
+                    print(f"[after] {url}: {type(e).__name__}")
+        finally:
+            await context.close()
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+async def main(urls, workers):
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        for name, runner in (("before", run_legacy), ("after", run_reuse)):
+            start = time.perf_counter()
+            await runner(browser, urls, workers)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<7} {len(urls)} pages in {elapsed:6.1f}s -> {len(urls) / elapsed:5.2f} pages/s")
+        await browser.close()
+
+if __name__ == "__main__":
+    max_urls = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    urls = sys.argv[3:]
+    if not urls:
+        urls = [e.loc for e in asyncio.run(extract_sitemap_links(START_URL))]
+    asyncio.run(main(urls[:max_urls], workers))
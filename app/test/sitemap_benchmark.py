@@ -0,0 +1,110 @@
+# Benchmark: legacy BeautifulSoup sitemap parser vs the streaming lxml parser
+# on a synthetic sitemap index (served in-process through httpx.MockTransport).
+#
+# python -m app.test.sitemap_benchmark [total_urls] [urls_per_sitemap]
+
+import sys
+import gzip
+import time
+import asyncio
+import tracemalloc
+import httpx
+from bs4 import BeautifulSoup
+
+from app.crawler.robots import RobotsCache
+from app.crawler.sitemap import iter_sitemap_entries
+
+SITE = "https://bench.example.com"
+
+def build_site(total_urls, per_sitemap, gzipped=False):
+    ext = ".xml.gz" if gzipped else ".xml"
+    files = {}
+    children = []
+    for n, start in enumerate(range(0, total_urls, per_sitemap)):
+        body = ['<?xml version="1.0" encoding="UTF-8"?>',
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+        for i in range(start, min(start + per_sitemap, total_urls)):
+            body.append(
+                f"<url><loc>{SITE}/product-{i}/pd/{i:08d}</loc><lastmod>2025-07-01T10:00:00+00:00</lastmod>"
+                f"<changefreq>daily</changefreq><priority>0.8</priority></url>"
+            )
+        body.append("</urlset>")
+        data = "\n".join(body).encode()
+        path = f"/sitemap-{n}{ext}"
+        files[path] = gzip.compress(data) if gzipped else data
+        children.append(f"<sitemap><loc>{SITE}{path}</loc></sitemap>")
+    files["/sitemap.xml"] = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        + "".join(children) + "</sitemapindex>"
+    ).encode()
+    files["/robots.txt"] = f"User-agent: *\nSitemap: {SITE}/sitemap.xml\n".encode()
+    return files
+
+def make_client(files):
+    def handler(request):
+        body = files.get(request.url.path)
+        return httpx.Response(200, content=body) if body is not None else httpx.Response(404)
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+async def legacy_extract(client, sitemap_urls):
+    """The pre-streaming implementation: whole-document BeautifulSoup parse per sitemap."""
+    parsed_links = set()
+    visited = set()
+
+    async def parse_sitemap(url):
+        if url in visited:
+            return
+        visited.add(url)
+        res = await client.get(url, follow_redirects=True)
+        if res.status_code != 200:
+            return
+        soup = BeautifulSoup(res.content, "xml")
+        sitemaps = soup.find_all("sitemap")
+        if sitemaps:
+            await asyncio.gather(*(parse_sitemap(s.find("loc").text.strip()) for s in sitemaps if s.find("loc")))
+        for url_entry in soup.find_all("url"):
+            loc = url_entry.find("loc")
+            if loc:
+                parsed_links.add(loc.text.strip())
+        for loc in soup.find_all("loc"):
+            link = loc.text.strip()
+            if link.endswith(".xml"):
+                await parse_sitemap(link)
+            else:
+                parsed_links.add(link)
+
+    await asyncio.gather(*(parse_sitemap(s) for s in sitemap_urls))
+    return parsed_links
+
+async def streaming_extract(client):
+    return [e async for e in iter_sitemap_entries(SITE, RobotsCache(client), client=client)]
+
+def measure(name, coro_factory):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = asyncio.run(coro_factory())
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<22} {len(result):>8} URLs  {elapsed:7.2f}s  peak {peak / 1e6:8.1f} MB")
+    return result
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    per_sitemap = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    plain, gz = build_site(total, per_sitemap), build_site(total, per_sitemap, gzipped=True)
+
+    async def run_legacy():
+        async with make_client(plain) as client:
+            return await legacy_extract(client, [f"{SITE}/sitemap.xml"])
+
+    async def run_streaming(files):
+        async with make_client(files) as client:
+            return await streaming_extract(client)
+
+    print(f"Synthetic index: {total} URLs in sitemaps of {per_sitemap}\n")
+    legacy = measure("legacy (bs4)", run_legacy)
+    streamed = measure("streaming (lxml)", lambda: run_streaming(plain))
+    measure("streaming (.xml.gz)", lambda: run_streaming(gz))
+    assert legacy == {e.loc for e in streamed}, "parsers disagree on the URL set"
@@ -0,0 +1,168 @@
+# Benchmark: upsert throughput of the previous per-chunk path (exists + fetch + replace/insert +
+# verification fetch, one request each) vs the batched engine in app/upsert/upsert.py.
+#
+# Runs against an in-memory stand-in for a Weaviate collection that sleeps LATENCY seconds per
+# request (plus a small per-object cost for batches), so no server is needed. Half of the chunks
+# already exist, a quarter of those with a stale hash. The last row decides from a local hash
+# index (app/upsert/hash_index.py) that was reconciled with the stand-in first.
+#
+# python -m app.test.upsert_benchmark [chunks] [latency_ms]
+
+import sys
+import time
+import random
+import tempfile
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+from app.upsert import upsert
+from app.upsert.hash_index import HashIndex, reconcile_summary
+from app.utils.hash_utils import compute_hash
+from app.utils.uuid_utils import get_uuid_from_chunk_id
+
+PER_OBJECT = 0.00005  # server-side cost of one object inside a batch request
+
+
+class StandInCollection:
+    def __init__(self, latency):
+        self.latency = latency
+        self.objects = {}
+        self.requests = 0
+        self.data = SimpleNamespace(exists=self._exists, insert=self._insert, replace=self._replace)
+        self.query = SimpleNamespace(fetch_object_by_id=self._fetch_by_id, fetch_objects=self._fetch_objects)
+        self.batch = StandInBatch(self)
+
+    def _request(self, objects=1):
+        self.requests += 1
+        time.sleep(self.latency + PER_OBJECT * objects)
+
+    def _exists(self, uuid):
+        self._request()
+        return uuid in self.objects
+
+    def _insert(self, uuid, properties):
+        self._request()
+        self.objects[uuid] = properties
+
+    _replace = _insert
+
+    def _fetch_by_id(self, uuid):
+        self._request()
+        props = self.objects.get(uuid)
+        return SimpleNamespace(uuid=uuid, properties=props) if props else None
+
+    def _fetch_objects(self, filters, limit, return_properties):
+        self._request(len(filters.value))
+        found = [SimpleNamespace(uuid=uuid, properties=self.objects[uuid])
+                 for uuid in filters.value if uuid in self.objects]
+        return SimpleNamespace(objects=found[:limit])
+
+    def iterator(self, return_properties, cache_size):
+        uuids = list(self.objects)
+        for i in range(0, len(uuids), cache_size):
+            self._request(min(cache_size, len(uuids) - i))
+            for uuid in uuids[i:i + cache_size]:
+                yield SimpleNamespace(uuid=uuid, properties=self.objects[uuid])
+
+
+class StandInBatch:
+    def __init__(self, collection):
+        self.collection = collection
+        self.failed_objects = []
+        self.pending = []
+        self.size, self.concurrent = 100, 2
+
+    def fixed_size(self, batch_size=100, concurrent_requests=2):
+        self.size, self.concurrent = batch_size, concurrent_requests
+        self.failed_objects, self.pending = [], []
+        return self
+
+    def dynamic(self):
+        return self.fixed_size(upsert.BATCH_SIZE, upsert.CONCURRENT_REQUESTS)
+
+    def add_object(self, properties, uuid, vector=None):
+        self.pending.append((uuid, properties))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        groups = [self.pending[i:i + self.size] for i in range(0, len(self.pending), self.size)]
+        with ThreadPoolExecutor(self.concurrent) as pool:
+            list(pool.map(lambda group: self.collection._request(len(group)), groups))
+        for uuid, properties in self.pending:
+            self.collection.objects[uuid] = properties
+        self.pending = []
+
+
+def make_chunks(n, rng):
+    chunks = []
+    for i in range(n):
+        content = " ".join(rng.choice("kurta silk cotton blue festive sleeve".split()) for _ in range(60))
+        chunks.append({
+            "chunk_id": f"https://bench.example.com/p/{i // 8}_chunk_{i % 8}",
+            "url": f"https://bench.example.com/p/{i // 8}",
+            "content": content,
+            "last_updated": "2024-01-01T00:00:00Z",
+            "hash": compute_hash(content),
+        })
+    return chunks
+
+
+def seed(collection, chunks, rng):
+    """Store half of the chunks, a quarter of those with a stale hash."""
+    for chunk in chunks[: len(chunks) // 2]:
+        props = upsert.chunk_properties(chunk)
+        if rng.random() < 0.25:
+            props["hash"] = "stale"
+        collection.objects[get_uuid_from_chunk_id(chunk["chunk_id"])] = props
+
+
+def legacy_upsert(collection, chunks, counts):
+    """The per-chunk path this benchmark replaces."""
+    for chunk in chunks:
+        uuid = get_uuid_from_chunk_id(chunk["chunk_id"])
+        properties = upsert.chunk_properties(chunk)
+        if collection.data.exists(uuid):
+            existing = collection.query.fetch_object_by_id(uuid)
+            if existing.properties.get("hash") == chunk["hash"]:
+                counts["skipped"] += 1
+                continue
+            collection.data.replace(uuid=uuid, properties=properties)
+            collection.query.fetch_object_by_id(uuid)
+            counts["replaced"] += 1
+        else:
+            collection.data.insert(uuid=uuid, properties=properties)
+            counts["inserted"] += 1
+
+
+def batched_upsert(collection, chunks, counts, index=None):
+    for i in range(0, len(chunks), upsert.PREFETCH_SIZE):
+        upsert.upsert_batch(collection, chunks[i:i + upsert.PREFETCH_SIZE], counts, index)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 2.0) / 1000
+    chunks = make_chunks(n, random.Random(1))
+    print(f"{n} chunks, {latency * 1000:.1f} ms per request, batch size {upsert.BATCH_SIZE}, "
+          f"{upsert.CONCURRENT_REQUESTS} concurrent requests, verify rate {upsert.VERIFY_RATE:.0%}\n")
+
+    for name, run in (("per-chunk", legacy_upsert), ("batched", batched_upsert), ("index", batched_upsert)):
+        collection = StandInCollection(latency)
+        seed(collection, chunks, random.Random(2))
+        counts = upsert.new_counts()
+        args = ()
+        if name == "index":
+            index = HashIndex("bench", directory=tempfile.mkdtemp())
+            start = time.perf_counter()
+            print(reconcile_summary(index.reconcile(collection)), f"({time.perf_counter() - start:.2f}s)")
+            collection.requests = 0
+            args = (index,)
+        start = time.perf_counter()
+        run(collection, chunks, counts, *args)
+        elapsed = time.perf_counter() - start
+        stored_ok = all(collection.objects[get_uuid_from_chunk_id(c["chunk_id"])]["hash"] == c["hash"] for c in chunks)
+        print(f"{name:<10} {elapsed:7.2f}s  {n / elapsed:8.0f} chunks/s  {collection.requests:6d} requests  "
+              f"inserted {counts['inserted']}, replaced {counts['replaced']}, skipped {counts['skipped']}, "
+              f"all stored: {stored_ok}")
@@ -0,0 +1,196 @@
+# Client-side embeddings ("bring your own vectors").
+# With UPSERT_EMBEDDINGS=openai or local the upsert embeds the chunks it is about to write and
+# sends the vectors with them, instead of letting Weaviate's text2vec-openai re-embed every
+# replaced object. Vectors are cached by the hash of the exact text in a memory-mapped file,
+# so text that reappears under another chunk ID (variants, moved chunks) is never embedded twice.
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+
+import numpy as np
+
+from app.utils.chunker import count_tokens
+
+EMBEDDINGS = os.getenv("UPSERT_EMBEDDINGS", "server")  # "server" (Weaviate vectorizer), "openai" or "local"
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "data/embeddings")
+BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", 100000))  # tokens per embedding request
+BATCH_INPUTS = int(os.getenv("EMBED_BATCH_INPUTS", 2048))  # inputs per request (OpenAI limit)
+LOCAL_DIM = int(os.getenv("EMBED_LOCAL_DIM", 256))
+MAX_INPUT_TOKENS = 8191  # longest input the OpenAI embedding models accept
+
+MODEL_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+_WORD = re.compile(r"\w+")
+
+
+def content_key(text) -> str:
+    """Cache key of the exact text (compute_hash normalizes too much: "1,299" == "12.99")."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class OpenAIEmbedder:
+    def __init__(self, model=EMBEDDING_MODEL):
+        from openai import OpenAI
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.model = model
+        self.name = model
+        self.dim = MODEL_DIMENSIONS.get(model, 1536)
+
+    def embed(self, texts) -> list:
+        response = self.client.embeddings.create(model=self.model, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class LocalEmbedder:
+    """Deterministic hashed bag of words and word pairs; for offline runs and tests, not for search quality."""
+
+    def __init__(self, dim=LOCAL_DIM):
+        self.dim = dim
+        self.name = f"local-{dim}"
+
+    def _vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = _WORD.findall(text.lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed(self, texts) -> list:
+        return [self._vector(text).tolist() for text in texts]
+
+
+EMBEDDERS = {
+    "openai": OpenAIEmbedder,
+    "local": LocalEmbedder,
+}
+
+
+class EmbeddingCache:
+    """Vectors of one embedder keyed by content_key: rows in a float32 memmap, keys in SQLite."""
+
+    def __init__(self, name, dim, directory=EMBED_CACHE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.dim = dim
+        self.vectors_path = os.path.join(directory, f"{name}.f32")
+        self.db = sqlite3.connect(os.path.join(directory, f"{name}.db"), isolation_level=None,
+                                  check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self.rows = self.db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM vectors").fetchone()[0]
+        self._lock = threading.Lock()
+        self._map = None
+        self._open(max(self.rows, 1024))
+
+    def _open(self, capacity):
+        # Rows past the last committed key (a crash mid-write) are simply overwritten later
+        size = capacity * self.dim * 4
+        with open(self.vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        if self._map is not None:
+            self._map.flush()
+        self._map = np.memmap(self.vectors_path, dtype=np.float32, mode="r+",
+                              shape=(os.path.getsize(self.vectors_path) // (self.dim * 4), self.dim))
+
+    def get_many(self, keys) -> dict:
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                group = keys[i:i + 500]
+                rows = self.db.execute(
+                    f"SELECT key, row FROM vectors WHERE key IN ({','.join('?' * len(group))})", group
+                ).fetchall()
+                found.update((key, np.array(self._map[row])) for key, row in rows)
+        return found
+
+    def put_many(self, items):
+        """Store (key, vector) pairs; the vectors are flushed before their keys are committed."""
+        with self._lock:
+            if self.rows + len(items) > len(self._map):
+                self._open(max(2 * len(self._map), self.rows + len(items)))
+            rows = []
+            for key, vector in items:
+                self._map[self.rows] = vector
+                rows.append((key, self.rows))
+                self.rows += 1
+            self._map.flush()
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.executemany("INSERT OR REPLACE INTO vectors (key, row) VALUES (?, ?)", rows)
+            self.db.execute("COMMIT")
+
+    def close(self):
+        self._map.flush()
+        self.db.close()
+
+
+def _packed(items):
+    """Split (key, text) pairs into requests of at most BATCH_TOKENS tokens / BATCH_INPUTS inputs."""
+    batch, tokens = [], 0
+    for key, text in items:
+        n = min(count_tokens(text), MAX_INPUT_TOKENS)
+        if batch and (tokens + n > BATCH_TOKENS or len(batch) >= BATCH_INPUTS):
+            yield batch
+            batch, tokens = [], 0
+        batch.append((key, text))
+        tokens += n
+    if batch:
+        yield batch
+
+
+class Vectorizer:
+    """Embedder plus cache; attaches a "vector" to chunks before they are written."""
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self.cache = EmbeddingCache(embedder.name, embedder.dim)
+
+    def embed_chunks(self, chunks, counts):
+        keys = [content_key(chunk["content"]) for chunk in chunks]
+        vectors = self.cache.get_many(list(set(keys)))
+        counts["embed_cached"] += sum(1 for key in keys if key in vectors)
+        missing = {key: chunk["content"] for key, chunk in zip(keys, chunks) if key not in vectors}
+        for batch in _packed(missing.items()):
+            start = time.monotonic()
+            embedded = self.embedder.embed([text for _, text in batch])
+            counts["embed_time"] += time.monotonic() - start
+            counts["embed_requests"] += 1
+            self.cache.put_many([(key, vector) for (key, _), vector in zip(batch, embedded)])
+            vectors.update((key, np.asarray(vector, dtype=np.float32)) for (key, _), vector in zip(batch, embedded))
+        counts["embedded"] += len(missing)
+        # Repeats inside this call were embedded once; they count as saved calls like cache hits
+        counts["embed_cached"] += sum(1 for key in keys if key in missing) - len(missing)
+        for key, chunk in zip(keys, chunks):
+            chunk["vector"] = vectors[key].tolist()
+
+    def close(self):
+        self.cache.close()
+
+
+def get_vectorizer(name=EMBEDDINGS):
+    """Vectorizer for UPSERT_EMBEDDINGS, or None when Weaviate embeds server-side."""
+    if name == "server":
+        return None
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown UPSERT_EMBEDDINGS {name!r}; choose server, {', '.join(EMBEDDERS)}")
+    return Vectorizer(EMBEDDERS[name]())
+
+
+def embedding_summary(counts) -> str:
+    total = counts["embedded"] + counts["embed_cached"]
+    if not total:
+        return "[EMBED] Nothing embedded client-side."
+    return (f"[EMBED] {total} vectors: {counts['embed_cached']} from cache ({counts['embed_cached'] / total:.0%} hit rate), "
+            f"{counts['embedded']} embedded in {counts['embed_requests']} requests ({counts['embed_time']:.1f}s); "
+            f"{counts['embed_cached']} embedding inputs saved.")
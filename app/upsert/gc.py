@@ -0,0 +1,197 @@
+# Orphan cleanup for PageChunk.
+# Two kinds of objects are no longer produced by the site: every object of a URL that left the
+# sitemap (delisted product, removed page), and chunk IDs a live page stopped producing (it got
+# shorter or was re-chunked). Both are found locally by comparing the hash index (what is stored)
+# with the page manifest (what each page currently has) and the sitemap, then removed with
+# delete_many calls filtered by id (never by url: older collections word-tokenize it, so a url
+# filter matches nearly every object). Only pages in this run's manifest on the crawled site's
+# host are considered, so other writers and sites sharing a collection keep their objects.
+#
+# python -m app.upsert.gc [--site NAME] [--dry-run] [--force]
+
+import os
+import json
+import time
+import asyncio
+import argparse
+from dataclasses import dataclass, field
+
+from weaviate.classes.query import Filter
+
+from app.utils.uuid_utils import get_uuid_from_chunk_id
+from app.chatbot.answer_cache import invalidate_chunks
+from app.upsert.manifest import manifest_uuid
+from app.upsert.reindex import wait_for_switch
+
+GC_DIR = os.getenv("GC_DIR", "data/gc")
+GC_ENABLED = os.getenv("GC_ENABLED", "1") == "1"
+GC_DRY_RUN = os.getenv("GC_DRY_RUN", "0") == "1"
+# Refuse to delete more than this share of the stored objects in one run (empty or broken sitemap)
+MAX_DELETE_RATIO = float(os.getenv("GC_MAX_DELETE_RATIO", 0.2))
+DELETE_GROUP = 200  # values per delete_many filter
+
+
+@dataclass
+class GcPlan:
+    stored: int
+    urls: dict = field(default_factory=dict)  # url gone from the site -> its stored UUIDs
+    chunks: dict = field(default_factory=dict)  # live url -> UUIDs of chunks it no longer has
+
+    @property
+    def objects(self) -> int:
+        return sum(map(len, self.urls.values())) + sum(map(len, self.chunks.values()))
+
+    def report(self) -> dict:
+        return {
+            "stored": self.stored,
+            "objects": self.objects,
+            "removed_urls": {url: len(uuids) for url, uuids in self.urls.items()},
+            "shrunk_pages": {url: len(uuids) for url, uuids in self.chunks.items()},
+        }
+
+
+def plan_gc(index, manifest, site_urls, site=None) -> GcPlan:
+    """Compare what is stored with the current site; nothing is read from the vector DB.
+
+    Only pages this `manifest` wrote are judged: index rows without an entry in it belong to
+    another writer (crawler.py's "site" manifest, another registry site) and are left alone.
+    With a registry `site`, stored URLs on other hosts are skipped as well.
+    """
+    live = set(site_urls)
+    pages = manifest.chunk_map()
+    unsettled = manifest.unsettled
+    stored = {url: uuids for url, uuids in index.by_url().items()
+              if url in pages and (site is None or site.owns(url))}
+    plan = GcPlan(stored=sum(map(len, stored.values())))
+    for url, uuids in stored.items():
+        if url in unsettled:
+            # Pages without a settled manifest entry are left alone: their chunk set is unknown
+            continue
+        if url not in live:
+            plan.urls[url] = uuids
+        else:
+            expected = {get_uuid_from_chunk_id(chunk_id) for chunk_id in pages[url]}
+            orphans = [uuid for uuid in uuids if uuid not in expected]
+            if orphans:
+                plan.chunks[url] = orphans
+    return plan
+
+
+def gc_summary(plan) -> str:
+    return (f"[GC] {plan.objects} of {plan.stored} stored objects are orphans: "
+            f"{sum(map(len, plan.urls.values()))} from {len(plan.urls)} URLs no longer on the site, "
+            f"{sum(map(len, plan.chunks.values()))} old chunks of {len(plan.chunks)} shorter pages.")
+
+
+def _delete(collection, where):
+    wait_for_switch()
+    result = collection.data.delete_many(where=where)
+    return result.successful, result.failed
+
+
+def collect_garbage(collection, manifest_collection, manifest, index, site_urls, state=None, near_dup=None,
+                    dry_run=GC_DRY_RUN, force=False, name="sitemap", site=None) -> dict:
+    """Delete orphaned objects; returns the report (also written to data/gc/<name>_report.json)."""
+    if not site_urls:
+        print("[GC] No sitemap URLs: skipping cleanup.")
+        return {}
+    plan = plan_gc(index, manifest, site_urls, site)
+    report = plan.report()
+    print(gc_summary(plan))
+
+    if plan.objects and plan.objects > MAX_DELETE_RATIO * plan.stored and not force:
+        print(f"[GC] Refusing to delete more than {MAX_DELETE_RATIO:.0%} of the collection; "
+              f"check the sitemap, then rerun with --force (GC_MAX_DELETE_RATIO).")
+        report["refused"] = True
+        dry_run = True
+    if dry_run or not plan.objects:
+        report["dry_run"] = dry_run
+        _save_report(report, name)
+        return report
+
+    deleted = failed = 0
+    urls = list(plan.urls)
+    for i in range(0, len(urls), DELETE_GROUP):
+        group = urls[i:i + DELETE_GROUP]
+        group_uuids = [uuid for url in group for uuid in plan.urls[url]]
+        group_failed = 0
+        for j in range(0, len(group_uuids), DELETE_GROUP):
+            ok, bad = _delete(collection, Filter.by_id().contains_any(group_uuids[j:j + DELETE_GROUP]))
+            deleted, failed, group_failed = deleted + ok, failed + bad, group_failed + bad
+        if not group_failed:
+            index.delete(group_uuids)
+            _invalidate(group_uuids)
+            for url in group:
+                manifest.remove(url)
+            # By id for the same reason: older PageManifest collections word-tokenize url as well
+            manifest_collection.data.delete_many(
+                where=Filter.by_id().contains_any([manifest_uuid(url) for url in group]))
+    uuids = [uuid for page in plan.chunks.values() for uuid in page]
+    for i in range(0, len(uuids), DELETE_GROUP):
+        group = uuids[i:i + DELETE_GROUP]
+        ok, bad = _delete(collection, Filter.by_id().contains_any(group))
+        deleted, failed = deleted + ok, failed + bad
+        if not bad:
+            index.delete(group)
+            _invalidate(group)
+
+    # Aliases of a removed canonical page have no text of their own in the index any more
+    reindex = []
+    if near_dup is not None:
+        live = set(site_urls)
+        for url in urls:
+            reindex += [alias for alias in near_dup.remove(url) if alias in live]
+        near_dup.save()
+        if state is not None:
+            for alias in reindex:
+                state.forget(alias)
+
+    report.update(deleted=deleted, failed=failed, reindex=reindex)
+    print(f"[GC] Deleted {deleted} objects ({failed} failed); {len(reindex)} aliases will be indexed again next run.")
+    _save_report(report, name)
+    return report
+
+
+def _invalidate(uuids):
+    try:
+        invalidate_chunks([(uuid, None) for uuid in uuids])  # cached chatbot answers quoting them
+    except Exception as err:
+        print(f"[GC] Could not invalidate cached answers: {err}")
+
+
+def _save_report(report, name):
+    os.makedirs(GC_DIR, exist_ok=True)
+    report["time"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    with open(os.path.join(GC_DIR, f"{name}_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    from app.crawler.crawl_state import CrawlState
+    from app.crawler.crawler_mp import get_crawlable_urls
+    from app.crawler.near_dup import NEAR_DUP_ENABLED, NearDupIndex
+    from app.upsert import upsert
+    from app.upsert.manifest import Manifest, check_against_remote
+    from app.utils.sites import get_site
+
+    parser = argparse.ArgumentParser(description="Delete PageChunk objects the site no longer produces.")
+    parser.add_argument("--site", help="Registry site to clean up (default: the first one)")
+    parser.add_argument("--dry-run", action="store_true", help="Only write the report")
+    parser.add_argument("--force", action="store_true", help="Ignore GC_MAX_DELETE_RATIO")
+    args = parser.parse_args()
+    site = get_site(args.site)
+
+    collection = upsert.connect_collection(site.collection, site.tenant)
+    manifest_collection = upsert.connect_manifest()
+    manifest = Manifest(site.name)
+    index = upsert.open_hash_index(collection, check_against_remote(manifest, manifest_collection))
+    state = CrawlState(site.state_path)
+    site_urls = [e.loc for e in asyncio.run(get_crawlable_urls(site.start_url)) if not site.skipped(e.loc)]
+    collect_garbage(collection, manifest_collection, manifest, index, site_urls, state=state,
+                    near_dup=NearDupIndex(site.name) if NEAR_DUP_ENABLED else None,
+                    dry_run=args.dry_run or GC_DRY_RUN, force=args.force, name=site.name, site=site)
+    manifest.mirror(manifest_collection, manifest.save_root())
+    state.save()
+    manifest.close()
+    index.close()
+    upsert.client_wv.close()
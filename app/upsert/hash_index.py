@@ -0,0 +1,147 @@
+# Local index of what the vector DB holds: uuid -> (hash, url, last_updated) in SQLite (WAL mode).
+# The upsert decides skip / insert / replace from this index instead of reading hashes back from
+# Weaviate, records each successful batch in one transaction, and can be rebuilt from the
+# collection with a cursor scan whenever it may have drifted (wiped DB, writes from another host).
+#
+# python -m app.upsert.hash_index [--site NAME]  -> reconcile the index with the site's collection
+
+import os
+import time
+import sqlite3
+import threading
+
+HASH_INDEX_DIR = os.getenv("UPSERT_HASH_INDEX_DIR", "data/hash_index")
+SCAN_PAGE_SIZE = int(os.getenv("UPSERT_SCAN_PAGE_SIZE", 1000))  # objects per cursor page
+_LOOKUP_SIZE = 500  # stays below SQLite's bound-parameter limit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    uuid TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    url TEXT,
+    last_updated TEXT
+);
+CREATE INDEX IF NOT EXISTS objects_url ON objects (url);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class HashIndex:
+    """Stored hash of every object in one collection (one SQLite file per collection)."""
+
+    def __init__(self, name, directory=HASH_INDEX_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{name}.db")
+        self.db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()  # upsert workers share the connection
+
+    def lookup(self, uuids) -> dict:
+        """Stored hash for each of `uuids` the index knows."""
+        hashes = {}
+        with self._lock:
+            for i in range(0, len(uuids), _LOOKUP_SIZE):
+                group = uuids[i:i + _LOOKUP_SIZE]
+                rows = self.db.execute(
+                    f"SELECT uuid, hash FROM objects WHERE uuid IN ({','.join('?' * len(group))})", group
+                )
+                hashes.update(rows.fetchall())
+        return hashes
+
+    def record(self, rows):
+        """Store (uuid, hash, url, last_updated) rows written by one successful batch."""
+        with self._lock, _Transaction(self.db):
+            self.db.executemany(
+                "INSERT OR REPLACE INTO objects (uuid, hash, url, last_updated) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def delete(self, uuids):
+        with self._lock, _Transaction(self.db):
+            self.db.executemany("DELETE FROM objects WHERE uuid = ?", [(uuid,) for uuid in uuids])
+
+    def by_url(self) -> dict:
+        """url -> UUIDs of the objects stored for it."""
+        pages = {}
+        with self._lock:
+            for uuid, url in self.db.execute("SELECT uuid, url FROM objects"):
+                pages.setdefault(url, []).append(uuid)
+        return pages
+
+    def count(self) -> int:
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM objects").fetchone()[0]
+
+    def reconciled_at(self):
+        with self._lock:
+            row = self.db.execute("SELECT value FROM meta WHERE key = 'reconciled_at'").fetchone()
+        return float(row[0]) if row else None
+
+    def reconcile(self, collection) -> dict:
+        """Replace the index with a full cursor scan of `collection`; returns what differed."""
+        with self._lock:
+            local = dict(self.db.execute("SELECT uuid, hash FROM objects").fetchall())
+        rows = []
+        added = changed = 0
+        for obj in collection.iterator(return_properties=["hash", "url", "last_updated"], cache_size=SCAN_PAGE_SIZE):
+            uuid = str(obj.uuid)
+            stored = obj.properties.get("hash")
+            if stored is None:
+                continue
+            old = local.pop(uuid, None)
+            if old is None:
+                added += 1
+            elif old != stored:
+                changed += 1
+            last_updated = obj.properties.get("last_updated")  # a datetime once the property is DATE
+            rows.append((uuid, stored, obj.properties.get("url"),
+                         last_updated.strftime("%Y-%m-%dT%H:%M:%SZ") if hasattr(last_updated, "strftime") else last_updated))
+        with self._lock, _Transaction(self.db):
+            self.db.execute("DELETE FROM objects")
+            self.db.executemany(
+                "INSERT OR REPLACE INTO objects (uuid, hash, url, last_updated) VALUES (?, ?, ?, ?)", rows
+            )
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('reconciled_at', ?)", (str(time.time()),))
+        return {"objects": len(rows), "added": added, "changed": changed, "removed": len(local)}
+
+    def close(self):
+        self.db.close()
+
+
+class _Transaction:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, *exc):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def reconcile_summary(result) -> str:
+    return (f"[HASH INDEX] Reconciled {result['objects']} objects: {result['added']} missing locally, "
+            f"{result['changed']} with a different hash, {result['removed']} no longer in the collection.")
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.upsert.upsert import connect_collection, client_wv, hash_index_name
+    from app.utils.sites import get_site
+
+    parser = argparse.ArgumentParser(description="Rebuild the local hash index from the collection.")
+    parser.add_argument("--site", help="Registry site whose collection / tenant to scan (default: the first one)")
+    args = parser.parse_args()
+    site = get_site(args.site)
+
+    collection = connect_collection(site.collection, site.tenant)
+    index = HashIndex(hash_index_name(collection))
+    start = time.monotonic()
+    print(reconcile_summary(index.reconcile(collection)))
+    print(f"[HASH INDEX] {index.count()} objects in {index.path} ({time.monotonic() - start:.1f}s)")
+    index.close()
+    client_wv.close()
@@ -0,0 +1,263 @@
+# Merkle-style content manifest: chunk hashes roll up into a page hash, page hashes into a site
+# root hash. Stored locally in SQLite and mirrored to the non-vectorized PageManifest collection,
+# so one comparison tells whether a page (or the whole site) needs any upsert at all, and a
+# changed page lists exactly which chunks were added, changed or removed.
+
+import os
+import time
+import sqlite3
+import hashlib
+from dataclasses import dataclass, field
+
+from app.utils.uuid_utils import get_uuid_from_chunk_id
+from app.utils.sites import DEFAULT_SITE
+
+MANIFEST_DIR = os.getenv("UPSERT_MANIFEST_DIR", "data/manifest")
+MANIFEST_COLLECTION = "PageManifest"
+ROOT_KEY = "__root__"  # url of the object that carries the site root hash in PageManifest
+
+
+def root_key(name) -> str:
+    """PageManifest key of manifest `name`'s root; sites sharing PageManifest each keep their own."""
+    return ROOT_KEY if name == DEFAULT_SITE else f"{ROOT_KEY}:{name}"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    page_hash TEXT NOT NULL,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    url TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (url, chunk_id)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def page_hash(chunks) -> str:
+    """Hash of a page's (chunk_id, hash) pairs; order-independent."""
+    h = hashlib.blake2b(digest_size=16)
+    for chunk_id, chunk_hash in sorted((c["chunk_id"], c["hash"]) for c in chunks):
+        h.update(f"{chunk_id}\0{chunk_hash}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def manifest_uuid(url) -> str:
+    return get_uuid_from_chunk_id(f"manifest:{url}")
+
+
+@dataclass
+class PageDiff:
+    url: str
+    page_hash: str
+    added: list = field(default_factory=list)
+    changed: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+
+    @property
+    def unchanged(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+    @property
+    def touched(self) -> set:
+        """Chunk IDs that must be written."""
+        return set(self.added) | set(self.changed)
+
+
+class Manifest:
+    """Local page / chunk hash tree for one crawl (one SQLite file per name)."""
+
+    def __init__(self, name, directory=MANIFEST_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{name}.db")
+        self.root_key = root_key(name)
+        self.db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self._staged = {}  # url -> [chunks, chunk ids still in flight, failed]
+        self._failed = set()  # urls with a chunk that failed this run (entry kept at its old state)
+        self.committed = []  # (url, page_hash, chunk ids) written this run, for the mirror
+
+    def stored_page_hash(self, url):
+        row = self.db.execute("SELECT page_hash FROM pages WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def diff(self, url, chunks) -> PageDiff:
+        new_hash = page_hash(chunks)
+        diff = PageDiff(url, new_hash)
+        if self.stored_page_hash(url) == new_hash:
+            return diff
+        old = dict(self.db.execute("SELECT chunk_id, hash FROM chunks WHERE url = ?", (url,)).fetchall())
+        new = {c["chunk_id"]: c["hash"] for c in chunks}
+        diff.added = [cid for cid in new if cid not in old]
+        diff.changed = [cid for cid in new if cid in old and old[cid] != new[cid]]
+        diff.removed = [cid for cid in old if cid not in new]
+        return diff
+
+    def commit(self, url, chunks):
+        with _Transaction(self.db):
+            self.db.execute("DELETE FROM chunks WHERE url = ?", (url,))
+            self.db.executemany(
+                "INSERT INTO chunks (url, chunk_id, hash) VALUES (?, ?, ?)",
+                [(url, c["chunk_id"], c["hash"]) for c in chunks],
+            )
+            digest = page_hash(chunks)
+            self.db.execute(
+                "INSERT OR REPLACE INTO pages (url, page_hash, updated_at) VALUES (?, ?, ?)",
+                (url, digest, time.time()),
+            )
+        self.committed.append((url, digest, [c["chunk_id"] for c in chunks]))
+
+    def stage(self, url, chunks, in_flight):
+        """Hold a page's new entry until every chunk in `in_flight` has been written."""
+        if not in_flight:
+            self.commit(url, chunks)
+            return
+        self._staged[url] = [chunks, set(in_flight), False]
+
+    def ack(self, chunks, failed=()):
+        """Record a written batch; pages whose chunks all succeeded are committed."""
+        failed = set(failed)
+        for chunk in chunks:
+            entry = self._staged.get(chunk["url"])
+            if entry is None:
+                continue
+            entry[1].discard(chunk["chunk_id"])
+            entry[2] = entry[2] or chunk["chunk_id"] in failed
+            if not entry[1]:
+                del self._staged[chunk["url"]]
+                if entry[2]:
+                    self._failed.add(chunk["url"])
+                else:
+                    self.commit(chunk["url"], entry[0])
+
+    @property
+    def unsettled(self) -> set:
+        """Pages whose entry does not describe what is stored: still in flight or partly failed."""
+        return set(self._staged) | self._failed
+
+    def remove(self, url):
+        with _Transaction(self.db):
+            self.db.execute("DELETE FROM chunks WHERE url = ?", (url,))
+            self.db.execute("DELETE FROM pages WHERE url = ?", (url,))
+
+    def chunk_ids(self, url=None) -> list:
+        if url is None:
+            return [row[0] for row in self.db.execute("SELECT chunk_id FROM chunks")]
+        return [row[0] for row in self.db.execute("SELECT chunk_id FROM chunks WHERE url = ?", (url,))]
+
+    def chunk_map(self) -> dict:
+        """url -> set of chunk IDs the page currently has."""
+        pages = {}
+        for url, chunk_id in self.db.execute("SELECT url, chunk_id FROM chunks"):
+            pages.setdefault(url, set()).add(chunk_id)
+        for url in self.urls():
+            pages.setdefault(url, set())  # pages that now have no chunks at all
+        return pages
+
+    def urls(self) -> list:
+        return [row[0] for row in self.db.execute("SELECT url FROM pages")]
+
+    def root_hash(self) -> str:
+        """Site root: hash over every (url, page_hash) in url order."""
+        h = hashlib.blake2b(digest_size=16)
+        for url, digest in self.db.execute("SELECT url, page_hash FROM pages ORDER BY url"):
+            h.update(f"{url}\0{digest}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    def stored_root(self):
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'root'").fetchone()
+        return row[0] if row else None
+
+    def save_root(self) -> str:
+        root = self.root_hash()
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('root', ?)", (root,))
+        return root
+
+    def plan(self, chunks):
+        """Diff a whole run's chunks. Returns (new root hash, {url: PageDiff} of changed pages)."""
+        by_url = {}
+        for chunk in chunks:
+            by_url.setdefault(chunk["url"], []).append(chunk)
+        h = hashlib.blake2b(digest_size=16)
+        current = dict(self.db.execute("SELECT url, page_hash FROM pages").fetchall())
+        diffs = {}
+        for url, page_chunks in by_url.items():
+            diff = self.diff(url, page_chunks)
+            current[url] = diff.page_hash
+            if not diff.unchanged:
+                diffs[url] = diff
+        for url in sorted(current):
+            h.update(f"{url}\0{current[url]}\n".encode("utf-8"))
+        return h.hexdigest(), diffs
+
+    def mirror(self, collection, root) -> int:
+        """Write this run's committed pages and the root to PageManifest; returns failed objects."""
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        with collection.batch.fixed_size(batch_size=200) as batch:
+            for url, digest, chunk_ids in self.committed:
+                batch.add_object(
+                    properties={"url": url, "page_hash": digest, "chunk_ids": chunk_ids, "last_updated": now},
+                    uuid=manifest_uuid(url),
+                )
+            # The root is what the next run compares against (see check_against_remote)
+            batch.add_object(
+                properties={"url": self.root_key, "page_hash": root, "chunk_ids": [], "last_updated": now},
+                uuid=manifest_uuid(self.root_key),
+            )
+        failed = len(collection.batch.failed_objects)
+        if not failed:
+            self.committed.clear()
+        return failed
+
+    def reset(self):
+        with _Transaction(self.db):
+            self.db.execute("DELETE FROM chunks")
+            self.db.execute("DELETE FROM pages")
+            self.db.execute("DELETE FROM meta")
+        self._staged.clear()
+        self._failed.clear()
+
+    def close(self):
+        self.db.close()
+
+
+class _Transaction:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, *exc):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def remote_root(collection, key=ROOT_KEY):
+    """Site root hash mirrored in PageManifest under `key`, or None."""
+    obj = collection.query.fetch_object_by_id(manifest_uuid(key))
+    return obj.properties.get("page_hash") if obj else None
+
+
+def check_against_remote(manifest, collection) -> bool:
+    """Drop the local manifest when it no longer describes the vector DB (wiped, rebuilt, other host).
+
+    Returns True when it was dropped.
+    """
+    local = manifest.stored_root()
+    if local is None:
+        return False
+    remote = remote_root(collection, manifest.root_key)
+    if remote != local:
+        print(f"[MANIFEST] Local root {local[:12]} != stored root {(remote or 'none')[:12]}; "
+              f"rebuilding the manifest from this run.")
+        manifest.reset()
+        return True
+    return False
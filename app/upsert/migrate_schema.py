@@ -0,0 +1,285 @@
+# Move an existing PageChunk collection to the schema of app/upsert/setup_schema.py and a profile.
+# Settings Weaviate can change on a live collection (ef, turning compression on, new properties)
+# are updated in place. Anything else (property types, vectorization / index flags, tokenization,
+# ef_construction, max_connections) needs a new collection: objects are copied over together with
+# their stored vectors, so nothing is re-embedded unless the embedding model changed or --reembed
+# is given. UUIDs and hashes are kept, so the hash index and manifest stay valid.
+#
+# python -m app.upsert.migrate_schema [--profile compact] [--dry-run] [--reembed]
+
+import argparse
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from weaviate import WeaviateClient
+from weaviate.connect import ConnectionParams
+from weaviate.classes.config import Reconfigure, Tokenization
+from weaviate.classes.query import Filter
+
+from app.crawler.crawl_state import parse_datetime
+from app.upsert.embeddings import EMBEDDINGS, EMBEDDING_MODEL, get_vectorizer
+from app.upsert.setup_schema import (
+    COLLECTION_NAME, PAGE_SCHEMA, PRODUCT_SCHEMA, SCHEMA_PROFILE, PROFILES, create_page_collection, get_profile,
+)
+
+MIGRATION_SUFFIX = "_migration"
+COPY_BATCH = 200
+
+
+@dataclass
+class MigrationPlan:
+    missing: list = field(default_factory=list)  # Property definitions to add in place
+    updates: list = field(default_factory=list)  # in-place vector index changes (descriptions)
+    rebuild: list = field(default_factory=list)  # reasons a copy into a new collection is needed
+    reembed: list = field(default_factory=list)  # reasons stored vectors cannot be kept
+    vector_name: str = None
+    ef: int = None
+    quantizer: str = None
+
+    @property
+    def needed(self) -> bool:
+        return bool(self.missing or self.updates or self.rebuild)
+
+
+def _expected_flags(prop):
+    """(filterable, searchable, range filters, tokenization, skip vectorization) with Weaviate's defaults filled in."""
+    text = prop.dataType.value.startswith("text")
+    return (
+        True if prop.indexFilterable is None else prop.indexFilterable,
+        text if prop.indexSearchable is None else prop.indexSearchable,
+        bool(prop.indexRangeFilters),
+        (prop.tokenization or Tokenization.WORD) if text else None,
+        prop.skip_vectorization,
+    )
+
+
+def _current_flags(prop, vectorized):
+    skip = prop.vectorizer_config.skip if vectorized and prop.vectorizer_config is not None else None
+    return (prop.index_filterable, prop.index_searchable, prop.index_range_filters, prop.tokenization, skip)
+
+
+def _quantizer_name(quantizer):
+    if quantizer is None:
+        return None
+    return type(quantizer).__name__.strip("_").replace("Config", "").lower()  # _PQConfig -> "pq"
+
+
+def plan_migration(config, profile) -> MigrationPlan:
+    plan = MigrationPlan()
+    vector = next(iter((config.vector_config or {}).values()), None)
+    vectorized = EMBEDDINGS != "local"
+    current = {prop.name: prop for prop in config.properties}
+    for prop in PAGE_SCHEMA + PRODUCT_SCHEMA:
+        existing = current.get(prop.name)
+        if existing is None:
+            plan.missing.append(prop)
+            continue
+        if existing.data_type != prop.dataType:
+            plan.rebuild.append(f"{prop.name}: {existing.data_type.value} -> {prop.dataType.value}")
+            continue
+        expected = _expected_flags(prop)
+        actual = _current_flags(existing, vectorized)
+        if not vectorized:
+            expected = expected[:4] + (None,)
+        if actual != expected:
+            plan.rebuild.append(f"{prop.name}: index/vectorization flags {actual} -> {expected}")
+
+    if vector is None:
+        plan.rebuild.append("no named vector config")
+        return plan
+    plan.vector_name = next(iter(config.vector_config))
+    index = vector.vector_index_config
+    if index.ef_construction != profile.ef_construction or index.max_connections != profile.max_connections:
+        plan.rebuild.append(f"HNSW efConstruction/maxConnections {index.ef_construction}/{index.max_connections} "
+                            f"-> {profile.ef_construction}/{profile.max_connections}")
+    if index.ef != profile.ef:
+        plan.ef = profile.ef
+        plan.updates.append(f"ef {index.ef} -> {profile.ef}")
+    current_quantizer = _quantizer_name(index.quantizer)
+    if current_quantizer != profile.compression:
+        if current_quantizer is None:
+            plan.quantizer = profile.compression
+            plan.updates.append(f"enable {profile.compression} compression")
+        else:
+            plan.rebuild.append(f"compression {current_quantizer} -> {profile.compression}")
+
+    if vectorized:
+        sources = vector.vectorizer.source_properties
+        if sources != ["content"]:
+            plan.rebuild.append(f"vectorizer source properties {sources or 'all text'} -> ['content']")
+        model = (vector.vectorizer.model or {}).get("model")
+        if model and model != EMBEDDING_MODEL:
+            plan.reembed.append(f"embedding model {model} -> {EMBEDDING_MODEL}")
+    return plan
+
+
+def print_plan(plan):
+    if not plan.needed:
+        print("✅ Collection already matches the schema profile.")
+        return
+    for prop in plan.missing:
+        print(f"➕ in place: add property `{prop.name}`")
+    for update in plan.updates:
+        print(f"🔧 in place: {update}")
+    for reason in plan.rebuild:
+        print(f"🔁 rebuild: {reason}")
+    for reason in plan.reembed:
+        print(f"🧮 re-embed: {reason}")
+
+
+def apply_in_place(collection, plan):
+    for prop in plan.missing:
+        collection.config.add_property(prop)
+    if plan.ef is None and plan.quantizer is None:
+        return
+    quantizer = None
+    if plan.quantizer == "pq":
+        quantizer = Reconfigure.VectorIndex.Quantizer.pq()
+    elif plan.quantizer == "bq":
+        quantizer = Reconfigure.VectorIndex.Quantizer.bq()
+    collection.config.update(vector_config=Reconfigure.Vectors.update(
+        name=plan.vector_name,
+        vector_index_config=Reconfigure.VectorIndex.hnsw(ef=plan.ef, quantizer=quantizer),
+    ))
+
+
+def _properties(props):
+    """Old objects stored last_updated as free text; DATE needs RFC 3339 (unparseable values are dropped)."""
+    props = dict(props)
+    value = props.get("last_updated")
+    if isinstance(value, str):
+        parsed = parse_datetime(value)
+        if parsed is None:
+            del props["last_updated"]
+        else:
+            props["last_updated"] = parsed
+    elif value is not None and not isinstance(value, datetime):
+        del props["last_updated"]
+    return props
+
+
+def _fetch(source, uuids, keep_vectors):
+    for i in range(0, len(uuids), COPY_BATCH):
+        group = uuids[i:i + COPY_BATCH]
+        yield from source.query.fetch_objects(
+            filters=Filter.by_id().contains_any(group), limit=len(group), include_vector=keep_vectors,
+        ).objects
+
+
+def copy_objects(source, target, keep_vectors=True, vectorizer=None, counts=None, uuids=None):
+    """Copy every object of `source` (or only `uuids`) into `target`; returns (copied, failed)."""
+    copied = 0
+    pending = []
+    if uuids is None:
+        objects = source.iterator(include_vector=keep_vectors, cache_size=COPY_BATCH)
+    else:
+        objects = _fetch(source, list(uuids), keep_vectors)
+
+    def flush(batch):
+        if vectorizer is not None and not keep_vectors:
+            vectorizer.embed_chunks([chunk for _, chunk in pending], counts)
+        for uuid, chunk in pending:
+            batch.add_object(properties=chunk["properties"], uuid=uuid, vector=chunk.get("vector"))
+        pending.clear()
+
+    with target.batch.fixed_size(batch_size=COPY_BATCH) as batch:
+        for obj in objects:
+            chunk = {"properties": _properties(obj.properties), "content": obj.properties.get("content") or ""}
+            if keep_vectors and obj.vector:
+                chunk["vector"] = obj.vector
+            pending.append((obj.uuid, chunk))
+            copied += 1
+            if len(pending) >= COPY_BATCH:
+                flush(batch)
+                print(f"   … {copied} objects", end="\r")
+        flush(batch)
+    return copied, len(target.batch.failed_objects)
+
+
+def _total(collection):
+    return collection.aggregate.over_all(total_count=True).total_count
+
+
+def rebuild(client, profile, reembed=False):
+    """Copy PageChunk into a collection with the new schema, then recreate PageChunk from it."""
+    temp = COLLECTION_NAME + MIGRATION_SUFFIX
+    vectorizer = get_vectorizer() if reembed else None
+    counts = None
+    if vectorizer is not None:
+        from app.upsert.upsert import new_counts
+        counts = new_counts()
+
+    if client.collections.exists(COLLECTION_NAME):
+        if client.collections.exists(temp):
+            client.collections.delete(temp)  # left over from an aborted copy; PageChunk is intact
+        source = client.collections.get(COLLECTION_NAME)
+        staging = create_page_collection(client, temp, profile)
+        print(f"📤 Copying `{COLLECTION_NAME}` -> `{temp}` ({'re-embedding' if reembed else 'keeping vectors'})...")
+        copied, failed = copy_objects(source, staging, keep_vectors=not reembed, vectorizer=vectorizer, counts=counts)
+        if failed or _total(staging) != _total(source):
+            client.collections.delete(temp)
+            raise SystemExit(f"❌ Copy incomplete ({failed} failed of {copied}); `{COLLECTION_NAME}` left unchanged.")
+        client.collections.delete(COLLECTION_NAME)
+    elif client.collections.exists(temp):
+        print(f"↩️ Resuming: `{COLLECTION_NAME}` is gone, restoring it from `{temp}`.")
+    else:
+        raise SystemExit(f"❌ Neither `{COLLECTION_NAME}` nor `{temp}` exists; run setup_schema instead.")
+
+    staging = client.collections.get(temp)
+    target = create_page_collection(client, COLLECTION_NAME, profile)
+    print(f"📥 Copying `{temp}` -> `{COLLECTION_NAME}`...")
+    copied, failed = copy_objects(staging, target)
+    if failed or _total(target) != _total(staging):
+        raise SystemExit(f"❌ Copy back incomplete ({failed} failed of {copied}); `{temp}` kept, rerun to resume.")
+    client.collections.delete(temp)
+    if vectorizer is not None:
+        from app.upsert.embeddings import embedding_summary
+        print(embedding_summary(counts))
+        vectorizer.close()
+    print(f"✅ Rebuilt `{COLLECTION_NAME}` with {copied} objects.")
+
+
+def migrate(client, profile_name=SCHEMA_PROFILE, dry_run=False, reembed=False):
+    profile = get_profile(profile_name)
+    if client.alias.get(alias_name=COLLECTION_NAME) is not None:
+        raise SystemExit(f"❌ `{COLLECTION_NAME}` is an alias; rebuild with `python -m app.upsert.reindex` instead.")
+    if not client.collections.exists(COLLECTION_NAME):
+        if client.collections.exists(COLLECTION_NAME + MIGRATION_SUFFIX) and not dry_run:
+            rebuild(client, profile)
+            return
+        raise SystemExit(f"❌ `{COLLECTION_NAME}` does not exist; run setup_schema instead.")
+    collection = client.collections.get(COLLECTION_NAME)
+    plan = plan_migration(collection.config.get(), profile)
+    print(f"📋 Migration to profile `{profile_name}`:")
+    print_plan(plan)
+    if dry_run or not (plan.needed or reembed):
+        return
+    if plan.rebuild or plan.reembed or reembed:
+        rebuild(client, profile, reembed=reembed or bool(plan.reembed))
+    else:
+        apply_in_place(collection, plan)
+        print("✅ Updated in place.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move PageChunk to the current schema and profile.")
+    parser.add_argument("--profile", default=SCHEMA_PROFILE, choices=sorted(PROFILES))
+    parser.add_argument("--dry-run", action="store_true", help="Only print what would change")
+    parser.add_argument("--reembed", action="store_true", help="Drop stored vectors and embed again")
+    args = parser.parse_args()
+
+    client = WeaviateClient(
+        connection_params=ConnectionParams.from_params(
+            http_host="localhost",
+            http_port=8080,
+            grpc_host="localhost",
+            grpc_port=50051,
+            http_secure=False,
+            grpc_secure=False
+        )
+    )
+    client.connect()
+    try:
+        migrate(client, args.profile, dry_run=args.dry_run, reembed=args.reembed)
+    finally:
+        client.close()
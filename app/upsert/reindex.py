@@ -0,0 +1,255 @@
+# Blue/green rebuild of PageChunk behind a collection alias.
+# `PageChunk` is an alias pointing at a versioned collection (PageChunk_v<timestamp>). A reindex
+# builds the next version next to the live one (copying objects with their vectors, or
+# re-embedding them), catches up with writes made meanwhile, validates object counts and sample
+# queries against the live version, then switches the alias in one request. Readers such as the
+# chatbot keep calling collections.get("PageChunk") and never see an empty or partial collection.
+# Retired versions are deleted once they are older than REINDEX_GRACE_HOURS.
+# Upserts and GC deletes on this host pause while the alias switches (data/reindex/switch.lock):
+# a final catch-up runs inside the pause, so no write lands in the retired version after it,
+# where the hash index and the manifest would count it as stored and never send it again.
+# Pipelines on other hosts are not paused; reconcile their hash index after a reindex.
+#
+# python -m app.upsert.reindex [--profile compact] [--reembed] [--gc-only] [--dry-run]
+
+import os
+import json
+import time
+import argparse
+from contextlib import contextmanager
+
+from weaviate import WeaviateClient
+from weaviate.connect import ConnectionParams
+from weaviate.classes.query import Filter
+
+from app.upsert.embeddings import EMBEDDINGS, LocalEmbedder, get_vectorizer, embedding_summary
+from app.upsert.migrate_schema import copy_objects
+from app.upsert.setup_schema import COLLECTION_NAME, SCHEMA_PROFILE, PROFILES, create_page_collection, get_profile
+
+REINDEX_DIR = os.getenv("REINDEX_DIR", "data/reindex")
+GRACE_HOURS = float(os.getenv("REINDEX_GRACE_HOURS", 24))  # keep a retired version this long for rollback
+# Queries compared between the live and the new version before switching
+SAMPLE_QUERIES = [q.strip() for q in os.getenv(
+    "REINDEX_SAMPLE_QUERIES", "cotton kurta,silk saree,price,size chart,return policy").split(",") if q.strip()]
+MIN_OVERLAP = float(os.getenv("REINDEX_MIN_OVERLAP", 0.6))  # mean share of live top-k URLs the new version returns
+SAMPLE_LIMIT = 5
+SWITCH_LOCK = os.path.join(REINDEX_DIR, "switch.lock")
+SWITCH_SETTLE = float(os.getenv("REINDEX_SWITCH_SETTLE", 5))  # seconds for in-flight batches to land
+LOCK_TIMEOUT = float(os.getenv("REINDEX_LOCK_TIMEOUT", 600))  # a lock older than this was left by a crash
+
+
+@contextmanager
+def writes_paused():
+    """Hold this host's pipeline writes (see wait_for_switch) until the block exits."""
+    os.makedirs(REINDEX_DIR, exist_ok=True)
+    with open(SWITCH_LOCK, "w", encoding="utf-8") as f:
+        f.write(str(time.time()))
+    try:
+        time.sleep(SWITCH_SETTLE)  # batches that started before the lock finish first
+        yield
+    finally:
+        os.remove(SWITCH_LOCK)
+
+
+def wait_for_switch():
+    """Block while a reindex switches the alias; called before every upsert batch and GC delete."""
+    waited = False
+    while os.path.exists(SWITCH_LOCK):
+        try:
+            age = time.time() - os.path.getmtime(SWITCH_LOCK)
+        except OSError:
+            break  # removed meanwhile
+        if age > LOCK_TIMEOUT:
+            print(f"⚠️ Ignoring {SWITCH_LOCK} ({age:.0f}s old; left by a crashed reindex?)")
+            break
+        if not waited:
+            print("⏸ Reindex is switching the alias; holding writes...")
+            waited = True
+        time.sleep(0.5)
+
+
+def version_name() -> str:
+    return f"{COLLECTION_NAME}_v{time.strftime('%Y%m%d%H%M%S', time.gmtime())}"
+
+
+def live_target(client):
+    """Collection behind the PageChunk alias, the plain PageChunk collection, or None."""
+    alias = client.alias.get(alias_name=COLLECTION_NAME)
+    if alias is not None:
+        return alias.collection
+    return COLLECTION_NAME if client.collections.exists(COLLECTION_NAME) else None
+
+
+def _hashes(collection):
+    return {str(obj.uuid): obj.properties.get("hash")
+            for obj in collection.iterator(return_properties=["hash"], cache_size=1000)}
+
+
+def catch_up(source, target, keep_vectors, vectorizer=None, counts=None):
+    """Bring `target` in line with writes and deletes `source` received during the copy."""
+    live, built = _hashes(source), _hashes(target)
+    changed = [uuid for uuid, digest in live.items() if built.get(uuid) != digest]
+    extra = [uuid for uuid in built if uuid not in live]
+    if changed:
+        copy_objects(source, target, keep_vectors=keep_vectors, vectorizer=vectorizer, counts=counts, uuids=changed)
+    for i in range(0, len(extra), 200):
+        target.data.delete_many(where=Filter.by_id().contains_any(extra[i:i + 200]))
+    return len(changed), len(extra)
+
+
+def _search(collection, query):
+    if EMBEDDINGS == "local":
+        response = collection.query.near_vector(near_vector=LocalEmbedder().embed([query])[0], limit=SAMPLE_LIMIT,
+                                                return_properties=["url"])
+    else:
+        response = collection.query.near_text(query=query, limit=SAMPLE_LIMIT, return_properties=["url"])
+    return [obj.properties.get("url") for obj in response.objects]
+
+
+def validate(live, candidate, min_overlap=MIN_OVERLAP) -> list:
+    """Problems that should stop the switch; empty when the candidate may go live."""
+    problems = []
+    live_count = live.aggregate.over_all(total_count=True).total_count
+    new_count = candidate.aggregate.over_all(total_count=True).total_count
+    print(f"🔢 Objects: live {live_count}, new {new_count}")
+    if new_count != live_count:
+        problems.append(f"object count {new_count} != live {live_count}")
+    overlaps = []
+    for query in SAMPLE_QUERIES:
+        expected, got = _search(live, query), _search(candidate, query)
+        if expected and not got:
+            problems.append(f"no results for sample query {query!r}")
+        overlap = len(set(expected) & set(got)) / len(set(expected)) if expected else 1.0
+        overlaps.append(overlap)
+        print(f"🔎 {query!r}: {overlap:.0%} of live top-{SAMPLE_LIMIT} URLs returned")
+    if overlaps and sum(overlaps) / len(overlaps) < min_overlap:
+        problems.append(f"mean sample overlap {sum(overlaps) / len(overlaps):.0%} < {min_overlap:.0%}")
+    return problems
+
+
+def switch_alias(client, target):
+    """Point PageChunk at `target`. The first switch replaces the plain collection with an alias."""
+    if client.alias.get(alias_name=COLLECTION_NAME) is not None:
+        client.alias.update(alias_name=COLLECTION_NAME, new_target_collection=target)
+        return
+    if client.collections.exists(COLLECTION_NAME):
+        # An alias cannot share its name with a collection: this one-time conversion has a gap of
+        # one request between the delete and the alias, and the old collection cannot be kept
+        print(f"⚠️ Replacing the plain `{COLLECTION_NAME}` collection with an alias (one-time conversion).")
+        client.collections.delete(COLLECTION_NAME)
+    client.alias.create(alias_name=COLLECTION_NAME, target_collection=target)
+
+
+def _load_retired():
+    path = os.path.join(REINDEX_DIR, "retired.json")
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def _save_retired(retired):
+    os.makedirs(REINDEX_DIR, exist_ok=True)
+    with open(os.path.join(REINDEX_DIR, "retired.json"), "w", encoding="utf-8") as f:
+        json.dump(retired, f, indent=2)
+
+
+def collect_retired(client, grace_hours=GRACE_HOURS, dry_run=False):
+    """Delete versions retired longer than `grace_hours` ago; never the live one."""
+    retired = _load_retired()
+    live = live_target(client)
+    now = time.time()
+    for name, retired_at in list(retired.items()):
+        if name == live:
+            del retired[name]  # rolled back to it
+            continue
+        age = (now - retired_at) / 3600
+        if age < grace_hours:
+            print(f"⏳ Keeping `{name}` for rollback ({age:.1f}h of {grace_hours:.0f}h grace).")
+            continue
+        if dry_run:
+            print(f"🗑 Would delete `{name}` (retired {age:.1f}h ago).")
+            continue
+        if client.collections.exists(name):
+            client.collections.delete(name)
+            print(f"🗑 Deleted `{name}` (retired {age:.1f}h ago).")
+        del retired[name]
+    if not dry_run:
+        _save_retired(retired)
+
+
+def reindex(client, profile_name=SCHEMA_PROFILE, reembed=False, dry_run=False, force=False):
+    live_name = live_target(client)
+    if live_name is None:
+        raise SystemExit(f"❌ No `{COLLECTION_NAME}` to reindex; run setup_schema first.")
+    live = client.collections.get(live_name)
+    name = version_name()
+    print(f"🟦 live: `{live_name}` → 🟩 building `{name}` (profile `{profile_name}`, "
+          f"{'re-embedding' if reembed else 'keeping vectors'})")
+    if dry_run:
+        return
+
+    vectorizer = get_vectorizer() if reembed else None
+    counts = None
+    if vectorizer is not None:
+        from app.upsert.upsert import new_counts
+        counts = new_counts()
+    candidate = create_page_collection(client, name, get_profile(profile_name))
+    start = time.monotonic()
+    try:
+        copied, failed = copy_objects(live, candidate, keep_vectors=not reembed, vectorizer=vectorizer, counts=counts)
+        print(f"📤 Copied {copied} objects ({failed} failed) in {time.monotonic() - start:.0f}s")
+        changed, removed = catch_up(live, candidate, keep_vectors=not reembed, vectorizer=vectorizer, counts=counts)
+        print(f"🔄 Caught up with {changed} writes and {removed} deletes made during the copy")
+        problems = validate(live, candidate)
+        if problems and not force:
+            for problem in problems:
+                print(f"❌ {problem}")
+            raise SystemExit(f"❌ Validation failed; `{live_name}` stays live, `{name}` kept for inspection.")
+
+        with writes_paused():
+            # Writes made during validation would otherwise land only in the retired version
+            changed, removed = catch_up(live, candidate, keep_vectors=not reembed, vectorizer=vectorizer,
+                                        counts=counts)
+            print(f"🔄 Final catch-up: {changed} writes and {removed} deletes")
+            switch_alias(client, name)
+        if counts is not None:
+            print(embedding_summary(counts))
+    finally:
+        if vectorizer is not None:
+            vectorizer.close()
+    print(f"✅ `{COLLECTION_NAME}` now points at `{name}`.")
+    if live_name != COLLECTION_NAME:
+        retired = _load_retired()
+        retired[live_name] = time.time()
+        _save_retired(retired)
+    collect_retired(client)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild PageChunk into a new version and switch the alias.")
+    parser.add_argument("--profile", default=SCHEMA_PROFILE, choices=sorted(PROFILES))
+    parser.add_argument("--reembed", action="store_true", help="Embed again instead of copying vectors")
+    parser.add_argument("--force", action="store_true", help="Switch even if validation fails")
+    parser.add_argument("--gc-only", action="store_true", help="Only delete retired versions past the grace period")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    client = WeaviateClient(
+        connection_params=ConnectionParams.from_params(
+            http_host="localhost",
+            http_port=8080,
+            grpc_host="localhost",
+            grpc_port=50051,
+            http_secure=False,
+            grpc_secure=False
+        )
+    )
+    client.connect()
+    try:
+        if args.gc_only:
+            collect_retired(client, dry_run=args.dry_run)
+        else:
+            reindex(client, args.profile, reembed=args.reembed, dry_run=args.dry_run, force=args.force)
+    finally:
+        client.close()
@@ -1,8 +1,130 @@
 from weaviate import WeaviateClient
 from weaviate.connect import ConnectionParams
-from weaviate.classes.config import Property, Configure, DataType
+import os
+from dataclasses import dataclass
 
-COLLECTION_NAME = "PageChunk"
+from weaviate.classes.config import Property, Configure, DataType, Tokenization
+
+from app.upsert.embeddings import EMBEDDINGS, EMBEDDING_MODEL
+from app.utils.sites import COLLECTION_NAME, load_sites, multi_tenant_collections
+from app.chatbot.answer_cache import clear_answer_cache
+
+SCHEMA_PROFILE = os.getenv("SCHEMA_PROFILE", "default")
+
+
+@dataclass(frozen=True)
+class SchemaProfile:
+    """HNSW and compression settings of PageChunk; see PROFILES."""
+    ef: int = -1  # -1: dynamic ef (between dynamic_ef_min and dynamic_ef_max, scaled by the limit)
+    ef_construction: int = 128
+    max_connections: int = 32
+    compression: str = None  # None, "pq" (product quantization) or "bq" (binary quantization)
+
+
+PROFILES = {
+    "default": SchemaProfile(),
+    # Lower build / query effort and 32x smaller vectors in memory; rescoring keeps recall usable
+    "fast": SchemaProfile(ef=64, ef_construction=64, max_connections=16, compression="bq"),
+    # ~4-8x less vector memory, trained once the collection has enough objects
+    "compact": SchemaProfile(compression="pq"),
+    "accurate": SchemaProfile(ef=256, ef_construction=256, max_connections=64),
+}
+
+# Only `content` is embedded and full-text searchable; the ids, url and hash are exact-match
+# metadata (a SHA-256 string in the embedding input only adds noise)
+PAGE_SCHEMA = [
+    Property(name="chunk_id", data_type=DataType.TEXT, skip_vectorization=True,
+             tokenization=Tokenization.FIELD, index_searchable=False),
+    Property(name="url", data_type=DataType.TEXT, skip_vectorization=True,
+             tokenization=Tokenization.FIELD, index_searchable=False),
+    Property(name="content", data_type=DataType.TEXT),
+    Property(name="hash", data_type=DataType.TEXT, skip_vectorization=True,
+             tokenization=Tokenization.FIELD, index_searchable=False, index_filterable=False),
+    Property(name="last_updated", data_type=DataType.DATE, index_range_filters=True),
+]
+
+# Structured product fields (see app/crawler/structured.py); only set on `<url>_product` objects
+PRODUCT_SCHEMA = [
+    Property(name="product_name", data_type=DataType.TEXT),
+    Property(name="price", data_type=DataType.NUMBER, index_range_filters=True),
+    Property(name="currency", data_type=DataType.TEXT, skip_vectorization=True),
+    Property(name="sizes", data_type=DataType.TEXT_ARRAY),
+    Property(name="availability", data_type=DataType.TEXT, skip_vectorization=True),
+    Property(name="sku", data_type=DataType.TEXT, skip_vectorization=True),
+]
+
+# Page / site hashes of app/upsert/manifest.py; never embedded
+MANIFEST_COLLECTION = "PageManifest"
+MANIFEST_SCHEMA = [
+    Property(name="url", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+    Property(name="page_hash", data_type=DataType.TEXT),
+    Property(name="chunk_ids", data_type=DataType.TEXT_ARRAY),
+    Property(name="last_updated", data_type=DataType.TEXT),
+]
+
+def create_manifest_collection(client):
+    """Create PageManifest if it does not exist yet and return it."""
+    if MANIFEST_COLLECTION not in client.collections.list_all():
+        client.collections.create(
+            name=MANIFEST_COLLECTION,
+            properties=MANIFEST_SCHEMA,
+            vector_config=Configure.Vectors.self_provided(),
+        )
+        print(f"✅ Created collection `{MANIFEST_COLLECTION}` (no vectorizer).")
+    return client.collections.get(MANIFEST_COLLECTION)
+
+def get_profile(name=SCHEMA_PROFILE) -> SchemaProfile:
+    if name not in PROFILES:
+        raise SystemExit(f"❌ Unknown SCHEMA_PROFILE `{name}`; choose one of {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+def vector_index_config(profile):
+    quantizer = None
+    if profile.compression == "pq":
+        quantizer = Configure.VectorIndex.Quantizer.pq()
+    elif profile.compression == "bq":
+        quantizer = Configure.VectorIndex.Quantizer.bq()
+    return Configure.VectorIndex.hnsw(
+        ef=profile.ef,
+        ef_construction=profile.ef_construction,
+        max_connections=profile.max_connections,
+        quantizer=quantizer,
+    )
+
+def page_vector_config(profile):
+    # OpenAI vectorization of `content` with the model the client-side embedder uses, so vectors
+    # sent with UPSERT_EMBEDDINGS=openai and near_text queries share one space. The local
+    # embedder's vectors only match its own, so that mode gets no server vectorizer at all.
+    if EMBEDDINGS == "local":
+        return Configure.Vectors.self_provided(vector_index_config=vector_index_config(profile))
+    return Configure.Vectors.text2vec_openai(
+        model=EMBEDDING_MODEL,
+        source_properties=["content"],
+        vector_index_config=vector_index_config(profile),
+    )
+
+def create_page_collection(client, name=COLLECTION_NAME, profile=None, multi_tenancy=False):
+    """Create a PageChunk-shaped collection called `name` with `profile` and return it.
+
+    With `multi_tenancy` each site's tenant is created (and activated) on its first write.
+    """
+    profile = profile or get_profile()
+    client.collections.create(
+        name=name,
+        properties=[*PAGE_SCHEMA, *PRODUCT_SCHEMA],
+        vector_config=page_vector_config(profile),
+        multi_tenancy_config=Configure.multi_tenancy(
+            enabled=True, auto_tenant_creation=True, auto_tenant_activation=True) if multi_tenancy else None,
+    )
+    return client.collections.get(name)
+
+def add_product_properties(collection):
+    """Add the product properties an existing collection is missing, so it keeps its data."""
+    existing = {p.name for p in collection.config.get().properties}
+    for prop in PRODUCT_SCHEMA:
+        if prop.name not in existing:
+            collection.config.add_property(prop)
+            print(f"➕ Added property `{prop.name}` to `{collection.name}`")
 
 def setup_schema():
     client = WeaviateClient(
@@ -19,25 +141,34 @@ def setup_schema():
     client.connect()
     print("✅ Connected to Weaviate")
 
-    # Drop if exists
-    if COLLECTION_NAME in client.collections.list_all():
-        print(f"🗑 Dropping `{COLLECTION_NAME}`...")
-        client.collections.delete(COLLECTION_NAME)
+    # Every collection a registry site writes to; tenants share theirs with multi-tenancy enabled
+    sites = load_sites()
+    names = sorted({site.collection for site in sites})
+    tenanted = multi_tenant_collections(sites)
 
-    # Create collection with OpenAI vectorization
-    client.collections.create(
-        name=COLLECTION_NAME,
-        properties=[
-            Property(name="chunk_id", data_type=DataType.TEXT),
-            Property(name="url", data_type=DataType.TEXT),
-            Property(name="content", data_type=DataType.TEXT),
-            Property(name="hash", data_type=DataType.TEXT),
-            Property(name="last_updated", data_type=DataType.TEXT),
-        ],
-        vector_config=Configure.Vectors.text2vec_openai()
-    )
+    # Behind an alias the live version must not be dropped from under readers
+    for name in names:
+        if client.alias.get(alias_name=name) is not None:
+            print(f"⚠️ `{name}` is an alias; rebuild with `python -m app.upsert.reindex` instead.")
+            client.close()
+            return
+
+    for name in names:
+        # Drop if exists
+        if name in client.collections.list_all():
+            print(f"🗑 Dropping `{name}`...")
+            client.collections.delete(name)
+
+        create_page_collection(client, name, get_profile(), multi_tenancy=name in tenanted)
+
+        print(f"✅ Created collection `{name}` with {'client-provided vectors' if EMBEDDINGS == 'local' else 'OpenAI embedding'} "
+              f"(profile `{SCHEMA_PROFILE}`{', multi-tenancy' if name in tenanted else ''}).")
 
-    print(f"✅ Created collection `{COLLECTION_NAME}` with OpenAI embedding.")
+    # The manifest describes what PageChunk holds, so it starts over with it
+    if MANIFEST_COLLECTION in client.collections.list_all():
+        client.collections.delete(MANIFEST_COLLECTION)
+    create_manifest_collection(client)
+    clear_answer_cache()  # cached chatbot answers quote chunks that no longer exist
     client.close()
     print("🔒 Connection closed.")
 
@@ -1,12 +1,23 @@
 import os
+import random
+import threading
 import traceback
 from tqdm import tqdm
 from dotenv import load_dotenv
 
 from weaviate import WeaviateClient
 from weaviate.connect import ConnectionParams
+from weaviate.classes.query import Filter
 
 from app.utils.uuid_utils import get_uuid_from_chunk_id
+from app.crawler.structured import PRODUCT_PROPERTIES
+from app.upsert.setup_schema import add_product_properties, create_manifest_collection
+from app.upsert.manifest import Manifest, check_against_remote
+from app.upsert.hash_index import HashIndex, reconcile_summary
+from app.upsert.embeddings import get_vectorizer, embedding_summary
+from app.upsert.reindex import wait_for_switch
+from app.utils.sites import COLLECTION_NAME
+from app.chatbot.answer_cache import invalidate_chunks
 
 # ==== Setup ====
 load_dotenv()
@@ -22,74 +33,215 @@ client_wv = WeaviateClient(
     )
 )
 
-collection_name = "PageChunk"
+collection_name = COLLECTION_NAME  # WEAVIATE_COLLECTION; registry sites may name their own
 
-def upsert_chunks_optimal(chunks):
+BATCH_MODE = os.getenv("UPSERT_BATCH_MODE", "fixed")  # "fixed" or "dynamic" (client-tuned batch size)
+BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", 200))
+CONCURRENT_REQUESTS = int(os.getenv("UPSERT_CONCURRENT_REQUESTS", 2))
+PREFETCH_SIZE = int(os.getenv("UPSERT_PREFETCH_SIZE", 500))  # UUIDs per bulk hash lookup
+VERIFY_RATE = float(os.getenv("UPSERT_VERIFY_RATE", 0.01))  # share of writes read back and checked
+RECONCILE = os.getenv("UPSERT_RECONCILE", "0") == "1"  # rebuild the local hash index before upserting
+
+_batch_locks = {}  # id(collection) -> lock; sites writing to their own collections do not wait for each other
+_connect_lock = threading.Lock()  # sites crawled in parallel share client_wv
+
+def connect_collection(name=collection_name, tenant=None):
+    """Connect the shared client (once) and return collection `name`, scoped to `tenant` when given."""
     try:
-        client_wv.connect()
-        collection = client_wv.collections.get(collection_name)
+        with _connect_lock:
+            if not client_wv.is_connected():
+                client_wv.connect()
+        collection = client_wv.collections.get(name)
     except Exception as e:
         raise SystemExit(f"❌ Cannot connect to Weaviate or collection: {e}")
+    try:
+        # Collections created before product records existed get the typed properties added in place
+        add_product_properties(collection)
+    except Exception as e:
+        print(f"⚠️ Could not check product properties: {e}")
+    return collection.with_tenant(tenant) if tenant else collection
+
+def new_counts():
+    return {"inserted": 0, "replaced": 0, "skipped": 0, "failed": 0, "verified": 0,
+            "embedded": 0, "embed_cached": 0, "embed_requests": 0, "embed_time": 0.0}
+
+def chunk_properties(chunk):
+    properties = {
+        "chunk_id": chunk["chunk_id"],
+        "url": chunk["url"],
+        "content": chunk["content"],
+        "hash": chunk["hash"],
+        "last_updated": chunk["last_updated"]
+    }
+    properties.update({name: chunk[name] for name in PRODUCT_PROPERTIES if name in chunk})
+    return properties
+
+def prefetch_hashes(collection, uuids):
+    """Stored hash for each of `uuids` that exists, read PREFETCH_SIZE objects per request."""
+    hashes = {}
+    for i in range(0, len(uuids), PREFETCH_SIZE):
+        group = uuids[i:i + PREFETCH_SIZE]
+        response = collection.query.fetch_objects(
+            filters=Filter.by_id().contains_any(group),
+            limit=len(group),
+            return_properties=["hash"],
+        )
+        for obj in response.objects:
+            hashes[str(obj.uuid)] = obj.properties.get("hash")
+    return hashes
+
+def hash_index_name(collection):
+    """One index file per collection, and per tenant of a multi-tenancy collection."""
+    return f"{collection.name}.{collection.tenant}" if collection.tenant else collection.name
+
+def open_hash_index(collection, reconcile=False):
+    """Local hash index of the collection, rebuilt from a cursor scan when empty, requested or stale."""
+    index = HashIndex(hash_index_name(collection))
+    if reconcile or RECONCILE or not index.count():
+        print(reconcile_summary(index.reconcile(collection)))
+    return index
+
+def _batch_context(collection):
+    if BATCH_MODE == "dynamic":
+        return collection.batch.dynamic()
+    return collection.batch.fixed_size(batch_size=BATCH_SIZE, concurrent_requests=CONCURRENT_REQUESTS)
+
+def verify_sample(collection, written, counts):
+    """Read back about VERIFY_RATE of the `written` (uuid, chunk) pairs; returns the uuids whose hash does not match."""
+    sample = [(uuid, chunk) for uuid, chunk in written if random.random() < VERIFY_RATE]
+    if not sample:
+        return set()
+    stored = prefetch_hashes(collection, [uuid for uuid, _ in sample])
+    counts["verified"] += len(sample)
+    mismatched = {uuid for uuid, chunk in sample if stored.get(uuid) != chunk["hash"]}
+    for uuid, chunk in sample:
+        if uuid in mismatched:
+            print(f"⚠️ [VERIFY] {chunk['chunk_id']}: stored hash {stored.get(uuid)} != {chunk['hash']}")
+    return mismatched
+
+def upsert_batch(collection, chunks, counts, index=None, vectorizer=None) -> list:
+    """Insert or replace the chunks whose stored hash differs; returns the chunk IDs that failed.
 
-    inserted, replaced, skipped, failed = 0, 0, 0, 0
-
-    for chunk in tqdm(chunks, desc="Upserting", unit="chunk"):
-        chunk_id = chunk.get("chunk_id")
-        uuid = get_uuid_from_chunk_id(chunk_id)
-        new_hash = chunk.get("hash")
-        new_content = chunk.get("content")
-
-        properties = {
-            "chunk_id": chunk["chunk_id"],
-            "url": chunk["url"],
-            "content": chunk["content"],
-            "hash": chunk["hash"],
-            "last_updated": chunk["last_updated"]
-        }
-
-        try:
-            if collection.data.exists(uuid):
-                # 🔍 Fetch object from vector DB
-                existing = collection.query.fetch_object_by_id(uuid)
-                existing_hash = existing.properties.get("hash") if existing else None
-
-                if existing_hash == new_hash:
-                    print(f"[SKIP ✅] Hash match: {chunk_id}")
-                    skipped += 1
-                    continue
-
-                print(f"[REPLACE 🔄] {chunk_id}")
-                print(f"⏪ Old hash: {existing_hash}")
-                print(f"⏩ New hash: {new_hash}")
-                collection.data.replace(uuid=uuid, properties=properties)
-
-                # ✅ Verify from DB
-                try:
-                    updated = collection.query.fetch_object_by_id(uuid)
-                    updated_content = updated.properties.get("content", "")
-                    preview = updated_content.strip().replace("\n", " ")[:200]
-                    print(f"🔁 [VERIFY] Content preview: {preview}...")
-                except Exception as fetch_err:
-                    print(f"⚠️ Fetch-after-replace failed: {fetch_err}")
-
-                replaced += 1
-            else:
-                # ➕ New insert
-                collection.data.insert(uuid=uuid, properties=properties)
-                print(f"[INSERT ➕] {chunk_id}")
-                inserted += 1
-
-        except Exception as err:
-            print(f"[FAILED ❌] {chunk_id} → {err}")
-            traceback.print_exc()
-            failed += 1
+    Stored hashes come from the local hash `index` when given (no reads from the DB at all),
+    otherwise they are prefetched in bulk. With a `vectorizer` only the chunks being written are
+    embedded client-side and sent with their vectors. Writes go through the batch API
+    (deterministic UUIDs make a batch write an upsert) and successful ones are recorded in the index.
+    """
+    by_uuid = {get_uuid_from_chunk_id(chunk["chunk_id"]): chunk for chunk in chunks}
+    try:
+        existing = index.lookup(list(by_uuid)) if index is not None else prefetch_hashes(collection, list(by_uuid))
+    except Exception as err:
+        print(f"[FAILED ❌] Hash prefetch for {len(by_uuid)} chunks → {err}")
+        counts["failed"] += len(by_uuid)
+        return [chunk["chunk_id"] for chunk in by_uuid.values()]
+
+    writes = []
+    for uuid, chunk in by_uuid.items():
+        if existing.get(uuid) == chunk["hash"]:
+            counts["skipped"] += 1
+        else:
+            writes.append((uuid, chunk))
+    if not writes:
+        return []
+
+    try:
+        if vectorizer is not None:
+            vectorizer.embed_chunks([chunk for _, chunk in writes], counts)
+        # One batch context per collection at a time: the client keeps its results on the collection
+        with _batch_locks.setdefault(id(collection), threading.Lock()):
+            wait_for_switch()
+            with _batch_context(collection) as batch:
+                for uuid, chunk in writes:
+                    batch.add_object(properties=chunk_properties(chunk), uuid=uuid, vector=chunk.get("vector"))
+            errors = {str(e.object_.uuid): e.message for e in collection.batch.failed_objects}
+    except Exception as err:
+        print(f"[FAILED ❌] Batch of {len(writes)} chunks → {err}")
+        traceback.print_exc()
+        counts["failed"] += len(writes)
+        return [chunk["chunk_id"] for _, chunk in writes]
+
+    if errors:
+        print(f"[FAILED ❌] {len(errors)} of {len(writes)} objects in batch, e.g. {next(iter(errors.values()))}")
+    errors.update(dict.fromkeys(verify_sample(collection, [w for w in writes if w[0] not in errors], counts),
+                                "verify mismatch"))
+    for uuid, chunk in writes:
+        if uuid in errors:
+            counts["failed"] += 1
+        elif uuid in existing:
+            counts["replaced"] += 1
+        else:
+            counts["inserted"] += 1
+    if index is not None:
+        index.record([(uuid, chunk["hash"], chunk["url"], chunk["last_updated"])
+                      for uuid, chunk in writes if uuid not in errors])
+    try:
+        # Cached chatbot answers built from a replaced chunk are stale now
+        invalidate_chunks([(uuid, chunk["hash"]) for uuid, chunk in writes if uuid in existing and uuid not in errors])
+    except Exception as err:
+        print(f"⚠️ Could not invalidate cached answers: {err}")
+    return [chunk["chunk_id"] for uuid, chunk in writes if uuid in errors]
 
+def connect_manifest():
+    """PageManifest collection on the shared client (created on first use)."""
+    with _connect_lock:
+        return create_manifest_collection(client_wv)
+
+def print_summary(counts, total):
     print("\n📊 Upsert Summary:")
-    print(f"🆕 Inserted : {inserted}")
-    print(f"♻️  Replaced : {replaced}")
-    print(f"⏭️  Skipped  : {skipped}")
-    print(f"❌ Failed    : {failed}")
-    print(f"📦 Total     : {len(chunks)}")
+    print(f"🆕 Inserted : {counts['inserted']}")
+    print(f"♻️  Replaced : {counts['replaced']}")
+    print(f"⏭️  Skipped  : {counts['skipped']}")
+    print(f"❌ Failed    : {counts['failed']}")
+    print(f"🔍 Verified  : {counts['verified']}")
+    print(f"📦 Total     : {total}")
+    if counts["embedded"] or counts["embed_cached"]:
+        print(embedding_summary(counts))
+
+def upsert_chunks_optimal(chunks, manifest_name="site"):
+    collection = connect_collection()
+    manifest_collection = connect_manifest()
+    manifest = Manifest(manifest_name)
+    # A manifest that no longer matches the DB means the hash index cannot be trusted either
+    index = open_hash_index(collection, reconcile=check_against_remote(manifest, manifest_collection))
+    vectorizer = get_vectorizer()
+    counts = new_counts()
+
+    # One comparison decides whether anything changed since the last successful upsert
+    root, diffs = manifest.plan(chunks)
+    if root == manifest.stored_root():
+        print(f"✅ Site root hash {root[:12]} unchanged: nothing to upsert.")
+        manifest.close()
+        index.close()
+        if vectorizer is not None:
+            vectorizer.close()
+        client_wv.close()
+        return
+    touched = set().union(*(diff.touched for diff in diffs.values()))
+    todo = [chunk for chunk in chunks if chunk["chunk_id"] in touched]
+    removed = sum(len(diff.removed) for diff in diffs.values())
+    print(f"🌳 {len(diffs)} changed pages: {len(todo)} of {len(chunks)} chunks to write, {removed} no longer produced.")
+
+    by_url = {}
+    for chunk in chunks:
+        by_url.setdefault(chunk["url"], []).append(chunk)
+    for url, diff in diffs.items():
+        manifest.stage(url, by_url[url], diff.touched)
+
+    with tqdm(total=len(todo), desc="Upserting", unit="chunk") as pbar:
+        for i in range(0, len(todo), PREFETCH_SIZE):
+            group = todo[i:i + PREFETCH_SIZE]
+            manifest.ack(group, upsert_batch(collection, group, counts, index, vectorizer))
+            pbar.update(len(group))
+    counts["skipped"] += len(chunks) - len(todo)
+
+    print_summary(counts, len(chunks))
+    root = manifest.save_root()
+    if manifest.mirror(manifest_collection, root):
+        print("⚠️ Some manifest entries could not be mirrored to Weaviate.")
+    manifest.close()
+    index.close()
+    if vectorizer is not None:
+        vectorizer.close()
 
     client_wv.close()
 
@@ -2,7 +2,9 @@ from weaviate import WeaviateClient
 from weaviate.connect import ConnectionParams
 from tqdm import tqdm
 
-COLLECTION_NAME = "PageChunk"
+from app.utils.sites import COLLECTION_NAME
+from app.chatbot.answer_cache import clear_answer_cache
+MANIFEST_COLLECTION = "PageManifest"
 
 def wipe_all_objects():
     client = WeaviateClient(
@@ -23,17 +25,25 @@ def wipe_all_objects():
         collections = client.collections.list_all()
         print(f"🎯 Available collections: {collections}")
 
-        if COLLECTION_NAME not in collections:
+        alias = client.alias.get(alias_name=COLLECTION_NAME)
+        if alias is None and COLLECTION_NAME not in collections:
             print(f"❌ Collection `{COLLECTION_NAME}` not found.")
             return
 
+        # Through the alias this wipes the live version only
         collection = client.collections.get(COLLECTION_NAME)
-        print(f"🔁 Wiping all objects in `{COLLECTION_NAME}`...")
+        print(f"🔁 Wiping all objects in `{COLLECTION_NAME}`{f' (alias of `{alias.collection}`)' if alias else ''}...")
 
         # Use the v4-compatible way to delete all objects
         result = collection.data.delete_many(where={})
 
         print(f"✅ Deleted {result['matches']} objects from `{COLLECTION_NAME}`.")
+        clear_answer_cache()
+
+        # Without its chunks the manifest would make the next run skip every page
+        if MANIFEST_COLLECTION in collections:
+            client.collections.delete(MANIFEST_COLLECTION)
+            print(f"🗑 Dropped `{MANIFEST_COLLECTION}`; the next upsert rebuilds it.")
 
     except Exception as err:
         print(f"❌ Error while connecting or deleting: {err}")
@@ -0,0 +1,138 @@
+# Token-aware, content-defined chunking shared by both crawlers.
+# Text is split into sentence / line units; a chunk ends at an "anchor" unit (one whose content hash
+# hits ANCHOR_EVERY) once it has MIN_TOKENS, or before it would exceed MAX_TOKENS. Because anchors
+# depend only on the unit itself, inserting a sentence moves at most the chunks around the edit,
+# and chunk IDs derive from the chunk's first unit instead of its position on the page.
+
+import os
+import re
+import time
+import hashlib
+from dataclasses import dataclass
+
+from app.utils.hash_utils import compute_hash
+
+# CHUNK_SIZE is the older setting in characters (~4 per token); CHUNK_MAX_TOKENS wins when both are set
+MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS") or int(os.getenv("CHUNK_SIZE", 1024)) // 4)
+MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", 64))
+OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 0))
+ANCHOR_EVERY = int(os.getenv("CHUNK_ANCHOR_EVERY", 6))  # one unit in N (on average) may end a chunk
+TOKEN_ENCODING = os.getenv("CHUNK_TOKEN_ENCODING", "cl100k_base")  # text-embedding-3-* / ada-002
+
+# Sentence end followed by whitespace, or a line break
+_BREAK = re.compile(r"(?<=[.!?।])\s+|\s*\n\s*")
+_WORD = re.compile(r"\S+\s*")
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+        except Exception as e:
+            # Offline runs (the BPE file is downloaded on first use) fall back to an estimate
+            print(f"[CHUNKER] tiktoken unavailable ({type(e).__name__}); estimating ~4 characters per token.")
+            _encoding = False
+    return _encoding
+
+
+def count_tokens(text) -> int:
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode_ordinary(text))
+    return -(-len(text) // 4)
+
+
+def _count_many(texts):
+    encoding = _get_encoding()
+    if encoding:
+        return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
+    return [-(-len(t) // 4) for t in texts]
+
+
+def _unit_hash(unit) -> int:
+    normalized = " ".join(unit.lower().split())
+    return int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+@dataclass
+class Chunk:
+    key: str  # stable per-page key derived from the first unit
+    content: str
+    tokens: int
+
+
+def split_units(text, max_tokens=MAX_TOKENS):
+    """Sentences and lines of `text`; a unit longer than `max_tokens` is cut at word boundaries."""
+    units = [u for u in _BREAK.split(text) if u and u.strip()]
+    counts = _count_many(units)
+    for unit, tokens in zip(units, counts):
+        if tokens <= max_tokens:
+            yield unit, tokens
+            continue
+        part, part_tokens = "", 0
+        for word in _WORD.findall(unit):
+            word_tokens = count_tokens(word)
+            if part and part_tokens + word_tokens > max_tokens:
+                yield part.strip(), part_tokens
+                part, part_tokens = "", 0
+            part += word
+            part_tokens += word_tokens
+        if part.strip():
+            yield part.strip(), part_tokens
+
+
+def chunk_text(text, max_tokens=MAX_TOKENS, min_tokens=MIN_TOKENS, overlap_tokens=OVERLAP_TOKENS,
+               anchor_every=ANCHOR_EVERY) -> list:
+    min_tokens = min(min_tokens, max_tokens // 2)
+    chunks = []
+    keys = {}
+    current, current_tokens = [], 0
+    previous = []  # units of the last chunk, for overlap
+
+    def flush():
+        nonlocal current, current_tokens, previous
+        if not current:
+            return
+        key = f"{_unit_hash(current[0][0]):016x}"[:12]
+        keys[key] = keys.get(key, 0) + 1
+        if keys[key] > 1:
+            key = f"{key}-{keys[key]}"  # the same opening sentence twice on one page
+        overlap, overlap_count = [], 0
+        for unit, tokens in reversed(previous):
+            if overlap_count + tokens > overlap_tokens:
+                break
+            overlap.insert(0, unit)
+            overlap_count += tokens
+        content = " ".join(overlap + [unit for unit, _ in current])
+        chunks.append(Chunk(key, content, overlap_count + current_tokens))
+        previous = current
+        current, current_tokens = [], 0
+
+    for unit, tokens in split_units(text, max_tokens):
+        if current and current_tokens + tokens > max_tokens:
+            flush()
+        current.append((unit, tokens))
+        current_tokens += tokens
+        if current_tokens >= min_tokens and _unit_hash(unit) % anchor_every == 0:
+            flush()
+    flush()
+    return chunks
+
+
+def build_chunks(url, text, max_tokens=MAX_TOKENS):
+    """Chunk dicts for one page, in the shape the upsert expects."""
+    now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    return [
+        {
+            "url": url,
+            "content": chunk.content,
+            "chunk_id": f"{url}_chunk_{chunk.key}",
+            "last_updated": now,
+            "hash": compute_hash(chunk.content),
+        }
+        for chunk in chunk_text(text, max_tokens)
+    ]
@@ -0,0 +1,122 @@
+# Site registry: the stores one deployment crawls, read from a TOML file (SITES_CONFIG).
+# Every [[site]] gets its own start URL, skip patterns, readiness check, concurrency limit and
+# target collection (optionally a tenant of it); [defaults] fills in what a site leaves out.
+# Without a registry file the single site configured by the CRAWLER_* variables is crawled,
+# under the name "sitemap" so its existing frontier, manifest and caches keep working.
+#
+# See sites.example.toml.
+
+import os
+import re
+import tomllib
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+SITES_CONFIG = os.getenv("SITES_CONFIG", "sites.toml")
+COLLECTION_NAME = os.getenv("WEAVIATE_COLLECTION", "PageChunk")  # default target collection
+DEFAULT_SITE = "sitemap"  # name of the env-configured site (and of its state files)
+CRAWL_STATE_DIR = os.getenv("CRAWL_STATE_DIR", "data/crawl_state")
+
+DEFAULT_START_URL = "https://preprod-arunodayakurtis.zupain.com"
+DEFAULT_SKIP_PATTERNS = ["/login", "/sign-up", "/bag", "/document/[path]", "/[path]/pd/[...pd]", "/explore"]
+DEFAULT_READY_TEXT = ["₹", "Add to Cart"]
+
+_NAME = re.compile(r"[A-Za-z0-9_-]+")
+
+
+@dataclass(frozen=True)
+class Site:
+    name: str
+    start_url: str
+    skip_patterns: tuple = tuple(DEFAULT_SKIP_PATTERNS)
+    ready_selector: str = ""  # CSS selector a rendered page must contain; overrides ready_text
+    ready_text: tuple = tuple(DEFAULT_READY_TEXT)  # or any of these strings in the page text
+    concurrency: int = 8  # ceiling of this site's own fetches (the global budget may allow fewer)
+    collection: str = COLLECTION_NAME
+    tenant: str = None  # tenant of a multi-tenancy collection
+    first_party_hosts: tuple = ()  # other hosts (and subdomains) the store's pages load from, e.g. its CDN
+
+    @property
+    def domain(self) -> str:
+        return urlparse(self.start_url).netloc
+
+    @property
+    def state_path(self) -> str:
+        if self.name == DEFAULT_SITE:
+            from app.crawler.crawl_state import CRAWL_STATE_PATH
+            return CRAWL_STATE_PATH
+        return os.path.join(CRAWL_STATE_DIR, f"{self.name}.json")
+
+    def skipped(self, url) -> bool:
+        return any(pattern in url for pattern in self.skip_patterns)
+
+    def owns(self, url) -> bool:
+        """True for URLs on this site's host, with or without www (other sites may share the collection)."""
+        return _host(urlparse(url).netloc) == _host(self.domain)
+
+
+def _host(netloc):
+    netloc = netloc.lower()
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+def default_site() -> Site:
+    """The single site configured through CRAWLER_START_URL / CRAWLER_READY_SELECTOR / CRAWLER_CONCURRENCY."""
+    return Site(
+        name=DEFAULT_SITE,
+        start_url=os.getenv("CRAWLER_START_URL", DEFAULT_START_URL),
+        ready_selector=os.getenv("CRAWLER_READY_SELECTOR", ""),
+        concurrency=int(os.getenv("CRAWLER_CONCURRENCY", 8)),
+    )
+
+
+def _site(entry, defaults) -> Site:
+    values = {**defaults, **entry}
+    unknown = set(values) - set(Site.__dataclass_fields__)
+    if unknown:
+        raise ValueError(f"Unknown site settings {sorted(unknown)} for {values.get('name')!r}")
+    if not _NAME.fullmatch(values.get("name", "")):
+        raise ValueError(f"Site name {values.get('name')!r} must be letters, digits, '-' or '_' (it names state files)")
+    if not urlparse(values.get("start_url", "")).netloc:
+        raise ValueError(f"Site {values['name']!r} needs an absolute start_url")
+    for key in ("skip_patterns", "ready_text", "first_party_hosts"):
+        if key in values:
+            values[key] = tuple(values[key])
+    return Site(**values)
+
+
+def load_sites(path=SITES_CONFIG) -> list:
+    """Sites of the registry at `path`, or [default_site()] when there is no registry."""
+    if not os.path.exists(path):
+        return [default_site()]
+    with open(path, "rb") as f:
+        config = tomllib.load(f)
+    defaults = config.get("defaults", {})
+    sites = [_site(entry, defaults) for entry in config.get("site", [])]
+    if not sites:
+        raise ValueError(f"{path} defines no [[site]]")
+    names = [site.name for site in sites]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate site names in {path}: {duplicates}")
+    # A multi-tenancy collection only accepts reads and writes for a tenant
+    for collection in {site.collection for site in sites}:
+        tenants = [site.tenant for site in sites if site.collection == collection]
+        if any(tenants) and not all(tenants):
+            raise ValueError(f"Sites writing to `{collection}` must all set a tenant, or none of them")
+    return sites
+
+
+def get_site(name=None, path=SITES_CONFIG) -> Site:
+    """One registry site by name; the first (or only) one when `name` is None."""
+    sites = load_sites(path)
+    if name is None:
+        return sites[0]
+    for site in sites:
+        if site.name == name:
+            return site
+    raise SystemExit(f"❌ No site {name!r} in {path}; known: {', '.join(site.name for site in sites)}")
+
+
+def multi_tenant_collections(sites) -> set:
+    return {site.collection for site in sites if site.tenant}